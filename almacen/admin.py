@@ -2,8 +2,11 @@ from django.contrib import admin
 from .models import (
     UnidadMedida, Categoria, Producto, Almacen, MovimientoInventario,
     Stock, TipoConversion, ConversionProducto, ComponenteConversion,
-    RegistroConversion, TrasladoProducto, DetalleTraslado
+    RegistroConversion, TrasladoProducto, DetalleTraslado, EventoInventario,
+    ActualizacionPrecios, HistorialPrecio, SesionConteo, CostoProducto,
+    ClasificacionProducto
 )
+from .services import encolar_evento_inventario
 
 @admin.register(UnidadMedida)
 class UnidadMedidaAdmin(admin.ModelAdmin):
@@ -47,7 +50,7 @@ class AlmacenAdmin(admin.ModelAdmin):
 
 @admin.register(MovimientoInventario)
 class MovimientoInventarioAdmin(admin.ModelAdmin):
-    list_display = ('producto', 'almacen', 'cantidad', 'tipo', 'usuario', 'fecha')
+    list_display = ('producto', 'almacen', 'cantidad', 'tipo', 'costo_unitario', 'usuario', 'fecha')
     search_fields = ('producto__nombre', 'motivo')
     list_filter = ('tipo', 'fecha')
 
@@ -185,4 +188,64 @@ class ComponenteServicioAdmin(admin.ModelAdmin):
             kwargs["queryset"] = db_field.related_model.objects.filter(activo=True)
         elif db_field.name == "producto":
             kwargs["queryset"] = db_field.related_model.objects.filter(activo=True)
-        return super().formfield_for_foreignkey(db_field, request, **kwargs)
\ No newline at end of file
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+@admin.register(EventoInventario)
+class EventoInventarioAdmin(admin.ModelAdmin):
+    list_display = ('tipo', 'clave', 'creado', 'procesado', 'fallido', 'intentos')
+    list_filter = ('tipo', ('procesado', admin.EmptyFieldListFilter), ('fallido', admin.EmptyFieldListFilter))
+    search_fields = ('clave', 'error')
+    readonly_fields = ('creado', 'procesado', 'fallido', 'intentos', 'error')
+    actions = ['reencolar_fallidos']
+
+    def reencolar_fallidos(self, request, queryset):
+        # Si ya hay un evento pendiente con la misma clave, ese cubre el reintento
+        fallidos = queryset.filter(fallido__isnull=False)
+        for evento in fallidos:
+            encolar_evento_inventario(evento.tipo, evento.clave, evento.datos)
+        self.message_user(request, f'{len(fallidos)} eventos fallidos encolados de nuevo')
+    reencolar_fallidos.short_description = 'Reencolar eventos fallidos'
+
+
+@admin.register(ActualizacionPrecios)
+class ActualizacionPreciosAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'campo', 'tipo', 'valor', 'redondeo', 'cantidad_productos', 'usuario')
+    list_filter = ('campo', 'tipo')
+    readonly_fields = ('fecha',)
+
+
+@admin.register(HistorialPrecio)
+class HistorialPrecioAdmin(admin.ModelAdmin):
+    list_display = ('producto', 'actualizacion', 'precio_minorista', 'precio_mayorista')
+    list_select_related = ('producto', 'actualizacion')
+    search_fields = ('producto__codigo', 'producto__nombre')
+    raw_id_fields = ('producto', 'actualizacion')
+
+
+@admin.register(SesionConteo)
+class SesionConteoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'almacen', 'tipo', 'estado', 'fecha_apertura', 'fecha_cierre',
+                    'ajustes_faltante', 'ajustes_sobrante')
+    list_filter = ('estado', 'tipo', 'almacen')
+    readonly_fields = ('fecha_apertura', 'fecha_cierre', 'ajustes_faltante', 'ajustes_sobrante')
+
+
+@admin.register(CostoProducto)
+class CostoProductoAdmin(admin.ModelAdmin):
+    list_display = ('producto', 'almacen', 'cantidad', 'costo_promedio', 'actualizado')
+    list_select_related = ('producto', 'almacen')
+    list_filter = ('almacen',)
+    search_fields = ('producto__codigo', 'producto__nombre')
+    readonly_fields = ('producto', 'almacen', 'cantidad', 'costo_promedio', 'actualizado')
+
+
+@admin.register(ClasificacionProducto)
+class ClasificacionProductoAdmin(admin.ModelAdmin):
+    list_display = (
+        'producto', 'sucursal', 'clase_abc', 'clase_xyz', 'ingresos',
+        'participacion', 'coeficiente_variacion', 'actualizado'
+    )
+    list_select_related = ('producto', 'sucursal')
+    list_filter = ('sucursal', 'clase_abc', 'clase_xyz')
+    search_fields = ('producto__codigo', 'producto__nombre')
+    readonly_fields = list_display
@@ -1,8 +1,12 @@
+from django.core.cache import cache
 from django.db import models
-from rest_framework.decorators import api_view
+from django.core.exceptions import ValidationError
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import Producto, Servicio, Almacen
+from .models import Producto, Servicio, Almacen, SesionConteo
 from .serializers import ProductoSerializer, ServicioSerializer
+from .services import clave_catalogo, TIEMPO_CACHE_CATALOGO, registrar_lecturas_conteo
 from django.db.models import Q
 
 @api_view(['GET'])
@@ -13,9 +17,13 @@ def buscar_producto(request):
         return Response({'error': 'Código requerido'}, status=400)
     
     try:
-        producto = Producto.objects.get(codigo__iexact=codigo)
-        serializer = ProductoSerializer(producto)
-        return Response(serializer.data)
+        clave = clave_catalogo('codigo', codigo.lower())
+        datos = cache.get(clave)
+        if datos is None:
+            producto = Producto.objects.get(codigo__iexact=codigo)
+            datos = dict(ProductoSerializer(producto).data)
+            cache.set(clave, datos, TIEMPO_CACHE_CATALOGO)
+        return Response(datos)
     except Producto.DoesNotExist:
         return Response({'error': 'Producto no encontrado'}, status=404)
     except Exception as e:
@@ -24,9 +32,13 @@ def buscar_producto(request):
 @api_view(['GET'])
 def obtener_producto_por_id(request, pk):
     try:
-        producto = Producto.objects.get(pk=pk)
-        serializer = ProductoSerializer(producto)
-        return Response(serializer.data)
+        clave = clave_catalogo('producto', pk)
+        datos = cache.get(clave)
+        if datos is None:
+            producto = Producto.objects.get(pk=pk)
+            datos = dict(ProductoSerializer(producto).data)
+            cache.set(clave, datos, TIEMPO_CACHE_CATALOGO)
+        return Response(datos)
     except Producto.DoesNotExist:
         return Response({'error': 'Producto no encontrado'}, status=404)
 
@@ -114,4 +126,30 @@ def obtener_almacen_principal(request):
             'sucursal': almacen.sucursal.nombre if almacen.sucursal else ''
         })
     except Exception as e:
-        return Response({'error': str(e)}, status=500)
\ No newline at end of file
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def registrar_lecturas(request, sesion_id):
+    """
+    Recibe un lote de lecturas de un escáner:
+    {"lote": "id-unico-opcional", "lecturas": [{"codigo": "7791234", "cantidad": 3}, ...]}
+    """
+    lecturas = request.data.get('lecturas')
+    if not isinstance(lecturas, list):
+        return Response({'error': 'Se requiere la lista de lecturas'}, status=400)
+
+    try:
+        datos = [(lectura['codigo'], int(lectura.get('cantidad', 1))) for lectura in lecturas]
+    except (KeyError, TypeError, ValueError):
+        return Response({'error': 'Cada lectura requiere codigo y cantidad numérica'}, status=400)
+
+    try:
+        resultado = registrar_lecturas_conteo(sesion_id, datos, request.data.get('lote'))
+    except SesionConteo.DoesNotExist:
+        return Response({'error': 'Sesión de conteo no encontrada'}, status=404)
+    except ValidationError as e:
+        return Response({'error': ' '.join(e.messages)}, status=409)
+
+    return Response(resultado)
@@ -1,6 +1,6 @@
 from django import forms
 from django.core.exceptions import ValidationError
-from .models import Producto, Categoria, UnidadMedida, MovimientoInventario, Almacen, Stock, ConversionProducto, ComponenteConversion
+from .models import Producto, Categoria, UnidadMedida, MovimientoInventario, Almacen, Stock, ConversionProducto, ComponenteConversion, ActualizacionPrecios
 
 class ProductoForm(forms.ModelForm):
     class Meta:
@@ -107,6 +107,82 @@ class ProductoForm(forms.ModelForm):
         return codigo
     
 
+class ImportarProductosForm(forms.Form):
+    archivo = forms.FileField(
+        label='Archivo',
+        help_text='CSV o XLSX con encabezados: codigo, nombre, categoria, unidad_medida, '
+                  'precio_minorista, precio_mayorista, tasa_iva, stock_minimo, descripcion, activo'
+    )
+    crear_categorias = forms.BooleanField(
+        label='Crear categorías inexistentes',
+        required=False
+    )
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data['archivo']
+        if not archivo.name.lower().endswith(('.csv', '.xlsx')):
+            raise ValidationError('Formato no soportado. Use un archivo .csv o .xlsx')
+        return archivo
+
+
+class ActualizacionPreciosForm(forms.Form):
+    REDONDEO_CHOICES = [
+        (1, 'Sin redondeo'),
+        (50, 'Múltiplos de 50 Gs.'),
+        (100, 'Múltiplos de 100 Gs.'),
+        (500, 'Múltiplos de 500 Gs.'),
+        (1000, 'Múltiplos de 1.000 Gs.'),
+    ]
+
+    categoria = forms.ModelChoiceField(
+        queryset=Categoria.objects.filter(activo=True).order_by('nombre'),
+        required=False,
+        empty_label='Todas las categorías'
+    )
+    proveedor = forms.ModelChoiceField(
+        queryset=None,
+        required=False,
+        empty_label='Todos los proveedores',
+        help_text='Productos incluidos en órdenes de compra del proveedor'
+    )
+    tasa_iva = forms.TypedChoiceField(
+        choices=[('', 'Todas las tasas')] + Producto.TASA_CHOICES,
+        coerce=int,
+        empty_value=None,
+        required=False,
+        label='Tasa IVA'
+    )
+    campo = forms.ChoiceField(choices=ActualizacionPrecios.CAMPO_CHOICES, label='Precio a actualizar')
+    tipo = forms.ChoiceField(choices=ActualizacionPrecios.TIPO_CHOICES, label='Tipo de cambio')
+    valor = forms.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        help_text='Porcentaje (ej. 7.5) o monto en Gs.; negativo para rebajar'
+    )
+    redondeo = forms.TypedChoiceField(choices=REDONDEO_CHOICES, coerce=int, initial=100)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        from compras.models import Proveedor
+        self.fields['proveedor'].queryset = Proveedor.objects.filter(activo=True).order_by('razon_social')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('tipo') == 'PORCENTAJE' and cleaned_data.get('valor') is not None:
+            if cleaned_data['valor'] <= -100:
+                self.add_error('valor', 'El porcentaje debe ser mayor a -100')
+        return cleaned_data
+
+    def filtros(self):
+        """Filtros en el formato de filtrar_productos_precios (serializable)"""
+        datos = self.cleaned_data
+        return {
+            'categoria_id': datos['categoria'].id if datos.get('categoria') else None,
+            'proveedor_id': datos['proveedor'].id if datos.get('proveedor') else None,
+            'tasa_iva': datos.get('tasa_iva'),
+        }
+
+
 class CategoriaForm(forms.ModelForm):
 
     class Meta:
@@ -282,6 +358,7 @@ class TipoConversionForm(forms.ModelForm):
 from django import forms
 from django.core.exceptions import ValidationError
 from .models import ConversionProducto, Almacen, Stock
+from .services import verificar_stock
 
 class EjecutarConversionForm(forms.Form):
     conversion = forms.ModelChoiceField(
@@ -341,20 +418,19 @@ class EjecutarConversionForm(forms.Form):
         if not all([conversion, almacen, cantidad]):
             return cleaned_data
 
-        # Verificar stock para todos los componentes origen
-        componentes_origen = conversion.componentes.filter(tipo='ORIGEN')
-        for componente in componentes_origen:
-            stock = Stock.objects.filter(
-                producto=componente.producto,
-                almacen=almacen
-            ).first()
-            cantidad_necesaria = componente.cantidad * cantidad
-
-            if not stock or stock.cantidad < cantidad_necesaria:
-                self.add_error('cantidad', 
-                    f'Stock insuficiente de {componente.producto.nombre}. '
-                    f'Necesario: {cantidad_necesaria}, Disponible: {stock.cantidad if stock else 0}'
-                )
+        # Verificar stock para todos los componentes origen en una sola consulta
+        componentes_origen = {
+            c.producto_id: c for c in conversion.componentes.all() if c.tipo == 'ORIGEN'
+        }
+        faltantes = verificar_stock(almacen.id, {
+            producto_id: componente.cantidad * cantidad
+            for producto_id, componente in componentes_origen.items()
+        })
+        for producto_id, cantidad_necesaria, disponible in faltantes:
+            self.add_error('cantidad', 
+                f'Stock insuficiente de {componentes_origen[producto_id].producto.nombre}. '
+                f'Necesario: {cantidad_necesaria}, Disponible: {disponible}'
+            )
 
         return cleaned_data
 
@@ -563,3 +639,37 @@ ComponenteServicioFormSet = inlineformset_factory(
     fields=('producto', 'cantidad', 'observaciones')
 )
 
+
+
+from .models import SesionConteo
+
+class SesionConteoForm(forms.ModelForm):
+    class Meta:
+        model = SesionConteo
+        fields = ['almacen', 'tipo', 'observaciones']
+        widgets = {
+            'observaciones': forms.Textarea(attrs={'rows': 2}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['almacen'].queryset = Almacen.objects.filter(activo=True).order_by('nombre')
+
+
+class LecturaConteoForm(forms.Form):
+    codigo = forms.CharField(max_length=50, label='Código')
+    cantidad = forms.IntegerField(initial=1, help_text='Negativo para corregir')
+
+
+class ValorizacionInventarioForm(forms.Form):
+    almacen = forms.ModelChoiceField(
+        queryset=Almacen.objects.filter(activo=True).order_by('nombre'),
+        required=False,
+        empty_label='Todos los almacenes'
+    )
+    categoria = forms.ModelChoiceField(
+        queryset=Categoria.objects.order_by('nombre'),
+        required=False,
+        empty_label='Todas las categorías',
+        label='Categoría'
+    )
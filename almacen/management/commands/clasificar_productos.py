@@ -0,0 +1,32 @@
+# management/commands/clasificar_productos.py
+from django.core.management.base import BaseCommand
+from almacen.services import clasificar_productos, SEMANAS_CLASIFICACION
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la clasificación ABC/XYZ de los productos por sucursal'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--semanas',
+            type=int,
+            default=SEMANAS_CLASIFICACION,
+            help='Semanas completas de ventas y salidas analizadas'
+        )
+        parser.add_argument(
+            '--sucursal',
+            type=int,
+            help='ID de la sucursal a clasificar (por defecto todas)'
+        )
+
+    def handle(self, *args, **options):
+        resultado = clasificar_productos(
+            semanas=options['semanas'],
+            sucursal_id=options['sucursal']
+        )
+        clases = ', '.join(f"{clase}: {cantidad}" for clase, cantidad in resultado['clases'].items())
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['clasificados']} productos clasificados, "
+            f"{resultado['eliminados']} clasificaciones obsoletas eliminadas"
+            + (f" ({clases})" if clases else "")
+        ))
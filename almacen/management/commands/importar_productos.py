@@ -0,0 +1,63 @@
+# management/commands/importar_productos.py
+import csv
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from almacen.services import importar_productos, TAMANO_LOTE_IMPORTACION
+
+
+class Command(BaseCommand):
+    help = 'Importa o actualiza productos desde un archivo CSV o XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument(
+            '--crear-categorias',
+            action='store_true',
+            help='Crea las categorías que no existan'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=TAMANO_LOTE_IMPORTACION,
+            help='Cantidad de filas por transacción'
+        )
+        parser.add_argument(
+            '--reporte',
+            help='Ruta del CSV donde guardar las filas con errores'
+        )
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        try:
+            with open(ruta, 'rb') as archivo:
+                resultado = importar_productos(
+                    archivo,
+                    ruta,
+                    crear_categorias=options['crear_categorias'],
+                    tamano_lote=options['lote']
+                )
+        except (OSError, ValidationError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Creados: {resultado['creados']} - Actualizados: {resultado['actualizados']} - "
+            f"Sin cambios: {resultado['sin_cambios']}"
+        ))
+
+        errores = resultado['errores']
+        if not errores:
+            return
+
+        if options['reporte']:
+            with open(options['reporte'], 'w', newline='', encoding='utf-8') as salida:
+                escritor = csv.writer(salida)
+                escritor.writerow(['fila', 'codigo', 'error'])
+                escritor.writerows(errores)
+            self.stdout.write(self.style.WARNING(
+                f"{len(errores)} filas con errores, ver {options['reporte']}"
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(errores)} filas con errores:"))
+            for fila, codigo, mensaje in errores:
+                self.stdout.write(f"  Fila {fila} ({codigo}): {mensaje}")
@@ -0,0 +1,44 @@
+# management/commands/procesar_eventos_inventario.py
+import time
+
+from django.core.management.base import BaseCommand
+from almacen.services import procesar_eventos_inventario, TAMANO_LOTE_EVENTOS
+
+
+class Command(BaseCommand):
+    help = 'Procesa los eventos de inventario pendientes (bandeja de salida)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limite',
+            type=int,
+            default=TAMANO_LOTE_EVENTOS,
+            help='Cantidad máxima de eventos por lote'
+        )
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='Queda en ejecución como worker'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2,
+            help='Segundos de espera cuando no hay eventos (modo continuo)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            while True:
+                procesados = procesar_eventos_inventario(limite=options['limite'])
+                total += procesados
+                if procesados < options['limite']:
+                    break
+
+            if total:
+                self.stdout.write(self.style.SUCCESS(f"{total} eventos procesados"))
+
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,48 @@
+# management/commands/regenerar_miniaturas.py
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from almacen.models import Producto
+from almacen.services import generar_miniaturas
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas de las imágenes de productos existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Cantidad de procesos en paralelo'
+        )
+        parser.add_argument(
+            '--forzar',
+            action='store_true',
+            help='Regenera también las miniaturas que ya existen'
+        )
+
+    def handle(self, *args, **options):
+        imagenes = list(
+            Producto.objects.exclude(imagen='').exclude(imagen__isnull=True)
+            .values_list('imagen', flat=True).distinct()
+        )
+        self.stdout.write(f"Encontré {len(imagenes)} imágenes de productos")
+
+        generadas = errores = 0
+        # Los procesos hijos solo leen y escriben archivos, no usan la base de datos
+        with ProcessPoolExecutor(max_workers=options['procesos'], initializer=django.setup) as pool:
+            futuros = {
+                pool.submit(generar_miniaturas, imagen, options['forzar']): imagen
+                for imagen in imagenes
+            }
+            for futuro in as_completed(futuros):
+                try:
+                    generadas += futuro.result()
+                except Exception as e:
+                    errores += 1
+                    self.stdout.write(self.style.ERROR(f"Error en {futuros[futuro]}: {str(e)}"))
+
+        self.stdout.write(self.style.SUCCESS(f"{generadas} miniaturas generadas, {errores} errores"))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 14:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('almacen', '0002_movimientoinventario_registro_conversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaTraslado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('ultimo_numero', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Traslados',
+                'verbose_name_plural': 'Secuencias de Traslados',
+            },
+        ),
+        migrations.AddField(
+            model_name='movimientoinventario',
+            name='traslado',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='almacen.trasladoproducto'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-19 14:25
+
+from django.db import migrations, models
+
+
+def vincular_entradas_traslados(apps, schema_editor):
+    """
+    Vincula a su traslado las entradas creadas por las señales anteriores
+    (identificadas por el motivo), para que el consumidor de eventos no las
+    vuelva a registrar.
+    """
+    TrasladoProducto = apps.get_model('almacen', 'TrasladoProducto')
+    MovimientoInventario = apps.get_model('almacen', 'MovimientoInventario')
+    for traslado in TrasladoProducto.objects.exclude(estado='PENDIENTE').iterator():
+        MovimientoInventario.objects.filter(
+            traslado__isnull=True,
+            tipo='ENTRADA',
+            almacen_id=traslado.almacen_destino_id,
+            motivo__startswith=f"Traslado {traslado.referencia} desde "
+        ).update(traslado=traslado)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('almacen', '0003_secuenciatraslado_movimiento_traslado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('SINCRONIZAR_TRASLADO', 'Sincronizar traslado')], max_length=30)),
+                ('clave', models.CharField(help_text='Identifica el objeto afectado; evita eventos pendientes duplicados', max_length=100)),
+                ('datos', models.JSONField(blank=True, default=dict)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('procesado', models.DateTimeField(blank=True, null=True)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Evento de Inventario',
+                'verbose_name_plural': 'Eventos de Inventario',
+                'ordering': ['id'],
+                'indexes': [models.Index(condition=models.Q(('procesado__isnull', True)), fields=['id'], name='evento_inventario_pendiente')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('procesado__isnull', True)), fields=('tipo', 'clave'), name='unico_evento_inventario_pendiente')],
+            },
+        ),
+        migrations.RunPython(vincular_entradas_traslados, migrations.RunPython.noop),
+    ]
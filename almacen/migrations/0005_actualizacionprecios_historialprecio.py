@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-19 14:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('almacen', '0004_eventoinventario'),
+        ('usuarios', '0003_remove_perfilusuario_comision_entrega_inicial_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActualizacionPrecios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('campo', models.CharField(choices=[('precio_minorista', 'Precio minorista'), ('precio_mayorista', 'Precio mayorista'), ('ambos', 'Ambos precios')], max_length=20)),
+                ('tipo', models.CharField(choices=[('PORCENTAJE', 'Porcentaje'), ('MONTO', 'Monto fijo')], max_length=20)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('redondeo', models.PositiveIntegerField(default=1, help_text='Los precios resultantes se redondean a múltiplos de este valor (Gs.)')),
+                ('filtros', models.JSONField(blank=True, default=dict)),
+                ('cantidad_productos', models.PositiveIntegerField(default=0)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='usuarios.perfilusuario')),
+            ],
+            options={
+                'verbose_name': 'Actualización de Precios',
+                'verbose_name_plural': 'Actualizaciones de Precios',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HistorialPrecio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precio_minorista', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_mayorista', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('actualizacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historial', to='almacen.actualizacionprecios')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historial_precios', to='almacen.producto')),
+            ],
+            options={
+                'verbose_name': 'Historial de Precio',
+                'verbose_name_plural': 'Historial de Precios',
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2 on 2026-10-19 14:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('almacen', '0005_actualizacionprecios_historialprecio'),
+        ('usuarios', '0003_remove_perfilusuario_comision_entrega_inicial_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SesionConteo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('TOTAL', 'Total (lo no contado queda en cero)'), ('PARCIAL', 'Parcial (solo se ajusta lo contado)')], default='TOTAL', max_length=10)),
+                ('estado', models.CharField(choices=[('ABIERTA', 'Abierta'), ('CERRADA', 'Cerrada'), ('CANCELADA', 'Cancelada')], default='ABIERTA', max_length=10)),
+                ('fecha_apertura', models.DateTimeField(auto_now_add=True)),
+                ('fecha_cierre', models.DateTimeField(blank=True, null=True)),
+                ('observaciones', models.TextField(blank=True)),
+                ('ajustes_faltante', models.PositiveIntegerField(default=0)),
+                ('ajustes_sobrante', models.PositiveIntegerField(default=0)),
+                ('abierta_por', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='sesiones_conteo_abiertas', to='usuarios.perfilusuario')),
+                ('almacen', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='sesiones_conteo', to='almacen.almacen')),
+                ('cerrada_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sesiones_conteo_cerradas', to='usuarios.perfilusuario')),
+            ],
+            options={
+                'verbose_name': 'Sesión de Conteo',
+                'verbose_name_plural': 'Sesiones de Conteo',
+                'ordering': ['-fecha_apertura'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LoteConteo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('identificador', models.CharField(max_length=64)),
+                ('lineas', models.PositiveIntegerField(default=0)),
+                ('recibido', models.DateTimeField(auto_now_add=True)),
+                ('sesion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lotes', to='almacen.sesionconteo')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ConteoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='almacen.producto')),
+                ('sesion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conteos', to='almacen.sesionconteo')),
+            ],
+            options={
+                'verbose_name': 'Conteo de Inventario',
+                'verbose_name_plural': 'Conteos de Inventario',
+            },
+        ),
+        migrations.AddField(
+            model_name='movimientoinventario',
+            name='sesion_conteo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='almacen.sesionconteo'),
+        ),
+        migrations.AddConstraint(
+            model_name='sesionconteo',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'ABIERTA')), fields=('almacen',), name='unica_sesion_conteo_abierta_por_almacen'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='loteconteo',
+            unique_together={('sesion', 'identificador')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='conteoinventario',
+            unique_together={('sesion', 'producto')},
+        ),
+    ]
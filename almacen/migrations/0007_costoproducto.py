@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-19 14:39
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('almacen', '0006_sesiones_conteo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimientoinventario',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text='Costo de entrada, o costo promedio vigente al momento de la salida', max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='precio_compra',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Último precio de compra recibido', max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.CreateModel(
+            name='CostoProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('costo_promedio', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('almacen', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='costos', to='almacen.almacen')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='costos', to='almacen.producto')),
+            ],
+            options={
+                'verbose_name': 'Costo de Producto',
+                'verbose_name_plural': 'Costos de Productos',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('almacen__isnull', False)), fields=('producto', 'almacen'), name='costo_unico_por_almacen'), models.UniqueConstraint(condition=models.Q(('almacen__isnull', True)), fields=('producto',), name='costo_unico_global')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-19 14:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('almacen', '0007_costoproducto'),
+        ('empresa', '0002_alter_secuenciadocumento_tipo_documento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClasificacionProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clase_abc', models.CharField(choices=[('A', 'A - Alto aporte'), ('B', 'B - Aporte medio'), ('C', 'C - Bajo aporte')], max_length=1)),
+                ('clase_xyz', models.CharField(choices=[('X', 'X - Demanda estable'), ('Y', 'Y - Demanda variable'), ('Z', 'Z - Demanda errática')], max_length=1)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('participacion', models.DecimalField(decimal_places=4, default=0, help_text='Porcentaje de los ingresos de la sucursal', max_digits=7)),
+                ('coeficiente_variacion', models.DecimalField(blank=True, decimal_places=3, help_text='Desviación / media de las salidas por semana; vacío sin salidas', max_digits=8, null=True)),
+                ('actualizado', models.DateTimeField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clasificaciones', to='almacen.producto')),
+                ('sucursal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clasificaciones', to='empresa.sucursal')),
+            ],
+            options={
+                'verbose_name': 'Clasificación de Producto',
+                'verbose_name_plural': 'Clasificaciones de Productos',
+                'indexes': [models.Index(fields=['sucursal', 'clase_abc', 'clase_xyz'], name='almacen_cla_sucursa_47f5f2_idx')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'sucursal'), name='clasificacion_unica_por_sucursal')],
+            },
+        ),
+    ]
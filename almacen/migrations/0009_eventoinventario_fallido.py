@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-19 16:06
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def marcar_eventos_agotados(apps, schema_editor):
+    """
+    Marca como fallidos los eventos que ya agotaron sus intentos (5), que
+    hasta ahora ocupaban la clave pendiente sin que nadie los tomara.
+    """
+    EventoInventario = apps.get_model('almacen', 'EventoInventario')
+    EventoInventario.objects.filter(procesado__isnull=True, intentos__gte=5).update(
+        fallido=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('almacen', '0008_clasificacionproducto'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='eventoinventario',
+            name='unico_evento_inventario_pendiente',
+        ),
+        migrations.RemoveIndex(
+            model_name='eventoinventario',
+            name='evento_inventario_pendiente',
+        ),
+        migrations.AddField(
+            model_name='eventoinventario',
+            name='fallido',
+            field=models.DateTimeField(blank=True, help_text='Momento en que agotó sus intentos; ya no se vuelve a tomar', null=True),
+        ),
+        migrations.RunPython(marcar_eventos_agotados, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='eventoinventario',
+            index=models.Index(condition=models.Q(('fallido__isnull', True), ('procesado__isnull', True)), fields=['id'], name='evento_inventario_pendiente'),
+        ),
+        migrations.AddConstraint(
+            model_name='eventoinventario',
+            constraint=models.UniqueConstraint(condition=models.Q(('fallido__isnull', True), ('procesado__isnull', True)), fields=('tipo', 'clave'), name='unico_evento_inventario_pendiente'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import os
+
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.db import transaction
@@ -63,6 +65,17 @@ class Categoria(models.Model):
     def __str__(self):
         return self.nombre
 
+# Miniaturas generadas junto a cada Producto.imagen: {nombre: lado máximo en px}
+TAMANOS_MINIATURA = {'chica': 96, 'mediana': 320}
+FORMATOS_MINIATURA = {'webp': 'WEBP', 'jpg': 'JPEG'}
+
+
+def ruta_miniatura(nombre_imagen, tamano, formato):
+    """productos/foto.jpg -> productos/foto_chica.webp"""
+    base, _ = os.path.splitext(nombre_imagen)
+    return f'{base}_{tamano}.{formato}'
+
+
 class Producto(models.Model):
     TASA_CHOICES = [
         (10, 'Gravadas 10%'),
@@ -87,6 +100,13 @@ class Producto(models.Model):
         validators=[MinValueValidator(0)],
         default=0
     )
+    precio_compra = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        validators=[MinValueValidator(0)],
+        default=0,
+        help_text="Último precio de compra recibido"
+    )
     tasa_iva = models.PositiveIntegerField(choices=TASA_CHOICES, default=10)
     stock_minimo = models.PositiveIntegerField(default=0)
     imagen = models.ImageField(upload_to='productos/', blank=True, null=True)
@@ -98,6 +118,72 @@ class Producto(models.Model):
     def __str__(self):
         return self.nombre
 
+    def miniatura_url(self, tamano='chica', formato='webp'):
+        """URL de una miniatura de la imagen (None si el producto no tiene imagen)"""
+        if not self.imagen:
+            return None
+        return self.imagen.storage.url(ruta_miniatura(self.imagen.name, tamano, formato))
+
+    @property
+    def miniatura(self):
+        return self.miniatura_url()
+
+    @property
+    def miniatura_jpg(self):
+        return self.miniatura_url(formato='jpg')
+
+
+class ActualizacionPrecios(models.Model):
+    """Cabecera de una actualización masiva de precios"""
+    CAMPO_CHOICES = [
+        ('precio_minorista', 'Precio minorista'),
+        ('precio_mayorista', 'Precio mayorista'),
+        ('ambos', 'Ambos precios'),
+    ]
+    TIPO_CHOICES = [
+        ('PORCENTAJE', 'Porcentaje'),
+        ('MONTO', 'Monto fijo'),
+    ]
+
+    fecha = models.DateTimeField(auto_now_add=True)
+    usuario = models.ForeignKey(PerfilUsuario, on_delete=models.PROTECT)
+    campo = models.CharField(max_length=20, choices=CAMPO_CHOICES)
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    valor = models.DecimalField(max_digits=12, decimal_places=2)
+    redondeo = models.PositiveIntegerField(
+        default=1,
+        help_text="Los precios resultantes se redondean a múltiplos de este valor (Gs.)"
+    )
+    filtros = models.JSONField(default=dict, blank=True)
+    cantidad_productos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = 'Actualización de Precios'
+        verbose_name_plural = 'Actualizaciones de Precios'
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.valor} sobre {self.get_campo_display()} ({self.fecha:%d/%m/%Y})"
+
+
+class HistorialPrecio(models.Model):
+    """Precios anteriores de cada producto afectado por una actualización masiva"""
+    actualizacion = models.ForeignKey(
+        ActualizacionPrecios,
+        on_delete=models.CASCADE,
+        related_name='historial'
+    )
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='historial_precios')
+    precio_minorista = models.DecimalField(max_digits=10, decimal_places=2)
+    precio_mayorista = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        verbose_name = 'Historial de Precio'
+        verbose_name_plural = 'Historial de Precios'
+
+    def __str__(self):
+        return f"{self.producto} ({self.actualizacion.fecha:%d/%m/%Y})"
+
 class Almacen(models.Model):
     sucursal = models.ForeignKey(Sucursal, on_delete=models.CASCADE, related_name='almacenes')
     nombre = models.CharField(max_length=100, unique=True)
@@ -148,6 +234,107 @@ class Stock(models.Model):
         return f"{self.producto} en {self.almacen}: {self.cantidad}"
 
 
+class CostoProducto(models.Model):
+    """
+    Costo promedio ponderado de un producto.
+
+    Con ALMACEN_COSTO_POR_ALMACEN desactivado hay un único registro por
+    producto (almacen vacío); activado, uno por producto y almacén. Se
+    actualiza de forma incremental con cada entrada.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='costos')
+    almacen = models.ForeignKey(
+        Almacen,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='costos'
+    )
+    cantidad = models.PositiveIntegerField(default=0)
+    costo_promedio = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Costo de Producto'
+        verbose_name_plural = 'Costos de Productos'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['producto', 'almacen'],
+                condition=models.Q(almacen__isnull=False),
+                name='costo_unico_por_almacen'
+            ),
+            models.UniqueConstraint(
+                fields=['producto'],
+                condition=models.Q(almacen__isnull=True),
+                name='costo_unico_global'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.producto}: {self.costo_promedio}"
+
+    @property
+    def valor(self):
+        return self.cantidad * self.costo_promedio
+
+
+class ClasificacionProducto(models.Model):
+    """
+    Clase ABC (aporte a los ingresos) y XYZ (variabilidad de la demanda) de
+    un producto en una sucursal. La recalcula el comando clasificar_productos;
+    las vistas solo la leen.
+    """
+    CLASE_ABC_CHOICES = [
+        ('A', 'A - Alto aporte'),
+        ('B', 'B - Aporte medio'),
+        ('C', 'C - Bajo aporte'),
+    ]
+    CLASE_XYZ_CHOICES = [
+        ('X', 'X - Demanda estable'),
+        ('Y', 'Y - Demanda variable'),
+        ('Z', 'Z - Demanda errática'),
+    ]
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='clasificaciones')
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.CASCADE, related_name='clasificaciones')
+    clase_abc = models.CharField(max_length=1, choices=CLASE_ABC_CHOICES)
+    clase_xyz = models.CharField(max_length=1, choices=CLASE_XYZ_CHOICES)
+    ingresos = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    participacion = models.DecimalField(
+        max_digits=7,
+        decimal_places=4,
+        default=0,
+        help_text="Porcentaje de los ingresos de la sucursal"
+    )
+    coeficiente_variacion = models.DecimalField(
+        max_digits=8,
+        decimal_places=3,
+        null=True,
+        blank=True,
+        help_text="Desviación / media de las salidas por semana; vacío sin salidas"
+    )
+    actualizado = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Clasificación de Producto'
+        verbose_name_plural = 'Clasificaciones de Productos'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['producto', 'sucursal'],
+                name='clasificacion_unica_por_sucursal'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['sucursal', 'clase_abc', 'clase_xyz']),
+        ]
+
+    def __str__(self):
+        return f"{self.producto} en {self.sucursal}: {self.clase}"
+
+    @property
+    def clase(self):
+        return f"{self.clase_abc}{self.clase_xyz}"
+
+
 class MovimientoInventario(models.Model):
     TIPO_CHOICES = [
         ('ENTRADA', 'Entrada'),
@@ -165,7 +352,35 @@ class MovimientoInventario(models.Model):
     usuario = models.ForeignKey(PerfilUsuario, on_delete=models.PROTECT)
 
     motivo = models.TextField(blank=True)
-    
+    costo_unitario = models.DecimalField(
+        max_digits=14,
+        decimal_places=4,
+        null=True,
+        blank=True,
+        help_text="Costo de entrada, o costo promedio vigente al momento de la salida"
+    )
+    registro_conversion = models.ForeignKey(
+        'RegistroConversion',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='movimientos'
+    )
+    traslado = models.ForeignKey(
+        'TrasladoProducto',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='movimientos'
+    )
+    sesion_conteo = models.ForeignKey(
+        'SesionConteo',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='movimientos'
+    )
+
     class Meta:
         ordering = ['-fecha']
         verbose_name = 'Movimiento de Inventario'
@@ -199,6 +414,11 @@ class MovimientoInventario(models.Model):
             old_producto = None
             old_almacen = None
 
+        # Costear las altas antes de que cambie el stock
+        if not self.pk:
+            from .services import registrar_costo_movimientos
+            registrar_costo_movimientos([self])
+
         # Guardar el movimiento primero
         super().save(*args, **kwargs)
 
@@ -386,14 +606,45 @@ class TrasladoProducto(models.Model):
     def save(self, *args, **kwargs):
         if not self.referencia:
             # Generar referencia automática (ejemplo: TR-20230615-001)
-            from django.utils import timezone
-            date_str = timezone.now().strftime('%Y%m%d')
-            last_num = TrasladoProducto.objects.filter(
-                referencia__startswith=f'TR-{date_str}'
-            ).count()
-            self.referencia = f'TR-{date_str}-{last_num + 1:03d}'
+            self.referencia = SecuenciaTraslado.siguiente_referencia()
         super().save(*args, **kwargs)
 
+
+class SecuenciaTraslado(models.Model):
+    """Contador diario para las referencias de traslados (TR-AAAAMMDD-NNN)"""
+    fecha = models.DateField(unique=True)
+    ultimo_numero = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Secuencia de Traslados'
+        verbose_name_plural = 'Secuencias de Traslados'
+
+    def __str__(self):
+        return f"{self.fecha:%Y%m%d}: {self.ultimo_numero}"
+
+    @classmethod
+    def siguiente_referencia(cls):
+        """
+        Reserva el siguiente número del día con un UPDATE atómico.
+        La fila queda bloqueada hasta el fin de la transacción, por lo que dos
+        traslados concurrentes nunca obtienen la misma referencia.
+        """
+        from django.db import IntegrityError
+        from django.db.models import F
+        from django.utils import timezone
+
+        hoy = timezone.localdate()
+        with transaction.atomic():
+            if not cls.objects.filter(fecha=hoy).update(ultimo_numero=F('ultimo_numero') + 1):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(fecha=hoy, ultimo_numero=1)
+                except IntegrityError:
+                    # Otro proceso creó el contador del día en paralelo
+                    cls.objects.filter(fecha=hoy).update(ultimo_numero=F('ultimo_numero') + 1)
+            numero = cls.objects.filter(fecha=hoy).values_list('ultimo_numero', flat=True).get()
+        return f'TR-{hoy:%Y%m%d}-{numero:03d}'
+
 class DetalleTraslado(models.Model):
     traslado = models.ForeignKey(
         TrasladoProducto,
@@ -424,20 +675,12 @@ class DetalleTraslado(models.Model):
                     self._original_cantidad_recibida != self.cantidad_recibida)
     
     def save(self, *args, **kwargs):
-        # Guardar el detalle primero
+        # El estado del traslado y el stock se actualizan desde EventoInventario
+        # (ver almacen/signals.py), no aquí
         super().save(*args, **kwargs)
-        
-        # Verificar si todos los detalles tienen cantidad enviada igual a solicitada
-        traslado = self.traslado
-        detalles_completos = all(
-            d.cantidad_enviada == d.cantidad_solicitada 
-            for d in traslado.detalles.all()
-        )
-        
-        # Actualizar estado del traslado si es necesario
-        if detalles_completos and traslado.estado == 'PENDIENTE':
-            traslado.estado = 'EN_PROCESO'
-            traslado.save()
+        self._original_cantidad_enviada = self.cantidad_enviada
+        self._original_cantidad_recibida = self.cantidad_recibida
+
     def clean(self):
         super().clean()
         if self.cantidad_enviada > self.cantidad_solicitada:
@@ -448,6 +691,134 @@ class DetalleTraslado(models.Model):
 
     def __str__(self):
         return f"{self.producto} - {self.cantidad_solicitada} unidades"
+
+
+class SesionConteo(models.Model):
+    """Sesión de conteo físico de inventario de un almacén"""
+    ESTADO_CHOICES = [
+        ('ABIERTA', 'Abierta'),
+        ('CERRADA', 'Cerrada'),
+        ('CANCELADA', 'Cancelada'),
+    ]
+    TIPO_CHOICES = [
+        ('TOTAL', 'Total (lo no contado queda en cero)'),
+        ('PARCIAL', 'Parcial (solo se ajusta lo contado)'),
+    ]
+
+    almacen = models.ForeignKey(Almacen, on_delete=models.PROTECT, related_name='sesiones_conteo')
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES, default='TOTAL')
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='ABIERTA')
+    abierta_por = models.ForeignKey(
+        PerfilUsuario,
+        on_delete=models.PROTECT,
+        related_name='sesiones_conteo_abiertas'
+    )
+    cerrada_por = models.ForeignKey(
+        PerfilUsuario,
+        on_delete=models.PROTECT,
+        related_name='sesiones_conteo_cerradas',
+        null=True,
+        blank=True
+    )
+    fecha_apertura = models.DateTimeField(auto_now_add=True)
+    fecha_cierre = models.DateTimeField(null=True, blank=True)
+    observaciones = models.TextField(blank=True)
+    ajustes_faltante = models.PositiveIntegerField(default=0)
+    ajustes_sobrante = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-fecha_apertura']
+        verbose_name = 'Sesión de Conteo'
+        verbose_name_plural = 'Sesiones de Conteo'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['almacen'],
+                condition=models.Q(estado='ABIERTA'),
+                name='unica_sesion_conteo_abierta_por_almacen'
+            )
+        ]
+
+    def __str__(self):
+        return f"Conteo #{self.id} - {self.almacen} ({self.get_estado_display()})"
+
+
+class ConteoInventario(models.Model):
+    """Cantidades contadas por producto en una sesión (tabla de trabajo)"""
+    sesion = models.ForeignKey(SesionConteo, on_delete=models.CASCADE, related_name='conteos')
+    producto = models.ForeignKey(Producto, on_delete=models.PROTECT)
+    cantidad = models.PositiveIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('sesion', 'producto')
+        verbose_name = 'Conteo de Inventario'
+        verbose_name_plural = 'Conteos de Inventario'
+
+    def __str__(self):
+        return f"{self.producto}: {self.cantidad}"
+
+
+class LoteConteo(models.Model):
+    """Lotes de lecturas ya recibidos, para ignorar reenvíos de los escáneres"""
+    sesion = models.ForeignKey(SesionConteo, on_delete=models.CASCADE, related_name='lotes')
+    identificador = models.CharField(max_length=64)
+    lineas = models.PositiveIntegerField(default=0)
+    recibido = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('sesion', 'identificador')
+
+    def __str__(self):
+        return f"{self.sesion_id}/{self.identificador}"
+
+
+class EventoInventario(models.Model):
+    """
+    Bandeja de salida (outbox) de efectos de inventario pendientes.
+    Se escribe en la misma transacción que el cambio que lo origina y se
+    procesa en lotes luego del commit o desde un worker. Un evento que agota
+    sus intentos queda marcado como fallido y libera su clave.
+    """
+    TIPO_CHOICES = [
+        ('SINCRONIZAR_TRASLADO', 'Sincronizar traslado'),
+    ]
+
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    clave = models.CharField(
+        max_length=100,
+        help_text="Identifica el objeto afectado; evita eventos pendientes duplicados"
+    )
+    datos = models.JSONField(default=dict, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    procesado = models.DateTimeField(null=True, blank=True)
+    fallido = models.DateTimeField(
+        null=True, blank=True,
+        help_text="Momento en que agotó sus intentos; ya no se vuelve a tomar"
+    )
+    intentos = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Evento de Inventario'
+        verbose_name_plural = 'Eventos de Inventario'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tipo', 'clave'],
+                condition=models.Q(procesado__isnull=True, fallido__isnull=True),
+                name='unico_evento_inventario_pendiente'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(procesado__isnull=True, fallido__isnull=True),
+                name='evento_inventario_pendiente'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.clave}"
     
 
 
@@ -1,11 +1,17 @@
 # almacen/serializers.py
 from rest_framework import serializers
 from .models import Producto, Servicio
+from .services import lista_materiales
 
 class ProductoSerializer(serializers.ModelSerializer):
+    # Solo miniaturas: la imagen original no viaja en los listados ni en el POS
+    miniatura = serializers.CharField(read_only=True)
+    miniatura_jpg = serializers.CharField(read_only=True)
+
     class Meta:
         model = Producto
-        fields = ['id', 'codigo', 'nombre', 'precio_minorista', 'precio_mayorista', 'tasa_iva', 'stock_minimo']
+        fields = ['id', 'codigo', 'nombre', 'precio_minorista', 'precio_mayorista', 'tasa_iva', 'stock_minimo',
+                  'miniatura', 'miniatura_jpg']
 
 class ServicioSerializer(serializers.ModelSerializer):
     necesita_inventario = serializers.SerializerMethodField()
@@ -16,4 +22,4 @@ class ServicioSerializer(serializers.ModelSerializer):
                  'tasa_iva', 'duracion_estimada', 'necesita_inventario']
     
     def get_necesita_inventario(self, obj):
-        return obj.tipo == 'COMPUESTO' and obj.componentes.exists()
\ No newline at end of file
+        return obj.tipo == 'COMPUESTO' and bool(lista_materiales(obj.id))
\ No newline at end of file
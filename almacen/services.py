@@ -1,111 +1,1820 @@
 # almacen/services.py
-from django.db import transaction
+import csv
+import io
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Round, TruncWeek
 from django.core.exceptions import ValidationError
-from .models import ConversionProducto, Stock, RegistroConversion, Almacen
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from config.dependencias import cargar_numpy
+from .models import (
+    ConversionProducto, ComponenteConversion, Stock, RegistroConversion,
+    MovimientoInventario, Producto, TrasladoProducto, DetalleTraslado,
+    EventoInventario, Categoria, UnidadMedida, ActualizacionPrecios, HistorialPrecio,
+    TAMANOS_MINIATURA, FORMATOS_MINIATURA, ruta_miniatura,
+    SesionConteo, ConteoInventario, LoteConteo, CostoProducto, ComponenteServicio, Almacen,
+    ClasificacionProducto
+)
+
+logger = logging.getLogger(__name__)
+
+# Cantidad máxima de productos por sentencia UPDATE ... CASE
+TAMANO_LOTE_STOCK = 500
+
+# Catálogo de productos en caché (consultas del POS)
+CLAVE_VERSION_CATALOGO = 'almacen:catalogo:version'
+TIEMPO_CACHE_CATALOGO = 60 * 5
+
+# Listas de materiales de servicios compuestos en caché
+TIEMPO_CACHE_LISTA_MATERIALES = 60 * 60
+
+# Eventos de inventario procesados por lote y reintentos antes de descartarlos
+TAMANO_LOTE_EVENTOS = 500
+MAX_INTENTOS_EVENTO = 5
+
+# Costo promedio ponderado
+PRECISION_COSTO = Decimal('0.0001')
+TIPOS_ENTRADA = ('ENTRADA', 'AJUSTE_SOBRANTE')
+
+# Clasificación ABC/XYZ: semanas completas analizadas y umbrales de cada clase
+SEMANAS_CLASIFICACION = 26
+UMBRAL_CLASE_A = 0.80
+UMBRAL_CLASE_B = 0.95
+UMBRAL_CLASE_X = 0.5
+UMBRAL_CLASE_Y = 1.0
+
+
+def verificar_stock(almacen_id, requeridos, bloquear=False):
+    """
+    Compara en una sola consulta las cantidades requeridas contra el stock
+    de un almacén.
+
+    Args:
+        almacen_id: ID del almacén a verificar
+        requeridos: dict {producto_id: cantidad_necesaria}
+        bloquear: Si es True bloquea las filas de stock (select_for_update)
+
+    Returns:
+        Lista de tuplas (producto_id, necesario, disponible) con los
+        productos cuyo stock no alcanza. Lista vacía si hay stock suficiente.
+    """
+    requeridos = {pid: cant for pid, cant in requeridos.items() if cant > 0}
+    if not requeridos:
+        return []
+
+    stocks = Stock.objects.filter(almacen_id=almacen_id, producto_id__in=requeridos)
+    if bloquear:
+        stocks = stocks.select_for_update()
+    disponibles = dict(stocks.values_list('producto_id', 'cantidad'))
+
+    return [
+        (producto_id, necesario, disponibles.get(producto_id, 0))
+        for producto_id, necesario in requeridos.items()
+        if disponibles.get(producto_id, 0) < necesario
+    ]
+
+
+def _formatear_cantidad(valor):
+    """Muestra las cantidades decimales sin ceros sobrantes (150.000 -> 150)"""
+    if isinstance(valor, Decimal):
+        return f'{valor.normalize():f}'
+    return str(valor)
+
+
+def mensaje_stock_insuficiente(faltantes):
+    """Arma el mensaje de error para los faltantes devueltos por verificar_stock"""
+    nombres = dict(
+        Producto.objects.filter(pk__in=[f[0] for f in faltantes]).values_list('id', 'nombre')
+    )
+    return '; '.join(
+        f'Stock insuficiente de {nombres.get(producto_id, producto_id)}. '
+        f'Necesario: {_formatear_cantidad(necesario)}, Disponible: {disponible}'
+        for producto_id, necesario, disponible in faltantes
+    )
+
+
+def aplicar_ajustes_stock(ajustes):
+    """
+    Aplica variaciones de stock en bloque, sin leer ni guardar cada fila.
+
+    Crea las filas de stock faltantes con un único INSERT y luego suma las
+    variaciones con un UPDATE ... CASE por almacén (en lotes de
+    TAMANO_LOTE_STOCK productos).
+
+    Args:
+        ajustes: dict {(producto_id, almacen_id): variacion} donde la
+                 variación es positiva para entradas y negativa para salidas
+    """
+    por_almacen = defaultdict(dict)
+    for (producto_id, almacen_id), variacion in ajustes.items():
+        if variacion:
+            por_almacen[almacen_id][producto_id] = (
+                por_almacen[almacen_id].get(producto_id, 0) + variacion
+            )
+    if not por_almacen:
+        return
+
+    Stock.objects.bulk_create(
+        [
+            Stock(producto_id=producto_id, almacen_id=almacen_id, cantidad=0)
+            for almacen_id, productos in por_almacen.items()
+            for producto_id in productos
+        ],
+        ignore_conflicts=True
+    )
+
+    ahora = timezone.now()
+    for almacen_id, productos in por_almacen.items():
+        items = list(productos.items())
+        for inicio in range(0, len(items), TAMANO_LOTE_STOCK):
+            lote = items[inicio:inicio + TAMANO_LOTE_STOCK]
+            Stock.objects.filter(
+                almacen_id=almacen_id,
+                producto_id__in=[producto_id for producto_id, _ in lote]
+            ).update(
+                cantidad=Case(
+                    *[When(producto_id=producto_id, then=F('cantidad') + variacion)
+                      for producto_id, variacion in lote],
+                    default=F('cantidad'),
+                    output_field=models.IntegerField()
+                ),
+                ultima_actualizacion=ahora
+            )
+
+
+
+def costo_por_almacen():
+    """Indica si el costo promedio se lleva por almacén o global por producto"""
+    return getattr(settings, 'ALMACEN_COSTO_POR_ALMACEN', False)
+
+
+def _clave_costo(producto_id, almacen_id):
+    return (producto_id, almacen_id if costo_por_almacen() else None)
+
+
+def _bloquear_costos(claves):
+    """
+    Bloquea los registros de costo de las claves dadas, creando los que falten.
+
+    Un registro nuevo se inicializa con el stock vigente valuado al último
+    precio de compra del producto, de modo que el primer movimiento costeado
+    parte de la existencia real.
+
+    Args:
+        claves: set de tuplas (producto_id, almacen_id o None)
+
+    Returns:
+        dict {(producto_id, almacen_id): CostoProducto}
+    """
+    producto_ids = {producto_id for producto_id, _ in claves}
+    almacen_ids = {almacen_id for _, almacen_id in claves if almacen_id is not None}
+
+    def consultar():
+        costos = CostoProducto.objects.select_for_update().filter(producto_id__in=producto_ids)
+        if almacen_ids:
+            costos = costos.filter(almacen_id__in=almacen_ids)
+        else:
+            costos = costos.filter(almacen__isnull=True)
+        return {(c.producto_id, c.almacen_id): c for c in costos}
+
+    costos = consultar()
+    faltantes = [clave for clave in claves if clave not in costos]
+    if faltantes:
+        stocks = Stock.objects.filter(producto_id__in={p for p, _ in faltantes})
+        if almacen_ids:
+            stocks = stocks.filter(almacen_id__in=almacen_ids)
+        existencias = defaultdict(int)
+        for producto_id, almacen_id, cantidad in stocks.values_list('producto_id', 'almacen_id', 'cantidad'):
+            existencias[_clave_costo(producto_id, almacen_id)] += cantidad
+        precios = dict(
+            Producto.objects.filter(pk__in={p for p, _ in faltantes}).values_list('id', 'precio_compra')
+        )
+        CostoProducto.objects.bulk_create(
+            [
+                CostoProducto(
+                    producto_id=producto_id,
+                    almacen_id=almacen_id,
+                    cantidad=max(existencias.get((producto_id, almacen_id), 0), 0),
+                    costo_promedio=precios.get(producto_id) or 0
+                )
+                for producto_id, almacen_id in faltantes
+            ],
+            ignore_conflicts=True
+        )
+        costos = consultar()
+    return costos
+
+
+def registrar_costo_movimientos(movimientos):
+    """
+    Asigna el costo a movimientos de inventario aún no guardados y actualiza
+    el costo promedio ponderado.
+
+    Las entradas (ENTRADA/AJUSTE_SOBRANTE) recalculan el promedio con su
+    costo_unitario; si no lo traen ingresan al promedio vigente. Las salidas
+    (SALIDA/AJUSTE_FALTANTE) quedan con el costo promedio vigente, que es su
+    costo de mercadería vendida. Debe llamarse antes de modificar el stock.
+
+    Los movimientos se procesan en orden, con una consulta de bloqueo y un
+    bulk_update sin importar la cantidad.
+
+    Args:
+        movimientos: Lista de MovimientoInventario sin guardar
+    """
+    if not movimientos:
+        return
+    claves = {_clave_costo(m.producto_id, m.almacen_id) for m in movimientos}
+    costos = _bloquear_costos(claves)
+
+    for movimiento in movimientos:
+        costo = costos[_clave_costo(movimiento.producto_id, movimiento.almacen_id)]
+        if movimiento.tipo in TIPOS_ENTRADA:
+            unitario = (
+                costo.costo_promedio if movimiento.costo_unitario is None
+                else Decimal(movimiento.costo_unitario)
+            )
+            cantidad = int(movimiento.cantidad)
+            total = costo.cantidad + cantidad
+            if total > 0:
+                costo.costo_promedio = (
+                    (costo.cantidad * costo.costo_promedio + cantidad * unitario) / total
+                ).quantize(PRECISION_COSTO)
+            costo.cantidad = total
+            movimiento.costo_unitario = unitario.quantize(PRECISION_COSTO)
+        else:
+            movimiento.costo_unitario = costo.costo_promedio
+            costo.cantidad = max(costo.cantidad - int(movimiento.cantidad), 0)
+
+    ahora = timezone.now()
+    actualizados = [costos[clave] for clave in claves]
+    for costo in actualizados:
+        costo.actualizado = ahora
+    CostoProducto.objects.bulk_update(
+        actualizados, ['cantidad', 'costo_promedio', 'actualizado'], batch_size=TAMANO_LOTE_STOCK
+    )
+
+
+def valorizacion_inventario(almacen_id=None, categoria_id=None):
+    """
+    Valoriza el stock vigente con el costo promedio almacenado, agrupado por
+    producto. Los productos que todavía no tienen costo registrado se
+    valúan al último precio de compra.
+
+    Args:
+        almacen_id: Limita la valorización a un almacén
+        categoria_id: Limita la valorización a una categoría
+
+    Returns:
+        Tupla (filas, totales): filas es un queryset de dicts con
+        producto_id, codigo, nombre, categoria, cantidad y valor; totales es
+        un dict con cantidad y valor
+    """
+    costos = CostoProducto.objects.filter(producto_id=OuterRef('producto_id'))
+    if costo_por_almacen():
+        costos = costos.filter(almacen_id=OuterRef('almacen_id'))
+    else:
+        costos = costos.filter(almacen__isnull=True)
+    costo = Coalesce(
+        Subquery(costos.values('costo_promedio')[:1]),
+        F('producto__precio_compra'),
+        output_field=models.DecimalField(max_digits=14, decimal_places=4)
+    )
+
+    stocks = Stock.objects.filter(cantidad__gt=0)
+    if almacen_id:
+        stocks = stocks.filter(almacen_id=almacen_id)
+    if categoria_id:
+        stocks = stocks.filter(producto__categoria_id=categoria_id)
+    stocks = stocks.annotate(valor_linea=F('cantidad') * costo)
+
+    filas = stocks.values(
+        'producto_id',
+        codigo=F('producto__codigo'),
+        nombre=F('producto__nombre'),
+        categoria=F('producto__categoria__nombre')
+    ).annotate(
+        total_cantidad=Sum('cantidad'),
+        valor=Sum('valor_linea')
+    ).order_by('-valor')
+    totales = stocks.aggregate(cantidad=Sum('cantidad'), valor=Sum('valor_linea'))
+    return filas, totales
+
+
+def _clases_abc(np, ingresos, sucursales):
+    """
+    Clase ABC de cada par según el ingreso acumulado dentro de su sucursal,
+    de mayor a menor. Un producto es A si los que venden más que él no
+    llegan todavía a UMBRAL_CLASE_A del total, B si no llegan a
+    UMBRAL_CLASE_B y C en otro caso (siempre C si no tuvo ingresos).
+
+    Returns:
+        Tupla (clases, participacion) de arrays alineados con ingresos
+    """
+    _, grupos = np.unique(sucursales, return_inverse=True)
+    totales = np.bincount(grupos, weights=ingresos)
+    orden = np.lexsort((-ingresos, grupos))
+
+    # Suma corrida única sobre todas las sucursales: se descuenta lo acumulado
+    # por las sucursales anteriores para obtener el acumulado de cada grupo.
+    ordenados = ingresos[orden]
+    grupo_ordenado = grupos[orden]
+    inicio_grupo = np.concatenate(([0.0], np.cumsum(totales)[:-1]))
+    previo = np.cumsum(ordenados) - ordenados - inicio_grupo[grupo_ordenado]
+    total_grupo = totales[grupo_ordenado]
+    fraccion = np.divide(previo, total_grupo, out=np.ones_like(previo), where=total_grupo > 0)
+
+    clases = np.empty(len(ingresos), dtype='<U1')
+    clases[orden] = np.where(
+        ordenados <= 0, 'C',
+        np.where(fraccion < UMBRAL_CLASE_A, 'A', np.where(fraccion < UMBRAL_CLASE_B, 'B', 'C'))
+    )
+    total_par = totales[grupos]
+    participacion = np.divide(
+        ingresos * 100, total_par, out=np.zeros_like(ingresos), where=total_par > 0
+    )
+    return clases, participacion
+
+
+def _clases_xyz(np, demanda):
+    """
+    Clase XYZ de cada fila de la matriz (pares x semanas) según el
+    coeficiente de variación de sus salidas. Sin salidas es Z.
+
+    Returns:
+        Tupla (clases, coeficientes); el coeficiente es NaN sin salidas
+    """
+    media = demanda.mean(axis=1)
+    coeficientes = np.divide(
+        demanda.std(axis=1), media, out=np.full(len(media), np.nan), where=media > 0
+    )
+    clases = np.where(
+        coeficientes <= UMBRAL_CLASE_X, 'X',
+        np.where(coeficientes <= UMBRAL_CLASE_Y, 'Y', 'Z')
+    )
+    return clases, coeficientes
+
+
+def clasificar_productos(semanas=SEMANAS_CLASIFICACION, sucursal_id=None):
+    """
+    Recalcula la clasificación ABC/XYZ de los productos de cada sucursal.
+
+    Los ingresos salen de las ventas finalizadas y la variabilidad de las
+    salidas semanales (sin traslados) de las últimas semanas completas; cada
+    fuente se agrupa en la base con una sola consulta. Los productos que ya
+    no tuvieron movimiento pierden su clasificación.
+
+    Args:
+        semanas: Semanas completas analizadas, sin contar la actual
+        sucursal_id: Limita el cálculo a una sucursal
+
+    Returns:
+        dict con la cantidad de pares clasificados y el conteo por clase
+    """
+    from ventas.models import DetalleVenta  # Importación local para evitar circular
+
+    np = cargar_numpy('clasificar los productos')
+    if semanas < 1:
+        raise ValidationError('Debe analizarse al menos una semana')
+
+    ahora = timezone.now()
+    hoy = timezone.localdate()
+    lunes = hoy - timedelta(days=hoy.weekday())
+    zona = timezone.get_current_timezone()
+    desde = datetime.combine(lunes - timedelta(weeks=semanas), datetime.min.time(), tzinfo=zona)
+    hasta = datetime.combine(lunes, datetime.min.time(), tzinfo=zona)
+
+    ventas = DetalleVenta.objects.filter(
+        tipo='PRODUCTO',
+        venta__estado='FINALIZADA',
+        venta__fecha__gte=desde,
+        venta__fecha__lt=hasta,
+        producto__isnull=False,
+        almacen__isnull=False
+    )
+    salidas = MovimientoInventario.objects.filter(
+        tipo='SALIDA',
+        traslado__isnull=True,
+        fecha__gte=desde,
+        fecha__lt=hasta
+    )
+    if sucursal_id:
+        ventas = ventas.filter(almacen__sucursal_id=sucursal_id)
+        salidas = salidas.filter(almacen__sucursal_id=sucursal_id)
+
+    indices = {}
+    filas_ingresos = ventas.values('producto_id', 'almacen__sucursal_id').annotate(
+        total=Sum('subtotal')
+    ).order_by().values_list('producto_id', 'almacen__sucursal_id', 'total')
+    montos = []
+    for producto_id, suc_id, total in filas_ingresos:
+        indices[(producto_id, suc_id)] = len(montos)
+        montos.append(total or 0)
+
+    filas_salidas = list(salidas.annotate(semana=TruncWeek('fecha')).values(
+        'producto_id', 'almacen__sucursal_id', 'semana'
+    ).annotate(total=Sum('cantidad')).order_by().values_list(
+        'producto_id', 'almacen__sucursal_id', 'semana', 'total'
+    ))
+    for producto_id, suc_id, _, _ in filas_salidas:
+        if (producto_id, suc_id) not in indices:
+            indices[(producto_id, suc_id)] = len(montos)
+            montos.append(0)
+
+    demanda = np.zeros((len(montos), semanas))
+    inicio = lunes - timedelta(weeks=semanas)
+    for producto_id, suc_id, semana, total in filas_salidas:
+        if isinstance(semana, datetime):
+            semana = timezone.localtime(semana).date() if timezone.is_aware(semana) else semana.date()
+        columna = (semana - inicio).days // 7
+        if 0 <= columna < semanas:
+            demanda[indices[(producto_id, suc_id)], columna] += total
+
+    clasificaciones = []
+    if montos:
+        pares = list(indices)
+        ingresos = np.array([float(m) for m in montos])
+        clases_abc, participacion = _clases_abc(
+            np, ingresos, np.array([suc_id for _, suc_id in pares])
+        )
+        clases_xyz, coeficientes = _clases_xyz(np, demanda)
+        for i, (producto_id, suc_id) in enumerate(pares):
+            coeficiente = coeficientes[i]
+            clasificaciones.append(ClasificacionProducto(
+                producto_id=producto_id,
+                sucursal_id=suc_id,
+                clase_abc=str(clases_abc[i]),
+                clase_xyz=str(clases_xyz[i]),
+                ingresos=montos[i],
+                participacion=Decimal(f'{participacion[i]:.4f}'),
+                coeficiente_variacion=None if np.isnan(coeficiente) else Decimal(f'{coeficiente:.3f}'),
+                actualizado=ahora
+            ))
+
+    with transaction.atomic():
+        ClasificacionProducto.objects.bulk_create(
+            clasificaciones,
+            batch_size=TAMANO_LOTE_IMPORTACION,
+            update_conflicts=True,
+            unique_fields=['producto', 'sucursal'],
+            update_fields=[
+                'clase_abc', 'clase_xyz', 'ingresos', 'participacion',
+                'coeficiente_variacion', 'actualizado'
+            ]
+        )
+        obsoletas = ClasificacionProducto.objects.filter(actualizado__lt=ahora)
+        if sucursal_id:
+            obsoletas = obsoletas.filter(sucursal_id=sucursal_id)
+        eliminadas, _ = obsoletas.delete()
+
+    conteo = defaultdict(int)
+    for c in clasificaciones:
+        conteo[c.clase] += 1
+    return {
+        'clasificados': len(clasificaciones),
+        'eliminados': eliminadas,
+        'clases': dict(sorted(conteo.items())),
+    }
+
+
+def anotar_clasificacion(queryset, campo_producto='producto_id', campo_sucursal='almacen__sucursal_id'):
+    """
+    Agrega clase_abc y clase_xyz a un queryset que tenga producto y sucursal
+    (directa o a través del almacén), leyendo la tabla de clasificación.
+    """
+    clasificacion = ClasificacionProducto.objects.filter(
+        producto_id=OuterRef(campo_producto),
+        sucursal_id=OuterRef(campo_sucursal)
+    )
+    return queryset.annotate(
+        clase_abc=Subquery(clasificacion.values('clase_abc')[:1]),
+        clase_xyz=Subquery(clasificacion.values('clase_xyz')[:1])
+    )
+
+def clave_catalogo(*partes):
+    """
+    Arma una clave de caché del catálogo que incluye la versión vigente,
+    de modo que invalidar_catalogo() deja obsoletas todas las claves a la vez.
+    """
+    version = cache.get(CLAVE_VERSION_CATALOGO)
+    if version is None:
+        cache.add(CLAVE_VERSION_CATALOGO, time.time_ns(), None)
+        version = cache.get(CLAVE_VERSION_CATALOGO)
+    return ':'.join(['almacen:catalogo', str(version), *map(str, partes)])
+
+
+def invalidar_catalogo():
+    """
+    Invalida todo el catálogo en caché con una sola escritura (nueva versión).
+    Si hay una transacción en curso se aplica al confirmarla, para que nadie
+    vuelva a cachear los datos anteriores.
+    """
+    transaction.on_commit(
+        lambda: cache.set(CLAVE_VERSION_CATALOGO, time.time_ns(), None)
+    )
+
+
+
+def clave_lista_materiales(servicio_id, version):
+    return f'almacen:servicio:{servicio_id}:materiales:{version}'
+
+
+def _clave_version_materiales(servicio_id):
+    return f'almacen:servicio:{servicio_id}:materiales:version'
+
+
+def _versiones_materiales(servicio_ids):
+    """
+    Versión vigente de la lista de materiales de cada servicio. Se lee antes
+    que los componentes: si la receta cambia mientras tanto, lo calculado
+    queda guardado bajo la versión anterior y nadie vuelve a leerlo.
+    """
+    claves = {_clave_version_materiales(servicio_id): servicio_id for servicio_id in servicio_ids}
+    versiones = {claves[clave]: version for clave, version in cache.get_many(claves).items()}
+    faltantes = {servicio_id: time.time_ns() for servicio_id in servicio_ids - versiones.keys()}
+    if faltantes:
+        # Pisar una versión recién invalidada es inofensivo: cualquier versión
+        # nueva deja obsoleto lo cacheado antes
+        cache.set_many(
+            {_clave_version_materiales(servicio_id): version for servicio_id, version in faltantes.items()},
+            None
+        )
+        versiones.update(faltantes)
+    return versiones
+
+
+def listas_materiales(servicio_ids):
+    """
+    Lista de materiales aplanada de varios servicios.
+
+    Lee primero de la caché (get_many) y resuelve todos los servicios que
+    falten con una sola consulta. Los servicios simples o sin componentes
+    quedan con lista vacía, que también se cachea.
+
+    Args:
+        servicio_ids: IDs de los servicios
+
+    Returns:
+        dict {servicio_id: [(producto_id, cantidad_por_unidad), ...]}
+    """
+    servicio_ids = set(servicio_ids)
+    if not servicio_ids:
+        return {}
+    versiones = _versiones_materiales(servicio_ids)
+    claves = {
+        clave_lista_materiales(servicio_id, versiones.get(servicio_id)): servicio_id
+        for servicio_id in servicio_ids
+    }
+    resultado = {claves[clave]: lista for clave, lista in cache.get_many(claves).items()}
+
+    faltantes = servicio_ids - resultado.keys()
+    if faltantes:
+        acumulado = defaultdict(lambda: defaultdict(Decimal))
+        for servicio_id, producto_id, cantidad in ComponenteServicio.objects.filter(
+            servicio_id__in=faltantes, servicio__tipo='COMPUESTO'
+        ).values_list('servicio_id', 'producto_id', 'cantidad'):
+            acumulado[servicio_id][producto_id] += cantidad
+        nuevos = {
+            servicio_id: sorted(acumulado[servicio_id].items()) for servicio_id in faltantes
+        }
+        cache.set_many(
+            {
+                clave_lista_materiales(servicio_id, versiones.get(servicio_id)): lista
+                for servicio_id, lista in nuevos.items()
+            },
+            TIEMPO_CACHE_LISTA_MATERIALES
+        )
+        resultado.update(nuevos)
+    return resultado
+
+
+def lista_materiales(servicio_id):
+    """Lista de materiales aplanada de un servicio: [(producto_id, cantidad_por_unidad)]"""
+    return listas_materiales([servicio_id])[servicio_id]
+
+
+def invalidar_lista_materiales(servicio_id):
+    """
+    Deja obsoleta la lista de materiales cacheada de un servicio al
+    confirmar la transacción (nueva versión, visible en todos los workers).
+    """
+    transaction.on_commit(
+        lambda: cache.set(_clave_version_materiales(servicio_id), time.time_ns(), None)
+    )
+
+
+def requerimientos_venta(detalles):
+    """
+    Expande las líneas de una venta en cantidades de producto por almacén.
+
+    Los productos suman su cantidad en su almacén; los servicios compuestos
+    suman sus materiales (cantidad por unidad x cantidad vendida) en el
+    almacén del servicio, o en el almacén principal si no tiene uno. Las
+    listas de materiales se obtienen de una vez para todo el carrito.
+
+    Args:
+        detalles: DetalleVenta (guardados o no) u objetos con los mismos campos
+
+    Returns:
+        dict {almacen_id: {producto_id: cantidad}}
+    """
+    detalles = list(detalles)
+    materiales = listas_materiales(
+        d.servicio_id for d in detalles if d.tipo == 'SERVICIO' and d.servicio_id
+    )
+    principal = None
+    requeridos = defaultdict(lambda: defaultdict(Decimal))
+    for detalle in detalles:
+        if detalle.tipo == 'PRODUCTO':
+            if detalle.producto_id and detalle.almacen_id:
+                requeridos[detalle.almacen_id][detalle.producto_id] += detalle.cantidad
+            continue
+        lista = materiales.get(detalle.servicio_id)
+        if not lista:
+            continue
+        almacen_id = detalle.almacen_servicio_id
+        if not almacen_id:
+            if principal is None:
+                principal = Almacen.objects.filter(es_principal=True).values_list('id', flat=True).first()
+                if principal is None:
+                    raise ValidationError('No se encontró almacén para los componentes del servicio')
+            almacen_id = principal
+        for producto_id, cantidad in lista:
+            requeridos[almacen_id][producto_id] += cantidad * detalle.cantidad
+    return requeridos
+
+
+def verificar_stock_venta(detalles, bloquear=False):
+    """
+    Verifica el stock de todo un carrito: una consulta por almacén
+    involucrado, sin importar la cantidad de líneas ni de componentes.
+
+    Args:
+        detalles: Líneas de la venta (ver requerimientos_venta)
+        bloquear: Si es True bloquea las filas de stock (select_for_update)
+
+    Returns:
+        Lista de tuplas (producto_id, necesario, disponible) con los faltantes
+    """
+    faltantes = []
+    for almacen_id, requeridos in requerimientos_venta(detalles).items():
+        faltantes.extend(verificar_stock(almacen_id, requeridos, bloquear=bloquear))
+    return faltantes
+
+def _cantidades_conversion(conversion_id, ejecuciones):
+    """
+    Devuelve las cantidades totales por producto de una conversión.
+
+    Returns:
+        Tupla (origen, destino) de dicts {producto_id: cantidad}
+    """
+    origen, destino = {}, {}
+    componentes = ComponenteConversion.objects.filter(
+        conversion_id=conversion_id
+    ).values_list('producto_id', 'tipo', 'cantidad')
+
+    for producto_id, tipo, cantidad in componentes:
+        totales = origen if tipo == 'ORIGEN' else destino
+        totales[producto_id] = totales.get(producto_id, 0) + cantidad * ejecuciones
+    return origen, destino
+
+
+def _cantidades_registradas(registro):
+    """
+    Cantidades que movió realmente una conversión, tomadas de sus
+    movimientos y no de la receta actual (que pudo cambiar después).
+
+    Returns:
+        Tupla (origen, destino) de dicts {producto_id: cantidad}
+    """
+    origen, destino = {}, {}
+    movimientos = registro.movimientos.values('producto_id', 'tipo').annotate(
+        total=Sum('cantidad')
+    ).order_by()
+    for fila in movimientos:
+        totales = origen if fila['tipo'] == 'SALIDA' else destino
+        totales[fila['producto_id']] = fila['total']
+    if not origen and not destino:
+        # Registros anteriores a la vinculación de movimientos: solo queda la receta
+        return _cantidades_conversion(registro.conversion_id, registro.cantidad_ejecuciones)
+    return origen, destino
+
+
+def _registrar_conversion(registro, salidas, entradas, usuario, motivo):
+    """
+    Inserta los movimientos de inventario de una conversión con un solo
+    INSERT y aplica el efecto en stock de forma set-based.
+
+    Los movimientos quedan vinculados al registro para auditoría; se crean con
+    bulk_create, por lo que MovimientoInventario.save() no vuelve a tocar el stock.
+    """
+    almacen_id = registro.almacen_id
+    movimientos = {
+        tipo: [
+            MovimientoInventario(
+                producto_id=producto_id,
+                almacen_id=almacen_id,
+                cantidad=cantidad,
+                tipo=tipo,
+                usuario=usuario,
+                motivo=motivo,
+                registro_conversion=registro
+            )
+            for producto_id, cantidad in cantidades.items()
+        ]
+        for tipo, cantidades in (('SALIDA', salidas), ('ENTRADA', entradas))
+    }
+
+    # El costo de lo consumido (más el costo adicional de la conversión) se
+    # reparte entre las unidades producidas
+    registrar_costo_movimientos(movimientos['SALIDA'])
+    costo_total = sum(m.cantidad * m.costo_unitario for m in movimientos['SALIDA'])
+    if not registro.relacion_reversion_id:
+        costo_total += registro.conversion.costo_adicional * registro.cantidad_ejecuciones
+    unidades = sum(entradas.values())
+    for movimiento in movimientos['ENTRADA']:
+        movimiento.costo_unitario = costo_total / unidades
+    registrar_costo_movimientos(movimientos['ENTRADA'])
+
+    MovimientoInventario.objects.bulk_create(movimientos['SALIDA'] + movimientos['ENTRADA'])
+
+    ajustes = defaultdict(int)
+    for producto_id, cantidad in salidas.items():
+        ajustes[(producto_id, almacen_id)] -= cantidad
+    for producto_id, cantidad in entradas.items():
+        ajustes[(producto_id, almacen_id)] += cantidad
+    aplicar_ajustes_stock(ajustes)
+
 
 @transaction.atomic
 def convertir_producto(conversion_id, almacen_id, cantidad, usuario, motivo=""):
     """
     Ejecuta una conversión entre productos (ensamblaje/desensamblaje)
-    
+    según sus componentes ORIGEN y DESTINO.
+
+    La cantidad de consultas no depende de la cantidad de ejecuciones ni
+    de la cantidad de componentes.
+
     Args:
         conversion_id: ID de la ConversionProducto configurada
         almacen_id: ID del almacén donde se realiza
-        cantidad: Unidades a convertir
-        usuario: Usuario que realiza la acción
+        cantidad: Veces que se ejecuta la conversión
+        usuario: PerfilUsuario que realiza la acción
         motivo: Justificación opcional
     """
     conversion = ConversionProducto.objects.get(pk=conversion_id)
-    almacen = Almacen.objects.get(pk=almacen_id)
-    
-    # Verificación de stock
-    stock_origen = Stock.objects.get(
-        producto=conversion.producto_origen,
-        almacen=almacen
-    )
-    if stock_origen.cantidad < cantidad:
-        raise ValidationError(
-            f"Stock insuficiente de {conversion.producto_origen.nombre}. "
-            f"Necesario: {cantidad}, Disponible: {stock_origen.cantidad}"
-        )
-    
-    # Cálculo de resultados
-    cantidad_destino = cantidad * conversion.cantidad_destino
-    
-    # Actualización de stock
-    stock_origen.cantidad -= cantidad
-    stock_origen.save()
-    
-    stock_destino, _ = Stock.objects.get_or_create(
-        producto=conversion.producto_destino,
-        almacen=almacen,
-        defaults={'cantidad': 0}
-    )
-    stock_destino.cantidad += cantidad_destino
-    stock_destino.save()
-    
-    # Registro auditoría
+    if not conversion.activo:
+        raise ValidationError("La conversión seleccionada no está activa")
+    if cantidad <= 0:
+        raise ValidationError("La cantidad debe ser mayor a cero")
+
+    origen, destino = _cantidades_conversion(conversion.pk, cantidad)
+    if not origen or not destino:
+        raise ValidationError("La conversión debe tener al menos un producto origen y un producto destino")
+
+    # Verificación de stock de todos los orígenes en una consulta (con bloqueo)
+    faltantes = verificar_stock(almacen_id, origen, bloquear=True)
+    if faltantes:
+        raise ValidationError(mensaje_stock_insuficiente(faltantes))
+
     registro = RegistroConversion.objects.create(
-        tipo_conversion=conversion.tipo_conversion,
-        producto_origen=conversion.producto_origen,
-        producto_destino=conversion.producto_destino,
-        cantidad_origen=cantidad,
-        cantidad_destino=cantidad_destino,
-        almacen=almacen,
+        conversion=conversion,
+        almacen_id=almacen_id,
+        cantidad_ejecuciones=cantidad,
         usuario=usuario,
         motivo=motivo
     )
-    
-    return registro
 
+    _registrar_conversion(
+        registro,
+        salidas=origen,
+        entradas=destino,
+        usuario=usuario,
+        motivo=f"Conversión #{registro.id}: {conversion.nombre}"
+    )
+
+    return registro
 
 
-# almacen/services.py (continuación)
 @transaction.atomic
 def revertir_conversion(registro_id, usuario, motivo=""):
     """
-    Revierte una conversión registrada previamente
-    
+    Revierte una conversión registrada previamente: devuelve los productos
+    origen y descuenta los productos destino.
+
     Args:
         registro_id: ID del RegistroConversion a revertir
-        usuario: Usuario que realiza la reversión
+        usuario: PerfilUsuario que realiza la reversión
         motivo: Justificación opcional
     """
-    original = RegistroConversion.objects.get(pk=registro_id)
-    
+    original = RegistroConversion.objects.select_for_update().select_related(
+        'conversion'
+    ).get(pk=registro_id)
+
     if original.revertido:
         raise ValidationError("Esta conversión ya fue revertida")
-    
-    # Crear registro inverso
+    if original.relacion_reversion_id:
+        raise ValidationError("No se puede revertir un registro de reversión")
+
+    origen, destino = _cantidades_registradas(original)
+
+    # Los productos destino deben seguir disponibles para poder descontarlos
+    faltantes = verificar_stock(original.almacen_id, destino, bloquear=True)
+    if faltantes:
+        raise ValidationError(mensaje_stock_insuficiente(faltantes))
+
     registro = RegistroConversion.objects.create(
-        tipo_conversion=original.tipo_conversion,
-        producto_origen=original.producto_destino,
-        producto_destino=original.producto_origen,
-        cantidad_origen=original.cantidad_destino,
-        cantidad_destino=original.cantidad_origen,
-        almacen=original.almacen,
+        conversion=original.conversion,
+        almacen_id=original.almacen_id,
+        cantidad_ejecuciones=original.cantidad_ejecuciones,
         usuario=usuario,
-        motivo=f"Reversión de #{original.id}: {motivo}",
+        motivo=f"Reversión de #{original.id}: {motivo}" if motivo else f"Reversión de #{original.id}",
         relacion_reversion=original
     )
-    
-    # Revertir stocks
-    stock_origen = Stock.objects.get(
-        producto=original.producto_origen,
-        almacen=original.almacen
-    )
-    stock_origen.cantidad += original.cantidad_origen
-    stock_origen.save()
-    
-    stock_destino = Stock.objects.get(
-        producto=original.producto_destino,
-        almacen=original.almacen
-    )
-    stock_destino.cantidad -= original.cantidad_destino
-    stock_destino.save()
-    
+
+    _registrar_conversion(
+        registro,
+        salidas=destino,
+        entradas=origen,
+        usuario=usuario,
+        motivo=f"Reversión de conversión #{original.id}: {original.conversion.nombre}"
+    )
+
     # Marcar como revertido
     original.revertido = True
-    original.save()
-    
-    return registro
\ No newline at end of file
+    original.save(update_fields=['revertido'])
+
+    return registro
+
+
+def _bloquear_traslado(traslado_id, estado_esperado):
+    """Bloquea el traslado y valida que esté en el estado esperado"""
+    traslado = TrasladoProducto.objects.select_for_update().select_related(
+        'almacen_origen', 'almacen_destino'
+    ).get(pk=traslado_id)
+    if traslado.estado != estado_esperado:
+        raise ValidationError(f'El traslado no está en estado {estado_esperado}')
+    return traslado
+
+
+def _movimientos_traslado(traslado, detalles, campo, tipo, almacen, usuario, motivo):
+    """Construye los movimientos de inventario de un traslado para bulk_create"""
+    return [
+        MovimientoInventario(
+            producto_id=detalle.producto_id,
+            almacen=almacen,
+            cantidad=getattr(detalle, campo),
+            tipo=tipo,
+            usuario=usuario,
+            motivo=motivo,
+            traslado=traslado
+        )
+        for detalle in detalles
+        if getattr(detalle, campo) > 0
+    ]
+
+
+def _costear_entradas_traslado(movimientos):
+    """
+    Las entradas de un traslado ingresan al costo con el que salieron del
+    almacén de origen (el costo no cambia por mover la mercadería).
+    """
+    if not movimientos:
+        return
+    costos_salida = dict(
+        MovimientoInventario.objects.filter(
+            traslado_id__in={m.traslado_id for m in movimientos},
+            tipo='SALIDA',
+            costo_unitario__isnull=False
+        ).values_list('producto_id', 'costo_unitario')
+    )
+    for movimiento in movimientos:
+        movimiento.costo_unitario = costos_salida.get(movimiento.producto_id)
+    registrar_costo_movimientos(movimientos)
+
+
+@transaction.atomic
+def despachar_traslado(traslado_id, cantidades, usuario):
+    """
+    Despacha un traslado completo desde el almacén de origen.
+
+    Valida todas las líneas antes de modificar nada, verifica el stock de
+    origen en una sola consulta con bloqueo, actualiza los detalles con un
+    bulk_update, inserta las salidas con un único INSERT y descuenta el stock
+    de forma set-based. La cantidad de consultas no depende de la cantidad
+    de líneas.
+
+    Args:
+        traslado_id: ID del TrasladoProducto a despachar
+        cantidades: dict {detalle_id: cantidad_enviada}
+        usuario: PerfilUsuario responsable del despacho
+    """
+    traslado = _bloquear_traslado(traslado_id, 'PENDIENTE')
+    detalles = list(traslado.detalles.select_related('producto'))
+
+    errores = []
+    requeridos = defaultdict(int)
+    for detalle in detalles:
+        cantidad = cantidades.get(detalle.id, 0)
+        if cantidad <= 0:
+            errores.append(f'La cantidad para {detalle.producto.nombre} debe ser mayor a cero')
+        elif cantidad > detalle.cantidad_solicitada:
+            errores.append(
+                f'No puedes enviar más de lo solicitado para {detalle.producto.nombre}. '
+                f'Solicitado: {detalle.cantidad_solicitada}'
+            )
+        detalle.cantidad_enviada = cantidad
+        requeridos[detalle.producto_id] += cantidad
+    if errores:
+        raise ValidationError(errores)
+
+    faltantes = verificar_stock(traslado.almacen_origen_id, requeridos, bloquear=True)
+    if faltantes:
+        raise ValidationError(mensaje_stock_insuficiente(faltantes))
+
+    DetalleTraslado.objects.bulk_update(detalles, ['cantidad_enviada'], batch_size=TAMANO_LOTE_STOCK)
+    movimientos = _movimientos_traslado(
+        traslado, detalles, 'cantidad_enviada', 'SALIDA', traslado.almacen_origen, usuario,
+        f"Traslado {traslado.referencia} hacia {traslado.almacen_destino}"
+    )
+    registrar_costo_movimientos(movimientos)
+    MovimientoInventario.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE_STOCK)
+    aplicar_ajustes_stock({
+        (producto_id, traslado.almacen_origen_id): -cantidad
+        for producto_id, cantidad in requeridos.items()
+    })
+
+    traslado.responsable = usuario
+    traslado.estado = 'EN_PROCESO'
+    traslado.save(update_fields=['responsable', 'estado'])
+    return traslado
+
+
+@transaction.atomic
+def recepcionar_traslado(traslado_id, cantidades, usuario):
+    """
+    Registra la recepción de un traslado completo en el almacén de destino.
+
+    Actualiza los detalles con un bulk_update, inserta las entradas con un
+    único INSERT y suma el stock de destino de forma set-based.
+
+    Args:
+        traslado_id: ID del TrasladoProducto a recibir
+        cantidades: dict {detalle_id: cantidad_recibida}
+        usuario: PerfilUsuario que recibe la mercadería
+    """
+    traslado = _bloquear_traslado(traslado_id, 'EN_PROCESO')
+    detalles = list(traslado.detalles.select_related('producto'))
+
+    errores = []
+    for detalle in detalles:
+        cantidad = cantidades.get(detalle.id, 0)
+        if cantidad <= 0:
+            errores.append(f'La cantidad para {detalle.producto.nombre} debe ser mayor a cero')
+        elif cantidad > detalle.cantidad_enviada:
+            errores.append(
+                f'No puedes recibir más de lo enviado para {detalle.producto.nombre}. '
+                f'Enviado: {detalle.cantidad_enviada}'
+            )
+        detalle.cantidad_recibida = cantidad
+    if errores:
+        raise ValidationError(errores)
+
+    DetalleTraslado.objects.bulk_update(detalles, ['cantidad_recibida'], batch_size=TAMANO_LOTE_STOCK)
+    movimientos = _movimientos_traslado(
+        traslado, detalles, 'cantidad_recibida', 'ENTRADA', traslado.almacen_destino, usuario,
+        f"Traslado {traslado.referencia} desde {traslado.almacen_origen}"
+    )
+    _costear_entradas_traslado(movimientos)
+    MovimientoInventario.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE_STOCK)
+    ajustes = defaultdict(int)
+    for detalle in detalles:
+        ajustes[(detalle.producto_id, traslado.almacen_destino_id)] += detalle.cantidad_recibida
+    aplicar_ajustes_stock(ajustes)
+
+    traslado.estado = 'COMPLETADO'
+    traslado.fecha_completado = timezone.now()
+    traslado.save(update_fields=['estado', 'fecha_completado'])
+    return traslado
+
+
+def encolar_evento_inventario(tipo, clave, datos=None):
+    """
+    Registra un efecto de inventario pendiente en la bandeja de salida.
+
+    Si ya existe un evento pendiente con el mismo tipo y clave no se crea
+    otro: el consumidor trabaja sobre el estado actual, por lo que un solo
+    evento cubre todos los cambios acumulados.
+
+    Args:
+        tipo: Tipo de evento (EventoInventario.TIPO_CHOICES)
+        clave: Identificador del objeto afectado
+        datos: dict con los datos que necesita el consumidor
+    """
+    EventoInventario.objects.bulk_create(
+        [EventoInventario(tipo=tipo, clave=str(clave), datos=datos or {})],
+        ignore_conflicts=True
+    )
+    if getattr(settings, 'ALMACEN_PROCESAR_EVENTOS_AL_CONFIRMAR', True):
+        transaction.on_commit(procesar_eventos_inventario, robust=True)
+
+
+def _sincronizar_traslados(datos):
+    """
+    Consumidor de SINCRONIZAR_TRASLADO.
+
+    Registra las entradas recibidas que aún no tienen movimiento (comparando
+    contra los movimientos ya vinculados al traslado, por lo que es
+    idempotente) y recalcula el estado de cada traslado.
+    """
+    traslado_ids = {d['traslado_id'] for d in datos}
+    traslados = TrasladoProducto.objects.select_for_update().select_related(
+        'almacen_origen'
+    ).in_bulk(traslado_ids)
+
+    detalles = defaultdict(list)
+    for detalle in DetalleTraslado.objects.filter(traslado_id__in=traslados):
+        detalles[detalle.traslado_id].append(detalle)
+
+    registrado = {
+        (m['traslado_id'], m['producto_id']): m['total']
+        for m in MovimientoInventario.objects.filter(
+            traslado_id__in=traslados, tipo='ENTRADA'
+        ).values('traslado_id', 'producto_id').annotate(total=Sum('cantidad'))
+    }
+
+    movimientos = []
+    ajustes = defaultdict(int)
+    actualizados = []
+    ahora = timezone.now()
+    for traslado_id, traslado in traslados.items():
+        for detalle in detalles[traslado_id]:
+            pendiente = detalle.cantidad_recibida - registrado.get((traslado_id, detalle.producto_id), 0)
+            if pendiente > 0:
+                movimientos.append(MovimientoInventario(
+                    producto_id=detalle.producto_id,
+                    almacen_id=traslado.almacen_destino_id,
+                    cantidad=pendiente,
+                    tipo='ENTRADA',
+                    usuario_id=traslado.responsable_id or traslado.solicitante_id,
+                    motivo=f"Traslado {traslado.referencia} desde {traslado.almacen_origen}",
+                    traslado=traslado
+                ))
+                ajustes[(detalle.producto_id, traslado.almacen_destino_id)] += pendiente
+
+        if traslado.estado in ('COMPLETADO', 'CANCELADO') or not detalles[traslado_id]:
+            continue
+        enviados = [d for d in detalles[traslado_id] if d.cantidad_enviada > 0]
+        if enviados and all(d.cantidad_recibida == d.cantidad_enviada for d in enviados):
+            traslado.estado = 'COMPLETADO'
+            traslado.fecha_completado = ahora
+            actualizados.append(traslado)
+        elif traslado.estado == 'PENDIENTE' and all(
+            d.cantidad_enviada == d.cantidad_solicitada for d in detalles[traslado_id]
+        ):
+            traslado.estado = 'EN_PROCESO'
+            actualizados.append(traslado)
+
+    _costear_entradas_traslado(movimientos)
+    MovimientoInventario.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE_STOCK)
+    aplicar_ajustes_stock(ajustes)
+    TrasladoProducto.objects.bulk_update(actualizados, ['estado', 'fecha_completado'])
+
+
+CONSUMIDORES_EVENTOS = {
+    'SINCRONIZAR_TRASLADO': _sincronizar_traslados,
+}
+
+
+def _registrar_fallo_evento(evento, error):
+    """
+    Suma un intento fallido al evento. Al agotar MAX_INTENTOS_EVENTO queda
+    marcado como fallido: ya no se toma y libera su clave para eventos nuevos.
+    """
+    intentos = evento.intentos + 1
+    fallido = timezone.now() if intentos >= MAX_INTENTOS_EVENTO else None
+    if fallido:
+        logger.error(
+            'Evento de inventario %s (%s %s) descartado tras %s intentos: %s',
+            evento.pk, evento.tipo, evento.clave, intentos, error
+        )
+    EventoInventario.objects.filter(pk=evento.pk).update(
+        intentos=intentos,
+        error=str(error),
+        fallido=fallido
+    )
+
+
+def _consumir_eventos(tipo, lote):
+    """
+    Consume un lote de eventos del mismo tipo dentro de un savepoint. Si el
+    lote falla se reintenta de a un evento, cada uno en su savepoint, para
+    que solo los que fallan gasten sus intentos.
+
+    Returns:
+        Lista de ids de los eventos procesados
+    """
+    try:
+        with transaction.atomic():
+            CONSUMIDORES_EVENTOS[tipo]([evento.datos for evento in lote])
+        return [evento.pk for evento in lote]
+    except Exception as e:
+        logger.exception('Error al procesar eventos de inventario %s', tipo)
+        if len(lote) == 1:
+            _registrar_fallo_evento(lote[0], e)
+            return []
+
+    procesados = []
+    for evento in lote:
+        try:
+            with transaction.atomic():
+                CONSUMIDORES_EVENTOS[tipo]([evento.datos])
+        except Exception as e:
+            _registrar_fallo_evento(evento, e)
+        else:
+            procesados.append(evento.pk)
+    return procesados
+
+
+def procesar_eventos_inventario(limite=TAMANO_LOTE_EVENTOS):
+    """
+    Procesa un lote de eventos pendientes de la bandeja de salida.
+
+    Los eventos se toman con select_for_update(skip_locked=True), de modo que
+    varios workers pueden ejecutarse en paralelo sin procesar dos veces el
+    mismo evento. Cada tipo se consume en bloque dentro de un savepoint; si
+    falla, sus eventos se reintentan de a uno y solo los que fallan quedan
+    pendientes con el error registrado (o fallidos, al agotar sus intentos).
+
+    Args:
+        limite: Cantidad máxima de eventos a tomar
+
+    Returns:
+        Cantidad de eventos procesados correctamente
+    """
+    with transaction.atomic():
+        eventos = list(
+            EventoInventario.objects.select_for_update(skip_locked=True).filter(
+                procesado__isnull=True,
+                fallido__isnull=True
+            ).order_by('id')[:limite]
+        )
+        if not eventos:
+            return 0
+
+        por_tipo = defaultdict(list)
+        for evento in eventos:
+            por_tipo[evento.tipo].append(evento)
+
+        procesados = []
+        for tipo, lote in por_tipo.items():
+            procesados.extend(_consumir_eventos(tipo, lote))
+
+        EventoInventario.objects.filter(pk__in=procesados).update(
+            procesado=timezone.now(),
+            intentos=F('intentos') + 1,
+            error=''
+        )
+    return len(procesados)
+
+
+# Filas de productos procesadas por transacción durante la importación
+TAMANO_LOTE_IMPORTACION = 1000
+
+# Mayor valor de una columna entera (PositiveIntegerField en PostgreSQL)
+MAXIMO_ENTERO_IMPORTACION = 2147483647
+
+CAMPOS_IMPORTACION = [
+    'codigo', 'nombre', 'descripcion', 'categoria', 'unidad_medida',
+    'precio_minorista', 'precio_mayorista', 'tasa_iva', 'stock_minimo', 'activo'
+]
+
+
+def _normalizar_encabezado(valor):
+    return str(valor or '').strip().lower().replace(' ', '_')
+
+
+def leer_filas_productos(archivo, nombre_archivo):
+    """
+    Lee un archivo CSV o XLSX fila por fila, sin cargarlo completo en memoria.
+
+    La primera fila debe contener los encabezados (ver CAMPOS_IMPORTACION).
+    Los CSV se leen en UTF-8 y se detecta si el separador es coma o punto y coma.
+
+    Yields:
+        Tuplas (numero_fila, dict {campo: valor})
+    """
+    if nombre_archivo.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValidationError('Para importar archivos XLSX debe instalarse openpyxl')
+
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            filas = libro.active.iter_rows(values_only=True)
+            encabezados = [_normalizar_encabezado(v) for v in next(filas, [])]
+            for numero, valores in enumerate(filas, start=2):
+                if any(v not in (None, '') for v in valores):
+                    yield numero, dict(zip(encabezados, valores))
+        finally:
+            libro.close()
+        return
+
+    if not nombre_archivo.lower().endswith('.csv'):
+        raise ValidationError('Formato no soportado. Use un archivo .csv o .xlsx')
+
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.readline()
+    separador = ';' if muestra.count(';') > muestra.count(',') else ','
+    encabezados = [_normalizar_encabezado(v) for v in next(csv.reader([muestra], delimiter=separador), [])]
+    for numero, valores in enumerate(csv.reader(texto, delimiter=separador), start=2):
+        if any(v.strip() for v in valores):
+            yield numero, dict(zip(encabezados, valores))
+
+
+def _texto(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def _decimal(valor):
+    """Acepta números nativos (XLSX) o texto con coma decimal (1.500,50)"""
+    if isinstance(valor, (int, float, Decimal)):
+        return Decimal(str(valor))
+    texto = _texto(valor)
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    return Decimal(texto)
+
+
+def _validar_largo(modelo, campo, texto, etiqueta=None):
+    """Evita que un texto más largo que la columna haga fallar el INSERT del lote"""
+    largo = modelo._meta.get_field(campo).max_length
+    if largo and len(texto) > largo:
+        raise ValidationError(f'{etiqueta or campo} supera los {largo} caracteres')
+
+
+def _convertir_fila_producto(datos, categorias, unidades, crear_categorias):
+    """
+    Valida y convierte una fila del archivo a valores de Producto.
+    Solo se incluyen los campos presentes en el archivo.
+    """
+    valores = {}
+    for campo in CAMPOS_IMPORTACION:
+        if campo not in datos:
+            continue
+        valor = datos[campo]
+        texto = _texto(valor)
+
+        if campo == 'categoria':
+            if not texto:
+                raise ValidationError('Categoría vacía')
+            categoria_id = categorias.get(texto.lower())
+            if categoria_id is None:
+                if not crear_categorias:
+                    raise ValidationError(f'Categoría inexistente: {texto}')
+                _validar_largo(Categoria, 'nombre', texto, 'categoria')
+                categoria_id = Categoria.objects.create(nombre=texto).id
+                categorias[texto.lower()] = categoria_id
+            valores['categoria_id'] = categoria_id
+        elif campo == 'unidad_medida':
+            unidad_id = unidades.get(texto.lower())
+            if unidad_id is None:
+                raise ValidationError(f'Unidad de medida inexistente: {texto}')
+            valores['unidad_medida_id'] = unidad_id
+        elif campo in ('precio_minorista', 'precio_mayorista'):
+            try:
+                precio = _decimal(valor) if texto else Decimal('0')
+            except InvalidOperation:
+                raise ValidationError(f'Valor inválido para {campo}: {texto}')
+            if not precio.is_finite():
+                raise ValidationError(f'Valor inválido para {campo}: {texto}')
+            if precio < 0:
+                raise ValidationError(f'{campo} no puede ser negativo')
+            precio = precio.quantize(Decimal('0.01'))
+            campo_modelo = Producto._meta.get_field(campo)
+            if precio.adjusted() >= campo_modelo.max_digits - campo_modelo.decimal_places:
+                raise ValidationError(f'{campo} demasiado grande: {texto}')
+            valores[campo] = precio
+        elif campo in ('tasa_iva', 'stock_minimo'):
+            try:
+                numero = int(_decimal(valor)) if texto else 0
+            except (InvalidOperation, ValueError, OverflowError):
+                raise ValidationError(f'Valor inválido para {campo}: {texto}')
+            if campo == 'tasa_iva' and numero not in dict(Producto.TASA_CHOICES):
+                raise ValidationError(f'Tasa de IVA inválida: {texto}')
+            if numero < 0:
+                raise ValidationError(f'{campo} no puede ser negativo')
+            if numero > MAXIMO_ENTERO_IMPORTACION:
+                raise ValidationError(f'{campo} demasiado grande: {texto}')
+            valores[campo] = numero
+        elif campo == 'activo':
+            valores[campo] = texto.lower() not in ('0', 'no', 'false', 'falso', 'n')
+        else:
+            _validar_largo(Producto, campo, texto)
+            valores[campo] = texto
+
+    if not valores.get('codigo'):
+        raise ValidationError('El código es obligatorio')
+    return valores
+
+
+def _guardar_lote_productos(lote, resultado):
+    """Crea o actualiza un lote de productos ({codigo: (fila, valores)})"""
+    existentes = Producto.objects.in_bulk(list(lote), field_name='codigo')
+
+    nuevos, modificados, campos_modificados = [], [], set()
+    for codigo, (fila, valores) in lote.items():
+        producto = existentes.get(codigo)
+        if producto is None:
+            faltantes = [c for c in ('nombre', 'categoria_id', 'unidad_medida_id') if not valores.get(c)]
+            if faltantes:
+                resultado['errores'].append(
+                    (fila, codigo, 'Producto nuevo sin ' + ', '.join(f.replace('_id', '') for f in faltantes))
+                )
+                continue
+            nuevos.append(Producto(**valores))
+            continue
+
+        cambios = [campo for campo, valor in valores.items() if getattr(producto, campo) != valor]
+        if cambios:
+            for campo in cambios:
+                setattr(producto, campo, valores[campo])
+            modificados.append(producto)
+            campos_modificados.update(cambios)
+        else:
+            resultado['sin_cambios'] += 1
+
+    with transaction.atomic():
+        Producto.objects.bulk_create(nuevos)
+        if modificados:
+            # auto_now no se aplica en bulk_update
+            ahora = timezone.now()
+            for producto in modificados:
+                producto.actualizado = ahora
+            Producto.objects.bulk_update(modificados, sorted(campos_modificados) + ['actualizado'])
+    resultado['creados'] += len(nuevos)
+    resultado['actualizados'] += len(modificados)
+
+
+def importar_productos(archivo, nombre_archivo, crear_categorias=False,
+                       tamano_lote=TAMANO_LOTE_IMPORTACION):
+    """
+    Importa o actualiza productos desde un archivo CSV/XLSX de proveedor.
+
+    El archivo se recorre en streaming y se procesa en lotes: por cada lote
+    se hace una consulta de los códigos existentes, un bulk_create para los
+    nuevos y un bulk_update solo de los campos que cambiaron. Categorías y
+    unidades de medida se resuelven por nombre con un mapa en memoria.
+    Las filas con errores no detienen la importación y se informan en el
+    resultado.
+
+    Args:
+        archivo: Archivo binario abierto
+        nombre_archivo: Nombre del archivo (define el formato por extensión)
+        crear_categorias: Si es True crea las categorías que no existan
+        tamano_lote: Cantidad de filas por transacción
+
+    Returns:
+        dict con 'creados', 'actualizados', 'sin_cambios' y 'errores'
+        (lista de tuplas (fila, codigo, mensaje))
+    """
+    categorias = {nombre.lower(): pk for pk, nombre in Categoria.objects.values_list('id', 'nombre')}
+    unidades = {}
+    for pk, nombre, abreviatura in UnidadMedida.objects.values_list('id', 'nombre', 'abreviatura_sifen'):
+        unidades[nombre.lower()] = pk
+        unidades.setdefault(abreviatura, pk)
+
+    resultado = {'creados': 0, 'actualizados': 0, 'sin_cambios': 0, 'errores': []}
+    filas = leer_filas_productos(archivo, nombre_archivo)
+    while True:
+        lote, leidas = {}, 0
+        for fila, datos in islice(filas, tamano_lote):
+            leidas += 1
+            try:
+                valores = _convertir_fila_producto(datos, categorias, unidades, crear_categorias)
+            except ValidationError as e:
+                resultado['errores'].append((fila, _texto(datos.get('codigo')), ' '.join(e.messages)))
+                continue
+            # Si un código se repite dentro del lote, prevalece la última fila
+            lote[valores['codigo']] = (fila, valores)
+        if not leidas:
+            break
+        if lote:
+            _guardar_lote_productos(lote, resultado)
+
+    if resultado['creados'] or resultado['actualizados']:
+        invalidar_catalogo()
+    return resultado
+
+
+def filtrar_productos_precios(categoria_id=None, proveedor_id=None, tasa_iva=None):
+    """
+    Productos alcanzados por una actualización de precios.
+    El proveedor se resuelve por los productos que figuran en sus órdenes de compra.
+    """
+    productos = Producto.objects.all()
+    if categoria_id:
+        productos = productos.filter(categoria_id=categoria_id)
+    if tasa_iva is not None and tasa_iva != '':
+        productos = productos.filter(tasa_iva=tasa_iva)
+    if proveedor_id:
+        productos = productos.filter(pk__in=Producto.objects.filter(
+            detalleordencompra__orden__proveedor_id=proveedor_id
+        ).values('pk'))
+    return productos
+
+
+def _campos_precio(campo):
+    return ['precio_minorista', 'precio_mayorista'] if campo == 'ambos' else [campo]
+
+
+def _expresion_precio(campo, tipo, valor, redondeo):
+    """Expresión SQL del nuevo precio, redondeado a múltiplos de `redondeo` Gs."""
+    salida = models.DecimalField(max_digits=10, decimal_places=2)
+    valor = Value(Decimal(valor), output_field=salida)
+    if tipo == 'PORCENTAJE':
+        nuevo = F(campo) + F(campo) * valor / Value(Decimal(100), output_field=salida)
+    else:
+        nuevo = F(campo) + valor
+
+    if redondeo > 1:
+        paso = Value(Decimal(redondeo), output_field=salida)
+        nuevo = Round(nuevo / paso, output_field=salida) * paso
+    else:
+        nuevo = Round(nuevo, 2, output_field=salida)
+    return Greatest(nuevo, Value(Decimal(0), output_field=salida), output_field=salida)
+
+
+def _validar_actualizacion_precios(campo, tipo, valor, redondeo):
+    if campo not in dict(ActualizacionPrecios.CAMPO_CHOICES):
+        raise ValidationError('Campo de precio inválido')
+    if tipo not in dict(ActualizacionPrecios.TIPO_CHOICES):
+        raise ValidationError('Tipo de actualización inválido')
+    if tipo == 'PORCENTAJE' and valor <= -100:
+        raise ValidationError('El porcentaje debe ser mayor a -100')
+    if redondeo < 1:
+        raise ValidationError('El redondeo debe ser al menos 1')
+
+
+def previsualizar_actualizacion_precios(filtros, campo, tipo, valor, redondeo=1, muestra=10):
+    """
+    Calcula cuántos productos serían afectados y una muestra con los precios
+    actuales y los resultantes, sin modificar nada.
+
+    Args:
+        filtros: dict con categoria_id, proveedor_id y/o tasa_iva
+        campo: 'precio_minorista', 'precio_mayorista' o 'ambos'
+        tipo: 'PORCENTAJE' o 'MONTO'
+        valor: Porcentaje o monto (puede ser negativo)
+        redondeo: Múltiplo en guaraníes al que se redondea el resultado
+        muestra: Cantidad de productos de ejemplo
+
+    Returns:
+        Tupla (cantidad, lista de dicts de ejemplo)
+    """
+    _validar_actualizacion_precios(campo, tipo, valor, redondeo)
+    productos = filtrar_productos_precios(**filtros)
+    campos = _campos_precio(campo)
+    ejemplo = productos.annotate(**{
+        f'nuevo_{c}': _expresion_precio(c, tipo, valor, redondeo) for c in campos
+    }).order_by('nombre').values('codigo', 'nombre', *campos, *[f'nuevo_{c}' for c in campos])[:muestra]
+    return productos.count(), list(ejemplo)
+
+
+@transaction.atomic
+def aplicar_actualizacion_precios(filtros, campo, tipo, valor, usuario, redondeo=1):
+    """
+    Aplica una actualización masiva de precios con un único UPDATE.
+
+    Antes de actualizar guarda los precios anteriores de los productos
+    afectados (HistorialPrecio) y al confirmar invalida el catálogo en caché.
+
+    Args:
+        filtros: dict con categoria_id, proveedor_id y/o tasa_iva
+        campo: 'precio_minorista', 'precio_mayorista' o 'ambos'
+        tipo: 'PORCENTAJE' o 'MONTO'
+        valor: Porcentaje o monto (puede ser negativo)
+        usuario: PerfilUsuario que realiza la actualización
+        redondeo: Múltiplo en guaraníes al que se redondea el resultado
+
+    Returns:
+        La ActualizacionPrecios registrada
+    """
+    _validar_actualizacion_precios(campo, tipo, valor, redondeo)
+    productos = filtrar_productos_precios(**filtros)
+
+    actualizacion = ActualizacionPrecios.objects.create(
+        usuario=usuario,
+        campo=campo,
+        tipo=tipo,
+        valor=valor,
+        redondeo=redondeo,
+        filtros=filtros
+    )
+
+    anteriores = productos.select_for_update().values_list(
+        'id', 'precio_minorista', 'precio_mayorista'
+    ).iterator(chunk_size=TAMANO_LOTE_IMPORTACION)
+    while True:
+        lote = [
+            HistorialPrecio(
+                actualizacion=actualizacion,
+                producto_id=producto_id,
+                precio_minorista=minorista,
+                precio_mayorista=mayorista
+            )
+            for producto_id, minorista, mayorista in islice(anteriores, TAMANO_LOTE_IMPORTACION)
+        ]
+        if not lote:
+            break
+        HistorialPrecio.objects.bulk_create(lote)
+
+    actualizacion.cantidad_productos = productos.update(
+        actualizado=timezone.now(),
+        **{c: _expresion_precio(c, tipo, valor, redondeo) for c in _campos_precio(campo)}
+    )
+    actualizacion.save(update_fields=['cantidad_productos'])
+
+    invalidar_catalogo()
+    return actualizacion
+
+
+def generar_miniaturas(nombre_imagen, forzar=False):
+    """
+    Genera las miniaturas WebP y JPEG de una imagen de producto, junto al
+    original y sin metadatos (EXIF, GPS, perfil ICC).
+
+    Args:
+        nombre_imagen: Nombre de la imagen en el storage (Producto.imagen.name)
+        forzar: Si es True regenera también las miniaturas existentes
+
+    Returns:
+        Cantidad de miniaturas generadas
+    """
+    storage = Producto._meta.get_field('imagen').storage
+    pendientes = [
+        (tamano, formato)
+        for tamano in TAMANOS_MINIATURA
+        for formato in FORMATOS_MINIATURA
+        if forzar or not storage.exists(ruta_miniatura(nombre_imagen, tamano, formato))
+    ]
+    if not pendientes:
+        return 0
+
+    with storage.open(nombre_imagen, 'rb') as archivo:
+        original = ImageOps.exif_transpose(Image.open(archivo))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in original.info or 'A' in original.mode else 'RGB')
+
+    for tamano, formato in pendientes:
+        lado = TAMANOS_MINIATURA[tamano]
+        miniatura = original.copy()
+        miniatura.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        if formato == 'jpg' and miniatura.mode == 'RGBA':
+            # JPEG no admite transparencia: se compone sobre fondo blanco
+            fondo = Image.new('RGB', miniatura.size, (255, 255, 255))
+            fondo.paste(miniatura, mask=miniatura.getchannel('A'))
+            miniatura = fondo
+        miniatura.info = {}
+
+        contenido = io.BytesIO()
+        if formato == 'jpg':
+            miniatura.save(contenido, FORMATOS_MINIATURA[formato], quality=80, optimize=True, progressive=True)
+        else:
+            miniatura.save(contenido, FORMATOS_MINIATURA[formato], quality=80, method=4)
+
+        ruta = ruta_miniatura(nombre_imagen, tamano, formato)
+        if storage.exists(ruta):
+            storage.delete(ruta)
+        storage.save(ruta, ContentFile(contenido.getvalue()))
+    return len(pendientes)
+
+
+def eliminar_miniaturas(nombre_imagen):
+    """Elimina las miniaturas de una imagen de producto"""
+    storage = Producto._meta.get_field('imagen').storage
+    for tamano in TAMANOS_MINIATURA:
+        for formato in FORMATOS_MINIATURA:
+            ruta = ruta_miniatura(nombre_imagen, tamano, formato)
+            if storage.exists(ruta):
+                storage.delete(ruta)
+
+
+def abrir_sesion_conteo(almacen_id, usuario, tipo='TOTAL', observaciones=''):
+    """
+    Abre una sesión de conteo físico. Solo puede haber una abierta por almacén.
+
+    Args:
+        almacen_id: ID del almacén a contar
+        usuario: PerfilUsuario que abre la sesión
+        tipo: 'TOTAL' (lo no contado se ajusta a cero) o 'PARCIAL'
+        observaciones: Texto libre
+    """
+    try:
+        with transaction.atomic():
+            return SesionConteo.objects.create(
+                almacen_id=almacen_id,
+                tipo=tipo,
+                abierta_por=usuario,
+                observaciones=observaciones
+            )
+    except IntegrityError:
+        raise ValidationError('Ya existe una sesión de conteo abierta para este almacén')
+
+
+def _sesion_abierta(sesion_id):
+    sesion = SesionConteo.objects.select_for_update().get(pk=sesion_id)
+    if sesion.estado != 'ABIERTA':
+        raise ValidationError('La sesión de conteo no está abierta')
+    return sesion
+
+
+@transaction.atomic
+def registrar_lecturas_conteo(sesion_id, lecturas, identificador_lote=None):
+    """
+    Acumula un lote de lecturas de escáner en la tabla de conteo.
+
+    Los códigos se resuelven en una consulta y las cantidades se suman con
+    un UPDATE ... CASE por cada TAMANO_LOTE_STOCK productos. Una cantidad
+    negativa corrige (resta) lo contado, sin bajar de cero. Si se informa
+    identificador_lote, un reenvío del mismo lote se ignora.
+
+    Args:
+        sesion_id: ID de la SesionConteo abierta
+        lecturas: Iterable de tuplas (codigo, cantidad)
+        identificador_lote: Identificador único del lote enviado por el escáner
+
+    Returns:
+        dict con 'lineas', 'productos', 'no_encontrados' y 'duplicado'
+    """
+    sesion = _sesion_abierta(sesion_id)
+
+    por_codigo = defaultdict(int)
+    lineas = 0
+    for codigo, cantidad in lecturas:
+        por_codigo[str(codigo).strip()] += int(cantidad)
+        lineas += 1
+
+    resultado = {'lineas': lineas, 'productos': 0, 'no_encontrados': [], 'duplicado': False}
+    if identificador_lote:
+        try:
+            with transaction.atomic():
+                LoteConteo.objects.create(sesion=sesion, identificador=identificador_lote, lineas=lineas)
+        except IntegrityError:
+            resultado['duplicado'] = True
+            return resultado
+
+    productos = dict(
+        Producto.objects.filter(codigo__in=por_codigo).values_list('codigo', 'id')
+    )
+    resultado['no_encontrados'] = sorted(set(por_codigo) - set(productos))
+    cantidades = {
+        productos[codigo]: cantidad
+        for codigo, cantidad in por_codigo.items()
+        if codigo in productos and cantidad
+    }
+    if not cantidades:
+        return resultado
+
+    ConteoInventario.objects.bulk_create(
+        [ConteoInventario(sesion=sesion, producto_id=producto_id) for producto_id in cantidades],
+        ignore_conflicts=True
+    )
+    ahora = timezone.now()
+    items = list(cantidades.items())
+    for inicio in range(0, len(items), TAMANO_LOTE_STOCK):
+        lote = items[inicio:inicio + TAMANO_LOTE_STOCK]
+        ConteoInventario.objects.filter(
+            sesion=sesion,
+            producto_id__in=[producto_id for producto_id, _ in lote]
+        ).update(
+            cantidad=Greatest(
+                Case(
+                    *[When(producto_id=producto_id, then=F('cantidad') + cantidad)
+                      for producto_id, cantidad in lote],
+                    default=F('cantidad'),
+                    output_field=models.IntegerField()
+                ),
+                Value(0),
+                output_field=models.IntegerField()
+            ),
+            actualizado=ahora
+        )
+    resultado['productos'] = len(cantidades)
+    return resultado
+
+
+def diferencias_conteo(sesion, bloquear=False):
+    """
+    Compara lo contado en la sesión contra el stock del sistema.
+
+    En sesiones TOTAL los productos con stock que no fueron contados se
+    consideran en cero. La comparación se hace en una sola consulta: el
+    stock del almacén (bloqueado con FOR UPDATE si se pide) contra los
+    conteos, unidos con FULL OUTER JOIN por producto, y solo vuelven las
+    filas con diferencia.
+
+    Returns:
+        dict {producto_id: (cantidad_sistema, cantidad_contada)} solo con
+        los productos que tienen diferencia
+    """
+    stocks = Stock.objects.filter(almacen_id=sesion.almacen_id)
+    if sesion.tipo == 'PARCIAL':
+        stocks = stocks.filter(producto_id__in=sesion.conteos.values('producto_id'))
+    if bloquear:
+        stocks = stocks.select_for_update()
+    sql_sistema, params_sistema = stocks.order_by('producto_id').values(
+        'producto_id', 'cantidad'
+    ).query.sql_with_params()
+    sql_contado, params_contado = sesion.conteos.order_by().values(
+        'producto_id', 'cantidad'
+    ).query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH sistema (producto_id, cantidad) AS ({sql_sistema}),
+                 contado (producto_id, cantidad) AS ({sql_contado})
+            SELECT COALESCE(sistema.producto_id, contado.producto_id),
+                   COALESCE(sistema.cantidad, 0),
+                   COALESCE(contado.cantidad, 0)
+            FROM sistema
+            FULL OUTER JOIN contado ON contado.producto_id = sistema.producto_id
+            WHERE COALESCE(sistema.cantidad, 0) <> COALESCE(contado.cantidad, 0)
+            """,
+            (*params_sistema, *params_contado)
+        )
+        return {
+            producto_id: (en_sistema, contado)
+            for producto_id, en_sistema, contado in cursor.fetchall()
+        }
+
+
+@transaction.atomic
+def cerrar_sesion_conteo(sesion_id, usuario):
+    """
+    Cierra una sesión de conteo y ajusta el stock a lo contado.
+
+    Las diferencias se calculan de una vez contra el stock (bloqueado), los
+    AJUSTE_FALTANTE/AJUSTE_SOBRANTE se insertan en bloque vinculados a la
+    sesión y el stock se corrige de forma set-based.
+
+    Args:
+        sesion_id: ID de la SesionConteo abierta
+        usuario: PerfilUsuario que cierra la sesión
+    """
+    sesion = _sesion_abierta(sesion_id)
+    diferencias = diferencias_conteo(sesion, bloquear=True)
+
+    motivo = f"Conteo de inventario #{sesion.id}"
+    movimientos = []
+    ajustes = {}
+    for producto_id, (en_sistema, contado) in diferencias.items():
+        diferencia = contado - en_sistema
+        movimientos.append(MovimientoInventario(
+            producto_id=producto_id,
+            almacen_id=sesion.almacen_id,
+            cantidad=abs(diferencia),
+            tipo='AJUSTE_SOBRANTE' if diferencia > 0 else 'AJUSTE_FALTANTE',
+            usuario=usuario,
+            motivo=motivo,
+            sesion_conteo=sesion
+        ))
+        ajustes[(producto_id, sesion.almacen_id)] = diferencia
+
+    registrar_costo_movimientos(movimientos)
+    MovimientoInventario.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE_IMPORTACION)
+    aplicar_ajustes_stock(ajustes)
+
+    sesion.estado = 'CERRADA'
+    sesion.cerrada_por = usuario
+    sesion.fecha_cierre = timezone.now()
+    sesion.ajustes_sobrante = sum(1 for m in movimientos if m.tipo == 'AJUSTE_SOBRANTE')
+    sesion.ajustes_faltante = len(movimientos) - sesion.ajustes_sobrante
+    sesion.save(update_fields=[
+        'estado', 'cerrada_por', 'fecha_cierre', 'ajustes_sobrante', 'ajustes_faltante'
+    ])
+    return sesion
+
+
+@transaction.atomic
+def cancelar_sesion_conteo(sesion_id):
+    """Cancela una sesión abierta sin tocar el stock"""
+    sesion = _sesion_abierta(sesion_id)
+    sesion.estado = 'CANCELADA'
+    sesion.fecha_cierre = timezone.now()
+    sesion.save(update_fields=['estado', 'fecha_cierre'])
+    return sesion
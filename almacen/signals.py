@@ -1,70 +1,56 @@
-from django.db.models.signals import post_save, pre_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from django.forms import ValidationError
-from django.utils import timezone
-from .models import DetalleTraslado, MovimientoInventario,Stock
+from .models import ComponenteServicio, DetalleTraslado, Producto, Servicio
+from .services import (
+    encolar_evento_inventario, invalidar_catalogo, generar_miniaturas, eliminar_miniaturas,
+    invalidar_lista_materiales
+)
 
-@receiver(post_save, sender=DetalleTraslado)
-def actualizar_estado_traslado(sender, instance, **kwargs):
-    traslado = instance.traslado
-    detalles = traslado.detalles.all()
-    
-    # Solo actualizar si hay cambios en cantidades enviadas/recibidas
-    if any(d.has_changed() for d in detalles):
-        # Estado EN_PROCESO cuando todo está enviado pero no recibido
-        if all(d.cantidad_enviada == d.cantidad_solicitada for d in detalles):
-            traslado.estado = 'EN_PROCESO'
-            traslado.save()
-        
-        # Estado COMPLETADO cuando todo está recibido
-        if all(d.cantidad_recibida == d.cantidad_enviada for d in detalles if d.cantidad_enviada > 0):
-            traslado.estado = 'COMPLETADO'
-            traslado.fecha_completado = timezone.now()
-            traslado.save()
 
-@receiver(post_save, sender=DetalleTraslado)
-def registrar_movimiento_entrada(sender, instance, **kwargs):
-    # Solo registrar entrada si el traslado está COMPLETADO
-    if (instance.cantidad_recibida > 0 and 
-        instance.has_changed('cantidad_recibida') and 
-        instance.traslado.estado == 'COMPLETADO'):
-        
-        # Verificar si ya existe un movimiento para esta recepción
-        existe_movimiento = MovimientoInventario.objects.filter(
-            producto=instance.producto,
-            almacen=instance.traslado.almacen_destino,
-            motivo=f"Traslado {instance.traslado.referencia} desde {instance.traslado.almacen_origen}",
-            tipo='ENTRADA'
-        ).exists()
-        
-        if not existe_movimiento:
-            # Crear el movimiento de entrada
-            MovimientoInventario.objects.create(
-                producto=instance.producto,
-                almacen=instance.traslado.almacen_destino,
-                cantidad=instance.cantidad_recibida,
-                tipo='ENTRADA',
-                usuario=instance.traslado.responsable or instance.traslado.solicitante,
-                motivo=f"Traslado {instance.traslado.referencia} desde {instance.traslado.almacen_origen}"
-            )
-            
-            # Actualizar el stock de destino
-            stock_destino, created = Stock.objects.get_or_create(
-                producto=instance.producto,
-                almacen=instance.traslado.almacen_destino,
-                defaults={'cantidad': 0}
-            )
-            stock_destino.cantidad += instance.cantidad_recibida
-            stock_destino.save()
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_catalogo_producto(sender, **kwargs):
+    invalidar_catalogo()
+
+
+@receiver(post_save, sender=Producto)
+def generar_miniaturas_producto(sender, instance, **kwargs):
+    # Las miniaturas llevan el nombre del original: si ya existen no se regeneran
+    if instance.imagen:
+        nombre = instance.imagen.name
+        transaction.on_commit(lambda: generar_miniaturas(nombre), robust=True)
+
+
+@receiver(post_delete, sender=Producto)
+def eliminar_miniaturas_producto(sender, instance, **kwargs):
+    if instance.imagen:
+        nombre = instance.imagen.name
+        transaction.on_commit(lambda: eliminar_miniaturas(nombre), robust=True)
+
 
 @receiver(post_save, sender=DetalleTraslado)
-def registrar_movimiento_entrada(sender, instance, **kwargs):
-    if instance.cantidad_recibida > 0 and instance.has_changed('cantidad_recibida'):
-        MovimientoInventario.objects.create(
-            producto=instance.producto,
-            almacen=instance.traslado.almacen_destino,
-            cantidad=instance.cantidad_recibida,
-            tipo='ENTRADA',
-            usuario=instance.traslado.responsable or instance.traslado.solicitante,
-            motivo=f"Traslado {instance.traslado.referencia} desde {instance.traslado.almacen_origen}"
-        )
\ No newline at end of file
+def encolar_sincronizacion_traslado(sender, instance, **kwargs):
+    """
+    Solo deja un evento en la bandeja de salida; las entradas de stock y el
+    estado del traslado los calcula el consumidor, en lote y una sola vez.
+    """
+    if instance.has_changed():
+        encolar_evento_inventario(
+            'SINCRONIZAR_TRASLADO',
+            instance.traslado_id,
+            {'traslado_id': instance.traslado_id}
+        )
+
+
+@receiver(post_save, sender=ComponenteServicio)
+@receiver(post_delete, sender=ComponenteServicio)
+def invalidar_materiales_componente(sender, instance, **kwargs):
+    invalidar_lista_materiales(instance.servicio_id)
+
+
+@receiver(post_save, sender=Servicio)
+@receiver(post_delete, sender=Servicio)
+def invalidar_materiales_servicio(sender, instance, **kwargs):
+    # El tipo (SIMPLE/COMPUESTO) decide si la lista de materiales aplica
+    invalidar_lista_materiales(instance.pk)
@@ -8,6 +8,8 @@ app_name= "almacen"
 urlpatterns = [
     path('productos/lista/', views.lista_productos, name='lista_productos'),
     path('productos/nueva/', views.registrar_producto, name='registrar_producto'),
+    path('productos/importar/', views.importar_productos_view, name='importar_productos'),
+    path('productos/precios/', views.actualizar_precios, name='actualizar_precios'),
     path('productos/editar/<int:producto_id>/', views.editar_producto, name='editar_producto'),
     path('productos/eliminar/<int:producto_id>/', views.eliminar_producto, name='eliminar_producto'),
     path('api/productos/buscar/', api_views.buscar_producto, name='buscar_producto'),
@@ -52,6 +54,10 @@ urlpatterns = [
     # Stock
     path('stock/', views.lista_stock, name='lista_stock'),
     path('inventario/', views.lista_inventarios, name='inventario'),
+    path('inventario/conteos/<int:sesion_id>/', views.detalle_sesion_conteo, name='detalle_sesion_conteo'),
+    path('inventario/conteos/<int:sesion_id>/cerrar/', views.cerrar_sesion_conteo_view, name='cerrar_sesion_conteo'),
+    path('inventario/conteos/<int:sesion_id>/cancelar/', views.cancelar_sesion_conteo_view, name='cancelar_sesion_conteo'),
+    path('api/conteos/<int:sesion_id>/lecturas/', api_views.registrar_lecturas, name='registrar_lecturas_conteo'),
     path('reportes/', views.lista_reportes, name='reportes'),
 
 
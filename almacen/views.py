@@ -3,11 +3,10 @@ from django.forms import ValidationError
 from django.http import HttpResponseNotAllowed, JsonResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.urls import reverse
-from .models import Producto, Servicio, Categoria, UnidadMedida,MovimientoInventario, Almacen, Stock, ComponenteServicio
-from .forms import ProductoForm, CategoriaForm, UnidadMedidaForm, MovimientoInventarioForm, AlmacenForm,ConversionComplejaForm,ComponenteConversionFormSet
+from .models import Producto, Servicio, Categoria, UnidadMedida,MovimientoInventario, Almacen, Stock, ComponenteServicio, ActualizacionPrecios
+from .forms import ActualizacionPreciosForm, ImportarProductosForm, ProductoForm, CategoriaForm, UnidadMedidaForm, MovimientoInventarioForm, AlmacenForm,ConversionComplejaForm,ComponenteConversionFormSet
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
-from django.utils import timezone
 
 from .forms import ServicioForm, ComponenteServicioForm, ComponenteServicioFormSet
 
@@ -19,7 +18,7 @@ def lista_productos(request):
 @login_required
 def registrar_producto(request):
     if request.method == 'POST':
-        form = ProductoForm(request.POST)
+        form = ProductoForm(request.POST, request.FILES)
         if form.is_valid():
             form.save()
             messages.success(request, 'Producto registrado exitosamente')
@@ -32,11 +31,81 @@ def registrar_producto(request):
         'titulo': 'Registrar Producto',
     })
 
+@login_required
+def importar_productos_view(request):
+    resultado = None
+    if request.method == 'POST':
+        form = ImportarProductosForm(request.POST, request.FILES)
+        if form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            try:
+                resultado = importar_productos(
+                    archivo.file,
+                    archivo.name,
+                    crear_categorias=form.cleaned_data['crear_categorias']
+                )
+            except ValidationError as e:
+                messages.error(request, ' '.join(e.messages))
+            else:
+                messages.success(
+                    request,
+                    f"Importación finalizada: {resultado['creados']} creados, "
+                    f"{resultado['actualizados']} actualizados, "
+                    f"{resultado['sin_cambios']} sin cambios, "
+                    f"{len(resultado['errores'])} con errores"
+                )
+    else:
+        form = ImportarProductosForm()
+
+    return render(request, 'productos/importar.html', {
+        'form': form,
+        'resultado': resultado,
+        'errores': resultado['errores'][:500] if resultado else [],
+        'titulo': 'Importar Productos',
+    })
+
+@login_required
+def actualizar_precios(request):
+    previsualizacion = None
+    if request.method == 'POST':
+        form = ActualizacionPreciosForm(request.POST)
+        if form.is_valid():
+            datos = form.cleaned_data
+            parametros = {
+                'filtros': form.filtros(),
+                'campo': datos['campo'],
+                'tipo': datos['tipo'],
+                'valor': datos['valor'],
+                'redondeo': datos['redondeo'],
+            }
+            try:
+                if 'aplicar' in request.POST:
+                    actualizacion = aplicar_actualizacion_precios(usuario=request.user.perfil, **parametros)
+                    messages.success(
+                        request,
+                        f'Precios actualizados en {actualizacion.cantidad_productos} productos'
+                    )
+                    return redirect('almacen:actualizar_precios')
+
+                cantidad, ejemplos = previsualizar_actualizacion_precios(**parametros)
+                previsualizacion = {'cantidad': cantidad, 'ejemplos': ejemplos}
+            except ValidationError as e:
+                messages.error(request, ' '.join(e.messages))
+    else:
+        form = ActualizacionPreciosForm()
+
+    return render(request, 'productos/actualizar_precios.html', {
+        'form': form,
+        'previsualizacion': previsualizacion,
+        'actualizaciones': ActualizacionPrecios.objects.select_related('usuario__usuario')[:10],
+        'titulo': 'Actualización Masiva de Precios',
+    })
+
 @login_required
 def editar_producto(request, producto_id):
     producto= get_object_or_404(Producto, pk= producto_id)
     if request.method == 'POST':
-        form= ProductoForm(request.POST, instance= producto)
+        form= ProductoForm(request.POST, request.FILES, instance= producto)
         if form.is_valid():
             form.save()
             messages.success(request, 'Producto actualizado exitosamente')
@@ -467,14 +536,39 @@ def eliminar_movimiento(request, movimiento_id):
     return HttpResponseNotAllowed(['POST'])
 
 
+from django.db.models import F
+from .models import ClasificacionProducto
+from .services import anotar_clasificacion
+
+
 @login_required
 def lista_stock(request):
-    stocks = Stock.objects.select_related('producto', 'almacen').order_by(
-        'almacen__nombre', 'producto__nombre'
-    )
-    
+    stocks = anotar_clasificacion(Stock.objects.select_related('producto', 'almacen'))
+
+    # Filtros por la clasificación ABC/XYZ precalculada
+    clase_abc = request.GET.get('abc', '')
+    clase_xyz = request.GET.get('xyz', '')
+    if clase_abc:
+        stocks = stocks.filter(clase_abc=clase_abc)
+    if clase_xyz:
+        stocks = stocks.filter(clase_xyz=clase_xyz)
+
+    if request.GET.get('orden') == 'clase':
+        stocks = stocks.order_by(
+            F('clase_abc').asc(nulls_last=True),
+            F('clase_xyz').asc(nulls_last=True),
+            'producto__nombre'
+        )
+    else:
+        stocks = stocks.order_by('almacen__nombre', 'producto__nombre')
+
     return render(request, 'stocks/lista.html', {
         'stocks': stocks,
+        'clases_abc': ClasificacionProducto.CLASE_ABC_CHOICES,
+        'clases_xyz': ClasificacionProducto.CLASE_XYZ_CHOICES,
+        'clase_abc': clase_abc,
+        'clase_xyz': clase_xyz,
+        'orden': request.GET.get('orden', ''),
         'titulo': 'Stock Actual'
     })
 
@@ -673,56 +767,15 @@ def ejecutar_conversion(request):
         form = EjecutarConversionForm(request.POST, user=request.user)
         if form.is_valid():
             try:
-                conversion = form.cleaned_data['conversion']
-                almacen = form.cleaned_data['almacen']
-                cantidad = form.cleaned_data['cantidad']
-                
-                # Validar stock para todos los componentes origen
-                componentes_origen = conversion.componentes.filter(tipo='ORIGEN')
-                for componente in componentes_origen:
-                    stock = Stock.objects.filter(
-                        producto=componente.producto,
-                        almacen=almacen
-                    ).first()
-                    cantidad_necesaria = componente.cantidad * cantidad
-                    
-                    if not stock or stock.cantidad < cantidad_necesaria:
-                        raise ValidationError(
-                            f'Stock insuficiente de {componente.producto.nombre}. '
-                            f'Necesario: {cantidad_necesaria}, Disponible: {stock.cantidad if stock else 0}'
-                        )
-                
-                # Ejecutar la conversión
-                with transaction.atomic():
-                    # Restar productos origen
-                    for componente in componentes_origen:
-                        stock = Stock.objects.get(
-                            producto=componente.producto,
-                            almacen=almacen
-                        )
-                        stock.cantidad -= componente.cantidad * cantidad
-                        stock.save()
-                    
-                    # Sumar productos destino
-                    componentes_destino = conversion.componentes.filter(tipo='DESTINO')
-                    for componente in componentes_destino:
-                        stock, created = Stock.objects.get_or_create(
-                            producto=componente.producto,
-                            almacen=almacen,
-                            defaults={'cantidad': 0}
-                        )
-                        stock.cantidad += componente.cantidad * cantidad
-                        stock.save()
-                    
-                    # Registrar la conversión
-                    RegistroConversion.objects.create(
-                        conversion=conversion,
-                        almacen=almacen,
-                        cantidad_ejecuciones=cantidad,
-                        usuario=request.user.perfil,
-                        motivo=form.cleaned_data['motivo']
-                    )
-                
+                # Valida stock de los orígenes, genera movimientos y actualiza stock en bloque
+                convertir_producto(
+                    conversion_id=form.cleaned_data['conversion'].id,
+                    almacen_id=form.cleaned_data['almacen'].id,
+                    cantidad=form.cleaned_data['cantidad'],
+                    usuario=request.user.perfil,
+                    motivo=form.cleaned_data['motivo']
+                )
+
                 messages.success(request, "Conversión realizada exitosamente")
                 return redirect('almacen:historial_conversiones')
                 
@@ -767,43 +820,12 @@ def revertir_conversion_view(request, registro_id):
         return redirect('almacen:historial_conversiones')
     
     try:
-        with transaction.atomic():
-            # Revertir: sumar productos origen y restar productos destino
-            componentes = registro.conversion.componentes.all()
-            
-            for componente in componentes.filter(tipo='ORIGEN'):
-                stock, _ = Stock.objects.get_or_create(
-                    producto=componente.producto,
-                    almacen=registro.almacen,
-                    defaults={'cantidad': 0}
-                )
-                stock.cantidad += componente.cantidad * registro.cantidad_ejecuciones
-                stock.save()
-            
-            for componente in componentes.filter(tipo='DESTINO'):
-                stock = Stock.objects.get(
-                    producto=componente.producto,
-                    almacen=registro.almacen
-                )
-                stock.cantidad -= componente.cantidad * registro.cantidad_ejecuciones
-                stock.save()
-            
-            # Registrar la reversión
-            RegistroConversion.objects.create(
-                conversion=registro.conversion,
-                almacen=registro.almacen,
-                cantidad_ejecuciones=registro.cantidad_ejecuciones,
-                usuario=request.user.perfil,
-                motivo=f"Reversión de #{registro.id}",
-                relacion_reversion=registro
-            )
-            
-            # Marcar como revertido
-            registro.revertido = True
-            registro.save()
-            
-            messages.success(request, "Conversión revertida exitosamente")
-            
+        # Revertir: sumar productos origen y restar productos destino
+        revertir_conversion(registro.id, request.user.perfil)
+        messages.success(request, "Conversión revertida exitosamente")
+
+    except ValidationError as e:
+        messages.error(request, f"Error al revertir: {' '.join(e.messages)}")
     except Exception as e:
         messages.error(request, f"Error al revertir: {str(e)}")
     
@@ -828,8 +850,20 @@ def api_detalle_conversion(request, pk):
             'errores': []
         }
         
+        componentes = list(
+            conversion.componentes.select_related('producto__unidad_medida')
+        )
+
+        # Stock de todos los componentes origen en una sola consulta
+        stocks = {}
+        if almacen_id:
+            stocks = dict(Stock.objects.filter(
+                almacen_id=almacen_id,
+                producto_id__in=[c.producto_id for c in componentes if c.tipo == 'ORIGEN']
+            ).values_list('producto_id', 'cantidad'))
+
         # Componentes origen
-        for componente in conversion.componentes.filter(tipo='ORIGEN'):
+        for componente in (c for c in componentes if c.tipo == 'ORIGEN'):
             item = {
                 'producto_id': componente.producto.id,
                 'producto_nombre': componente.producto.nombre,
@@ -838,11 +872,7 @@ def api_detalle_conversion(request, pk):
             }
             
             if almacen_id:
-                stock = Stock.objects.filter(
-                    producto=componente.producto,
-                    almacen_id=almacen_id
-                ).first()
-                item['stock_disponible'] = stock.cantidad if stock else 0
+                item['stock_disponible'] = stocks.get(componente.producto_id, 0)
                 
                 # Validar stock
                 cantidad_necesaria = componente.cantidad * int(request.GET.get('cantidad', 1))
@@ -855,7 +885,7 @@ def api_detalle_conversion(request, pk):
             data['componentes_origen'].append(item)
         
         # Componentes destino
-        for componente in conversion.componentes.filter(tipo='DESTINO'):
+        for componente in (c for c in componentes if c.tipo == 'DESTINO'):
             data['componentes_destino'].append({
                 'producto_id': componente.producto.id,
                 'producto_nombre': componente.producto.nombre,
@@ -879,6 +909,15 @@ from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
 from .forms import TrasladoForm, DetalleTrasladoFormSet
 from .models import TrasladoProducto, DetalleTraslado
+from .services import (
+    despachar_traslado, recepcionar_traslado, importar_productos,
+    previsualizar_actualizacion_precios, aplicar_actualizacion_precios,
+    abrir_sesion_conteo, registrar_lecturas_conteo, diferencias_conteo,
+    cerrar_sesion_conteo, cancelar_sesion_conteo, valorizacion_inventario
+)
+from .forms import SesionConteoForm, LecturaConteoForm, ValorizacionInventarioForm
+from .models import SesionConteo
+from django.db.models import Count
 
 
 @login_required
@@ -893,11 +932,13 @@ def crear_traslado(request):
                 traslado.solicitante = request.user.perfil
                 traslado.save()
                 
+                detalles = []
                 for detalle_form in formset:
                     if detalle_form.cleaned_data.get('producto'):
                         detalle = detalle_form.save(commit=False)
                         detalle.traslado = traslado
-                        detalle.save()
+                        detalles.append(detalle)
+                DetalleTraslado.objects.bulk_create(detalles)
                 
                 messages.success(request, 'Traslado creado exitosamente')
                 return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
@@ -928,18 +969,19 @@ def detalle_traslado(request, traslado_id):
         'almacen_origen', 'almacen_destino', 'solicitante__usuario'
     ), pk=traslado_id)
     
-    detalles = traslado.detalles.select_related('producto').all()
+    detalles = list(traslado.detalles.select_related('producto'))
     
-    # Precalcular stocks para cada detalle
+    # Precalcular stocks de origen y destino en una sola consulta
+    stocks = {
+        (stock.producto_id, stock.almacen_id): stock
+        for stock in Stock.objects.filter(
+            producto_id__in=[d.producto_id for d in detalles],
+            almacen_id__in=[traslado.almacen_origen_id, traslado.almacen_destino_id]
+        )
+    }
     for detalle in detalles:
-        detalle.stock_origen = Stock.objects.filter(
-            producto=detalle.producto,
-            almacen=traslado.almacen_origen
-        ).first()
-        detalle.stock_destino = Stock.objects.filter(
-            producto=detalle.producto,
-            almacen=traslado.almacen_destino
-        ).first()
+        detalle.stock_origen = stocks.get((detalle.producto_id, traslado.almacen_origen_id))
+        detalle.stock_destino = stocks.get((detalle.producto_id, traslado.almacen_destino_id))
     
     return render(request, 'traslados/detalle.html', {
         'traslado': traslado,
@@ -951,141 +993,71 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def _cantidades_traslado(request, traslado, campo):
+    """Lee del POST las cantidades por detalle ({detalle_id: cantidad})"""
+    cantidades = {}
+    for detalle_id, nombre in traslado.detalles.values_list('id', 'producto__nombre'):
+        cantidad_str = request.POST.get(f'detalle-{detalle_id}-{campo}', '0').strip()
+        try:
+            cantidades[detalle_id] = int(cantidad_str)
+        except ValueError:
+            raise ValidationError(f'Valor inválido para {nombre}: "{cantidad_str}"')
+    return cantidades
+
+
 @login_required
-@transaction.atomic
 def procesar_traslado(request, traslado_id):
     traslado = get_object_or_404(TrasladoProducto.objects.select_related('almacen_origen', 'almacen_destino'), pk=traslado_id)
     
     if request.method == 'POST':
-        try:
-            # Validaciones de permiso y estado
-            if request.user != traslado.almacen_origen.responsable:
-                messages.error(request, 'No tienes permiso para procesar este traslado')
-                return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
-            
-            if traslado.estado != 'PENDIENTE':
-                messages.error(request, 'El traslado no está en estado PENDIENTE')
-                return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
-            
-            # Primera pasada: validar todo antes de hacer cambios
-            detalles_a_actualizar = []
-            for detalle in traslado.detalles.all():
-                cantidad_str = request.POST.get(f'detalle-{detalle.id}-cantidad_enviada', '0').strip()
-                
-                try:
-                    cantidad = int(cantidad_str)
-                except ValueError:
-                    messages.error(request, f'Valor inválido para {detalle.producto.nombre}: "{cantidad_str}"')
-                    return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
-                
-                if cantidad <= 0:
-                    messages.error(request, f'La cantidad para {detalle.producto.nombre} debe ser mayor a cero')
-                    return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
-                
-                if cantidad > detalle.cantidad_solicitada:
-                    messages.error(request, 
-                        f'No puedes enviar más de lo solicitado para {detalle.producto.nombre}. '
-                        f'Solicitado: {detalle.cantidad_solicitada}'
-                    )
-                    return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
-                
-                stock = Stock.objects.filter(
-                    producto=detalle.producto,
-                    almacen=traslado.almacen_origen
-                ).first()
-                
-                if not stock:
-                    messages.error(request, f'No existe stock para {detalle.producto.nombre} en el almacén de origen')
-                    return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
-                
-                if stock.cantidad < cantidad:
-                    messages.error(request, 
-                        f'Stock insuficiente de {detalle.producto.nombre}. '
-                        f'Disponible: {stock.cantidad}, Solicitado: {cantidad}'
-                    )
-                    return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
-                
-                detalles_a_actualizar.append((detalle, cantidad, stock))
-            
-            # Segunda pasada: realizar las actualizaciones
-            with transaction.atomic():
-                for detalle, cantidad, stock_origen in detalles_a_actualizar:
-                    # Actualizar detalle
-                    detalle.cantidad_enviada = cantidad
-                    detalle.save()
-                    
-                    # Solo restar del almacén origen (eliminado el código que sumaba al destino)
-                    stock_origen.cantidad -= cantidad
-                    stock_origen.save()
-                
-                # Actualizar el traslado
-                traslado.responsable = request.user.perfil
-                traslado.estado = 'EN_PROCESO'
-                traslado.save()
-            
-            messages.success(request, 'Traslado procesado exitosamente')
+        # Validaciones de permiso y estado
+        if request.user != traslado.almacen_origen.responsable:
+            messages.error(request, 'No tienes permiso para procesar este traslado')
             return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
         
+        if traslado.estado != 'PENDIENTE':
+            messages.error(request, 'El traslado no está en estado PENDIENTE')
+            return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
+        
+        try:
+            cantidades = _cantidades_traslado(request, traslado, 'cantidad_enviada')
+            despachar_traslado(traslado.id, cantidades, request.user.perfil)
+            messages.success(request, 'Traslado procesado exitosamente')
+        except ValidationError as e:
+            for mensaje in e.messages:
+                messages.error(request, mensaje)
         except Exception as e:
+            logger.exception('Error al procesar traslado %s', traslado.id)
             messages.error(request, f'Error al procesar traslado: {str(e)}')
-            return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
     
     return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
 
 
 
 @login_required
-@transaction.atomic
 def recibir_traslado(request, traslado_id):
-    traslado = get_object_or_404(TrasladoProducto, pk=traslado_id)
+    traslado = get_object_or_404(TrasladoProducto.objects.select_related('almacen_destino'), pk=traslado_id)
     
     if request.method == 'POST':
-        try:
-            # Validaciones de permiso y estado
-            if request.user != traslado.almacen_destino.responsable:
-                messages.error(request, 'No tienes permiso para recibir este traslado')
-                return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
-            
-            if traslado.estado != 'EN_PROCESO':
-                messages.error(request, 'El traslado no está en estado EN_PROCESO')
-                return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
-            
-            # Procesar cada detalle
-            for detalle in traslado.detalles.all():
-                cantidad_str = request.POST.get(f'detalle-{detalle.id}-cantidad_recibida', '0')
-                
-                try:
-                    cantidad = int(cantidad_str)
-                except ValueError:
-                    cantidad = 0
-                
-                # Validaciones
-                if cantidad <= 0:
-                    messages.error(request, f'La cantidad para {detalle.producto.nombre} debe ser mayor a cero')
-                    return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
-                
-                if cantidad > detalle.cantidad_enviada:
-                    messages.error(request, 
-                        f'No puedes recibir más de lo enviado para {detalle.producto.nombre}. '
-                        f'Enviado: {detalle.cantidad_enviada}'
-                    )
-                    return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
-                
-                # Actualizar detalle
-                detalle.cantidad_recibida = cantidad
-                detalle.save()
-            
-            # Actualizar el traslado
-            traslado.estado = 'COMPLETADO'
-            traslado.fecha_completado = timezone.now()
-            traslado.save()
-            
-            messages.success(request, 'Traslado recibido exitosamente')
+        # Validaciones de permiso y estado
+        if request.user != traslado.almacen_destino.responsable:
+            messages.error(request, 'No tienes permiso para recibir este traslado')
+            return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
+        
+        if traslado.estado != 'EN_PROCESO':
+            messages.error(request, 'El traslado no está en estado EN_PROCESO')
             return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
         
+        try:
+            cantidades = _cantidades_traslado(request, traslado, 'cantidad_recibida')
+            recepcionar_traslado(traslado.id, cantidades, request.user.perfil)
+            messages.success(request, 'Traslado recibido exitosamente')
+        except ValidationError as e:
+            for mensaje in e.messages:
+                messages.error(request, mensaje)
         except Exception as e:
+            logger.exception('Error al recibir traslado %s', traslado.id)
             messages.error(request, f'Error al recibir traslado: {str(e)}')
-            return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
     
     return redirect('almacen:detalle_traslado', traslado_id=traslado.id)
 
@@ -1093,10 +1065,137 @@ def recibir_traslado(request, traslado_id):
 
 
 
-def lista_inventarios():
-    pass
+@login_required
+def lista_inventarios(request):
+    if request.method == 'POST':
+        form = SesionConteoForm(request.POST)
+        if form.is_valid():
+            try:
+                sesion = abrir_sesion_conteo(
+                    almacen_id=form.cleaned_data['almacen'].id,
+                    usuario=request.user.perfil,
+                    tipo=form.cleaned_data['tipo'],
+                    observaciones=form.cleaned_data['observaciones']
+                )
+                messages.success(request, f'Sesión de conteo #{sesion.id} abierta')
+                return redirect('almacen:detalle_sesion_conteo', sesion_id=sesion.id)
+            except ValidationError as e:
+                messages.error(request, ' '.join(e.messages))
+    else:
+        form = SesionConteoForm()
+
+    sesiones = SesionConteo.objects.select_related('almacen', 'abierta_por__usuario').annotate(
+        productos_contados=Count('conteos')
+    )[:50]
+    return render(request, 'inventarios/lista.html', {
+        'form': form,
+        'sesiones': sesiones,
+        'titulo': 'Conteos de Inventario'
+    })
+
+
+@login_required
+def detalle_sesion_conteo(request, sesion_id):
+    sesion = get_object_or_404(
+        SesionConteo.objects.select_related('almacen', 'abierta_por__usuario', 'cerrada_por__usuario'),
+        pk=sesion_id
+    )
+
+    if request.method == 'POST':
+        form = LecturaConteoForm(request.POST)
+        if form.is_valid():
+            try:
+                resultado = registrar_lecturas_conteo(
+                    sesion.id,
+                    [(form.cleaned_data['codigo'], form.cleaned_data['cantidad'])]
+                )
+                if resultado['no_encontrados']:
+                    messages.error(request, f"Producto no encontrado: {form.cleaned_data['codigo']}")
+                else:
+                    messages.success(request, 'Lectura registrada')
+            except ValidationError as e:
+                messages.error(request, ' '.join(e.messages))
+            return redirect('almacen:detalle_sesion_conteo', sesion_id=sesion.id)
+    else:
+        form = LecturaConteoForm()
+
+    diferencias = []
+    if sesion.estado == 'ABIERTA':
+        pendientes = diferencias_conteo(sesion)
+        # Se muestran primero las diferencias más grandes
+        mayores = sorted(pendientes.items(), key=lambda d: -abs(d[1][1] - d[1][0]))[:300]
+        nombres = Producto.objects.in_bulk([producto_id for producto_id, _ in mayores])
+        diferencias = [
+            {
+                'producto': nombres.get(producto_id),
+                'sistema': en_sistema,
+                'contado': contado,
+                'diferencia': contado - en_sistema
+            }
+            for producto_id, (en_sistema, contado) in mayores
+        ]
+        resumen = {
+            'con_diferencia': len(pendientes),
+            'faltante': sum(s - c for s, c in pendientes.values() if c < s),
+            'sobrante': sum(c - s for s, c in pendientes.values() if c > s),
+        }
+    else:
+        resumen = None
+
+    return render(request, 'inventarios/detalle.html', {
+        'sesion': sesion,
+        'form': form,
+        'productos_contados': sesion.conteos.count(),
+        'diferencias': diferencias,
+        'resumen': resumen,
+        'titulo': f'Conteo #{sesion.id}'
+    })
+
+
+@login_required
+def cerrar_sesion_conteo_view(request, sesion_id):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        sesion = cerrar_sesion_conteo(sesion_id, request.user.perfil)
+        messages.success(
+            request,
+            f'Sesión cerrada: {sesion.ajustes_faltante} ajustes por faltante, '
+            f'{sesion.ajustes_sobrante} por sobrante'
+        )
+    except ValidationError as e:
+        messages.error(request, ' '.join(e.messages))
+    return redirect('almacen:detalle_sesion_conteo', sesion_id=sesion_id)
+
+
+@login_required
+def cancelar_sesion_conteo_view(request, sesion_id):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        cancelar_sesion_conteo(sesion_id)
+        messages.success(request, 'Sesión de conteo cancelada')
+    except ValidationError as e:
+        messages.error(request, ' '.join(e.messages))
+    return redirect('almacen:detalle_sesion_conteo', sesion_id=sesion_id)
 
-def lista_reportes():
-    pass
+@login_required
+def lista_reportes(request):
+    form = ValorizacionInventarioForm(request.GET or None)
+    almacen = categoria = None
+    if form.is_valid():
+        almacen = form.cleaned_data['almacen']
+        categoria = form.cleaned_data['categoria']
+
+    filas, totales = valorizacion_inventario(
+        almacen_id=almacen.id if almacen else None,
+        categoria_id=categoria.id if categoria else None
+    )
+    return render(request, 'reportes/valorizacion.html', {
+        'form': form,
+        'filas': filas,
+        'totales': totales,
+        'titulo': 'Valorización de Inventario'
+    })
 
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Caja, MovimientoCaja,SesionCaja
+from .models import Caja, MovimientoCaja,SesionCaja, TrabajoReporte
 
 class MovimientoCajaInline(admin.TabularInline):
     model = MovimientoCaja
@@ -25,5 +25,13 @@ class MovimientoCajaAdmin(admin.ModelAdmin):
 
 @admin.register(SesionCaja)
 class SesionCajaAdmin(admin.ModelAdmin):
-    list_display = ('caja', 'responsable', 'estado')
+    list_display = ('caja', 'responsable', 'estado', 'total_ingresos', 'total_egresos')
+    readonly_fields = ('total_ingresos', 'total_egresos', 'cantidad_ingresos', 'cantidad_egresos')
 
+
+@admin.register(TrabajoReporte)
+class TrabajoReporteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'usuario', 'estado', 'creado', 'finalizado', 'expira')
+    list_filter = ('estado', 'tipo')
+    search_fields = ('usuario__username', 'nombre_archivo')
+    readonly_fields = ('creado', 'iniciado', 'finalizado', 'intentos', 'error', 'archivo', 'content_type')
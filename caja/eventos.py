@@ -0,0 +1,179 @@
+# caja/eventos.py
+"""
+Bus de eventos de caja para el tablero en vivo (Server-Sent Events).
+
+Los cambios de saldo y de estado se publican dentro de la misma transacción
+que los produce. En PostgreSQL viajan con NOTIFY: se entregan solo si la
+transacción confirma y llegan a todos los procesos, que los escuchan con
+una única conexión LISTEN por proceso. Con otros motores se reparten al
+confirmar, solo dentro del proceso que hizo el cambio.
+"""
+import asyncio
+import json
+import logging
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CANAL_EVENTOS_CAJA = 'caja_eventos'
+# Eventos en espera por suscriptor antes de pedirle que recargue
+TAMANO_COLA_SUSCRIPTOR = 200
+SEGUNDOS_RECONEXION = 5
+
+
+def _usa_notify():
+    return connection.vendor == 'postgresql'
+
+
+def publicar_evento_caja(caja_ids, tipo, datos=None):
+    """
+    Publica un evento por caja con su saldo y estado al momento de confirmar.
+
+    Args:
+        caja_ids: Cajas afectadas
+        tipo: 'movimiento', 'movimientos' (registro masivo) o 'estado'
+        datos: Detalle del evento (serializable a JSON; NOTIFY admite ~8 KB)
+    """
+    caja_ids = sorted(set(caja_ids))
+    if not caja_ids:
+        return
+    if _usa_notify():
+        from .models import Caja
+        tabla = connection.ops.quote_name(Caja._meta.db_table)
+        # El saldo se lee en la misma transacción, ya con el UPDATE aplicado
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, json_build_object("
+                "'tipo', %s, 'caja_id', id, 'saldo', saldo_actual::text, 'estado', estado, "
+                f"'datos', %s::json)::text) FROM {tabla} WHERE id = ANY(%s)",
+                [CANAL_EVENTOS_CAJA, tipo, json.dumps(datos or {}, cls=DjangoJSONEncoder), caja_ids]
+            )
+    else:
+        transaction.on_commit(lambda: _publicar_local(caja_ids, tipo, datos or {}))
+
+
+def _publicar_local(caja_ids, tipo, datos):
+    if not bus.suscriptores:
+        return
+    from .models import Caja
+    for caja in Caja.objects.filter(pk__in=caja_ids).values('id', 'saldo_actual', 'estado'):
+        bus.publicar({
+            'tipo': tipo,
+            'caja_id': caja['id'],
+            'saldo': str(caja['saldo_actual']),
+            'estado': caja['estado'],
+            'datos': json.loads(json.dumps(datos, cls=DjangoJSONEncoder)),
+        })
+
+
+def _conectar_escucha():
+    """Conexión propia, en autocommit, dedicada a LISTEN (psycopg2)"""
+    base = connections['default']
+    conexion = base.get_new_connection(base.get_connection_params())
+    conexion.autocommit = True
+    with conexion.cursor() as cursor:
+        cursor.execute(f'LISTEN {CANAL_EVENTOS_CAJA}')
+    return conexion
+
+
+class BusEventosCaja:
+    """
+    Reparte los eventos entre las colas de los suscriptores del proceso.
+    Vive en el event loop del servidor ASGI; la conexión LISTEN se lee con
+    loop.add_reader, sin consultas periódicas.
+    """
+
+    def __init__(self):
+        self.suscriptores = set()
+        self.loop = None
+        self._escucha = None
+        self._conectando = False
+
+    def publicar(self, evento):
+        """Entrega un evento desde cualquier hilo"""
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self._repartir, evento)
+
+    def _repartir(self, evento):
+        for suscripcion in list(self.suscriptores):
+            cola, caja_id = suscripcion
+            if caja_id and evento.get('caja_id') not in (None, caja_id):
+                continue
+            try:
+                cola.put_nowait(evento)
+            except asyncio.QueueFull:
+                # Cliente lento: en lugar de acumular, se le pide recargar
+                while not cola.empty():
+                    cola.get_nowait()
+                cola.put_nowait({'tipo': 'recargar'})
+
+    async def suscribir(self, caja_id=None):
+        """
+        Cola con los eventos de una caja (o de todas). Liberarla con
+        cancelar() al cerrar la conexión.
+        """
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self._cerrar_escucha()
+            self.loop = loop
+        cola = asyncio.Queue(maxsize=TAMANO_COLA_SUSCRIPTOR)
+        self.suscriptores.add((cola, caja_id))
+        await self._asegurar_escucha()
+        return cola
+
+    def cancelar(self, cola):
+        self.suscriptores = {s for s in self.suscriptores if s[0] is not cola}
+
+    async def _asegurar_escucha(self):
+        if self._escucha is not None or self._conectando or not _usa_notify():
+            return
+        self._conectando = True
+        try:
+            from asgiref.sync import sync_to_async
+            conexion = await sync_to_async(_conectar_escucha, thread_sensitive=False)()
+        except Exception:
+            logger.exception('No se pudo escuchar %s', CANAL_EVENTOS_CAJA)
+            self.loop.call_later(SEGUNDOS_RECONEXION, self._reconectar)
+            return
+        finally:
+            self._conectando = False
+        self._escucha = conexion
+        self.loop.add_reader(conexion.fileno(), self._leer_avisos)
+
+    def _leer_avisos(self):
+        try:
+            self._escucha.poll()
+        except Exception:
+            logger.exception('Se perdió la conexión LISTEN de %s', CANAL_EVENTOS_CAJA)
+            self._cerrar_escucha()
+            # Lo publicado mientras no se escuchaba se perdió
+            self._repartir({'tipo': 'recargar'})
+            self.loop.call_later(SEGUNDOS_RECONEXION, self._reconectar)
+            return
+        while self._escucha.notifies:
+            aviso = self._escucha.notifies.pop(0)
+            try:
+                self._repartir(json.loads(aviso.payload))
+            except ValueError:
+                logger.error('Evento de caja inválido: %s', aviso.payload)
+
+    def _reconectar(self):
+        if self.suscriptores:
+            asyncio.ensure_future(self._asegurar_escucha())
+
+    def _cerrar_escucha(self):
+        if self._escucha is None:
+            return
+        try:
+            if self.loop and not self.loop.is_closed():
+                self.loop.remove_reader(self._escucha.fileno())
+            self._escucha.close()
+        except Exception:
+            pass
+        self._escucha = None
+
+
+bus = BusEventosCaja()
@@ -0,0 +1,167 @@
+# caja/exportacion.py
+import csv
+import io
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.exceptions import ValidationError
+from django.http import StreamingHttpResponse
+from django.template.loader import get_template
+from xhtml2pdf import pisa
+
+# Filas leídas de la base por cada ida en las exportaciones
+TAMANO_LOTE_EXPORTACION = 2000
+
+CONTENT_TYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve lo escrito en lugar de guardarlo"""
+
+    def write(self, valor):
+        return valor
+
+
+def respuesta_csv(nombre_archivo, encabezados, filas):
+    """
+    Respuesta CSV que se genera a medida que se envía, sin armar el archivo
+    en memoria.
+
+    Args:
+        nombre_archivo: Nombre sugerido para la descarga
+        encabezados: Títulos de las columnas
+        filas: Iterable (idealmente perezoso) de tuplas
+    """
+    escritor = csv.writer(_Eco())
+
+    def contenido():
+        # BOM para que Excel reconozca el UTF-8
+        yield '\ufeff' + escritor.writerow(encabezados)
+        for fila in filas:
+            yield escritor.writerow(fila)
+
+    response = StreamingHttpResponse(contenido(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return response
+
+
+def libro_xlsx(titulo_hoja, encabezados, filas):
+    """
+    Arma un libro XLSX con el modo write-only de openpyxl: las filas se
+    vuelcan a un archivo temporal a medida que llegan, así la memoria no
+    crece con la cantidad de filas.
+
+    Returns:
+        Archivo temporal con el libro, posicionado al inicio
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ValidationError('Para exportar a Excel debe instalarse openpyxl')
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(title=titulo_hoja)
+    hoja.append(encabezados)
+    for fila in filas:
+        hoja.append(fila)
+
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+def _renderizar_pdf(plantilla, contexto):
+    html = get_template(plantilla).render(contexto)
+    archivo = tempfile.TemporaryFile()
+    estado = pisa.CreatePDF(html, dest=archivo, encoding='UTF-8')
+    if estado.err:
+        archivo.close()
+        raise ValidationError('Error al generar el PDF')
+    archivo.seek(0)
+    return archivo
+
+
+def pdf_desde_plantilla(plantilla, contexto):
+    """
+    Renderiza una plantilla HTML a PDF con xhtml2pdf.
+
+    Returns:
+        Archivo temporal con el PDF, posicionado al inicio
+    """
+    with _renderizar_pdf(plantilla, contexto) as archivo:
+        return unir_pdfs([archivo])
+
+
+def pdf_parcial(plantilla, contexto):
+    """Renderiza una parte de un reporte (ver renderizar_en_paralelo) y devuelve sus bytes"""
+    with _renderizar_pdf(plantilla, contexto) as archivo:
+        return archivo.read()
+
+
+def _iniciar_proceso():
+    import django
+    django.setup()
+
+
+def renderizar_en_paralelo(funcion, tareas, procesos=None):
+    """
+    Ejecuta funcion(tarea) para cada tarea en procesos separados, así cada
+    parte del PDF usa su propio núcleo. Con una sola tarea no se crea el pool.
+
+    Args:
+        funcion: Función de módulo (debe poder importarse desde el proceso hijo)
+        tareas: Lista de argumentos serializables con pickle
+        procesos: Cantidad de procesos (por defecto, uno por núcleo)
+
+    Returns:
+        Lista de resultados en el orden de las tareas
+    """
+    if len(tareas) <= 1:
+        return [funcion(tarea) for tarea in tareas]
+
+    from django.db import connections
+    # Los hijos abren sus propias conexiones: no deben heredar las del padre
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso) as pool:
+        return list(pool.map(funcion, tareas))
+
+
+def unir_pdfs(partes):
+    """
+    Concatena partes de un PDF con pypdf y numera las páginas del resultado
+    ("Página n de N"), ya que cada parte no conoce el total.
+
+    Args:
+        partes: Bytes o archivos con cada parte, en orden
+
+    Returns:
+        Archivo temporal con el PDF, posicionado al inicio
+    """
+    try:
+        from pypdf import PdfReader, PdfWriter
+        from reportlab.pdfgen import canvas
+    except ImportError:
+        raise ValidationError('Para unir reportes PDF deben instalarse pypdf y reportlab')
+
+    escritor = PdfWriter()
+    for parte in partes:
+        escritor.append(PdfReader(io.BytesIO(parte) if isinstance(parte, bytes) else parte))
+
+    total = len(escritor.pages)
+    numeracion = io.BytesIO()
+    lienzo = canvas.Canvas(numeracion)
+    for numero, pagina in enumerate(escritor.pages, start=1):
+        ancho = float(pagina.mediabox.width)
+        lienzo.setPageSize((ancho, float(pagina.mediabox.height)))
+        lienzo.setFont('Helvetica', 8)
+        lienzo.drawRightString(ancho - 28, 14, f'Página {numero} de {total}')
+        lienzo.showPage()
+    lienzo.save()
+    for pagina, numero in zip(escritor.pages, PdfReader(numeracion).pages):
+        pagina.merge_page(numero)
+
+    archivo = tempfile.TemporaryFile()
+    escritor.write(archivo)
+    archivo.seek(0)
+    return archivo
@@ -1,18 +1,30 @@
+import datetime
+
 import django_filters
+from django.utils.timezone import make_aware
 from .models import MovimientoCaja
 
 class MovimientoFilter(django_filters.FilterSet):
+    # Rango de días completos en la zona horaria local; se filtra por rango
+    # de fecha/hora para que la consulta pueda usar índices sobre 'fecha'
     fecha_inicio = django_filters.DateFilter(
         field_name='fecha', 
-        lookup_expr='gte',
+        method='filtrar_desde',
         label='Desde'
     )
     fecha_fin = django_filters.DateFilter(
         field_name='fecha', 
-        lookup_expr='lte',
+        method='filtrar_hasta',
         label='Hasta'
     )
 
     class Meta:
         model = MovimientoCaja
-        fields = ['caja', 'tipo']
\ No newline at end of file
+        fields = ['caja', 'tipo']
+
+    def filtrar_desde(self, queryset, name, value):
+        return queryset.filter(fecha__gte=make_aware(datetime.datetime.combine(value, datetime.time.min)))
+
+    def filtrar_hasta(self, queryset, name, value):
+        siguiente = value + datetime.timedelta(days=1)
+        return queryset.filter(fecha__lt=make_aware(datetime.datetime.combine(siguiente, datetime.time.min)))
@@ -0,0 +1,95 @@
+# caja/imagenes.py
+import hashlib
+import io
+import os
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Las fotos de comprobantes se guardan reducidas, en WebP y con el hash
+# SHA-256 del archivo subido como nombre: la misma foto subida dos veces
+# ocupa un solo archivo.
+CARPETA_COMPROBANTES = 'comprobantes/caja'
+LADO_MAXIMO_COMPROBANTE = 1600
+LADO_MINIATURA_COMPROBANTE = 160
+CALIDAD_COMPROBANTE = 75
+
+_PROCESADA = re.compile(rf'^{CARPETA_COMPROBANTES}/[0-9a-f]{{2}}/[0-9a-f]{{64}}\.webp$')
+
+
+def es_imagen_procesada(nombre):
+    return bool(nombre and _PROCESADA.match(nombre))
+
+
+def ruta_miniatura_comprobante(nombre):
+    """comprobantes/caja/ab/abcd....webp -> comprobantes/caja/ab/abcd..._chica.webp"""
+    base, _ = os.path.splitext(nombre)
+    return f'{base}_chica.webp'
+
+
+def _webp(imagen, lado):
+    copia = imagen.copy()
+    copia.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+    contenido = io.BytesIO()
+    copia.save(contenido, 'WEBP', quality=CALIDAD_COMPROBANTE, method=4)
+    return ContentFile(contenido.getvalue())
+
+
+def guardar_imagen_comprobante(archivo, storage=default_storage):
+    """
+    Reduce, convierte a WebP (sin EXIF ni GPS) y guarda la foto de un
+    comprobante junto con su miniatura. Si ya se subió el mismo archivo
+    reutiliza el existente.
+
+    Args:
+        archivo: Archivo subido o abierto en modo binario
+
+    Returns:
+        Nombre del archivo en el storage
+    """
+    hash_contenido = hashlib.sha256()
+    archivo.seek(0)
+    for bloque in iter(lambda: archivo.read(64 * 1024), b''):
+        hash_contenido.update(bloque)
+    digest = hash_contenido.hexdigest()
+    nombre = f'{CARPETA_COMPROBANTES}/{digest[:2]}/{digest}.webp'
+    if storage.exists(nombre) and storage.exists(ruta_miniatura_comprobante(nombre)):
+        return nombre
+
+    archivo.seek(0)
+    try:
+        imagen = ImageOps.exif_transpose(Image.open(archivo))
+        imagen.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValidationError('El comprobante no es una imagen válida')
+    if imagen.mode not in ('RGB', 'RGBA'):
+        imagen = imagen.convert('RGBA' if 'transparency' in imagen.info or 'A' in imagen.mode else 'RGB')
+    imagen.info = {}
+
+    for ruta, lado in (
+        (nombre, LADO_MAXIMO_COMPROBANTE),
+        (ruta_miniatura_comprobante(nombre), LADO_MINIATURA_COMPROBANTE),
+    ):
+        if not storage.exists(ruta):
+            guardado = storage.save(ruta, _webp(imagen, lado))
+            if guardado != ruta:
+                # Otro proceso guardó la misma imagen mientras tanto
+                storage.delete(guardado)
+    return nombre
+
+
+def comprimir_imagen_existente(nombre, storage=default_storage):
+    """
+    Procesa una imagen ya guardada con el formato anterior (foto original).
+    Solo usa el storage, no la base de datos: apta para procesos hijos.
+
+    Returns:
+        (nombre anterior, nombre nuevo, bytes anteriores, bytes nuevos)
+    """
+    tamano_anterior = storage.size(nombre)
+    with storage.open(nombre, 'rb') as archivo:
+        nuevo = guardar_imagen_comprobante(archivo, storage)
+    return nombre, nuevo, tamano_anterior, storage.size(nuevo)
@@ -0,0 +1,157 @@
+# management/commands/benchmark_saldo_caja.py
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from caja.models import Caja, MovimientoCaja
+from caja.services import registrar_movimientos_caja
+from empresa.models import PuntoExpedicion, Sucursal
+from usuarios.models import PerfilUsuario
+
+
+class Command(BaseCommand):
+    help = (
+        'Registra movimientos concurrentes sobre una caja temporal y verifica '
+        'que el saldo final no pierda actualizaciones'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8, help='Escritores en paralelo')
+        parser.add_argument('--movimientos', type=int, default=200, help='Movimientos por hilo')
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=0,
+            help='Registra en lotes de este tamaño con registrar_movimientos_caja (0 = de a uno)'
+        )
+        parser.add_argument(
+            '--comparar',
+            action='store_true',
+            help='Corre también la actualización anterior (leer, sumar y guardar la caja)'
+        )
+        parser.add_argument('--sucursal', type=int, help='Sucursal de la caja temporal')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite serializa las escrituras: la prueba es válida en PostgreSQL'
+            ))
+        sucursal = (
+            Sucursal.objects.filter(pk=options['sucursal']).first()
+            if options['sucursal'] else Sucursal.objects.first()
+        )
+        responsable = PerfilUsuario.objects.first()
+        if not sucursal or not responsable:
+            raise CommandError('Se necesita al menos una sucursal y un usuario')
+
+        caja = self._crear_caja(sucursal, responsable)
+        try:
+            self._ejecutar('F() atómico', caja, responsable, options, self._registrar)
+            if options['comparar']:
+                self._ejecutar('leer y guardar', caja, responsable, options, self._registrar_anterior)
+        finally:
+            MovimientoCaja.objects.filter(caja=caja).delete()
+            caja.sesiones.all().delete()
+            punto = caja.punto_expedicion
+            caja.delete()
+            punto.delete()
+
+    def _crear_caja(self, sucursal, responsable):
+        usados = set(sucursal.puntos_expedicion.values_list('codigo', flat=True))
+        codigo = next((f'{n:03d}' for n in range(999, 899, -1) if f'{n:03d}' not in usados), None)
+        if not codigo:
+            raise CommandError('No hay códigos de punto de expedición libres para la prueba')
+        with transaction.atomic():
+            punto = PuntoExpedicion.objects.create(
+                sucursal=sucursal, codigo=codigo, descripcion='Benchmark saldo de caja'
+            )
+            caja = Caja.objects.create(
+                punto_expedicion=punto,
+                nombre=f'Benchmark {sucursal.pk}-{codigo}',
+                responsable=responsable
+            )
+            caja.abrir(responsable, Decimal('0'))
+        return caja
+
+    def _ejecutar(self, nombre, caja, responsable, options, funcion):
+        Caja.objects.filter(pk=caja.pk).update(saldo_actual=0)
+        MovimientoCaja.objects.filter(caja=caja).delete()
+        hilos = options['hilos']
+        barrera = threading.Barrier(hilos)
+        # Cada hilo suma lo que ya confirmó, así un hilo que falla a mitad
+        # de camino no distorsiona el saldo esperado
+        totales = [Decimal('0')] * hilos
+        errores = []
+
+        def escritor(indice):
+            try:
+                barrera.wait()
+                funcion(caja.pk, responsable, indice, options, totales)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        trabajadores = [threading.Thread(target=escritor, args=(i,)) for i in range(hilos)]
+        for trabajador in trabajadores:
+            trabajador.start()
+        for trabajador in trabajadores:
+            trabajador.join()
+        duracion = time.perf_counter() - inicio
+
+        esperado = sum(totales)
+        obtenido = Caja.objects.get(pk=caja.pk).saldo_actual
+        cantidad = hilos * options['movimientos']
+        resumen = (
+            f"{nombre}: {cantidad} movimientos en {duracion:.2f}s "
+            f"({cantidad / duracion:.0f}/s) · saldo esperado {esperado} · obtenido {obtenido}"
+        )
+        if errores:
+            resumen += f" · {len(errores)} hilos con error: {errores[0]}"
+        if obtenido == esperado and not errores:
+            self.stdout.write(self.style.SUCCESS(resumen + ' · sin actualizaciones perdidas'))
+        else:
+            self.stdout.write(self.style.ERROR(resumen + f' · diferencia {esperado - obtenido}'))
+
+    def _montos(self, indice, options):
+        azar = random.Random(indice)
+        for n in range(options['movimientos']):
+            tipo = 'INGRESO' if azar.random() < 0.7 else 'EGRESO'
+            yield n, tipo, Decimal(azar.randint(1, 500) * 1000)
+
+    def _registrar(self, caja_id, responsable, indice, options, totales):
+        pendientes = []
+        for n, tipo, monto in self._montos(indice, options):
+            movimiento = MovimientoCaja(
+                caja_id=caja_id,
+                tipo=tipo,
+                monto=monto,
+                responsable=responsable,
+                descripcion='Benchmark',
+                comprobante=f'BENCH-{caja_id}-{indice}-{n}'
+            )
+            if options['lote']:
+                pendientes.append(movimiento)
+                if len(pendientes) >= options['lote']:
+                    registrar_movimientos_caja(pendientes)
+                    totales[indice] += sum(m.importe_saldo for m in pendientes)
+                    pendientes = []
+            else:
+                movimiento.save()
+                totales[indice] += movimiento.importe_saldo
+        registrar_movimientos_caja(pendientes)
+        totales[indice] += sum(m.importe_saldo for m in pendientes)
+
+    def _registrar_anterior(self, caja_id, responsable, indice, options, totales):
+        for _, tipo, monto in self._montos(indice, options):
+            importe = monto if tipo == 'INGRESO' else -monto
+            with transaction.atomic():
+                caja = Caja.objects.get(pk=caja_id)
+                caja.saldo_actual += importe
+                caja.save()
+            totales[indice] += importe
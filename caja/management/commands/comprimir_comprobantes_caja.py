@@ -0,0 +1,69 @@
+# management/commands/comprimir_comprobantes_caja.py
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from caja.imagenes import comprimir_imagen_existente, es_imagen_procesada
+from caja.models import MovimientoCaja
+
+
+class Command(BaseCommand):
+    help = (
+        'Reduce y convierte a WebP las imágenes de comprobantes de caja ya '
+        'cargadas, genera sus miniaturas y unifica las repetidas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Cantidad de procesos en paralelo'
+        )
+        parser.add_argument(
+            '--conservar-originales',
+            action='store_true',
+            help='No borra las fotos originales una vez procesadas'
+        )
+
+    def handle(self, *args, **options):
+        imagenes = [
+            nombre for nombre in
+            MovimientoCaja.objects.exclude(imagen_comprobante='').exclude(imagen_comprobante__isnull=True)
+            .values_list('imagen_comprobante', flat=True).distinct()
+            if not es_imagen_procesada(nombre)
+        ]
+        self.stdout.write(f"Encontré {len(imagenes)} imágenes sin procesar")
+
+        storage = MovimientoCaja._meta.get_field('imagen_comprobante').storage
+        reemplazos = defaultdict(list)
+        tamanos = {}
+        antes = errores = 0
+        # Los procesos hijos solo leen y escriben archivos, no usan la base de datos
+        with ProcessPoolExecutor(max_workers=options['procesos'], initializer=django.setup) as pool:
+            futuros = {pool.submit(comprimir_imagen_existente, nombre): nombre for nombre in imagenes}
+            for futuro in as_completed(futuros):
+                try:
+                    anterior, nuevo, tamano_anterior, tamano_nuevo = futuro.result()
+                except Exception as e:
+                    errores += 1
+                    self.stdout.write(self.style.ERROR(f"Error en {futuros[futuro]}: {str(e)}"))
+                    continue
+                reemplazos[nuevo].append(anterior)
+                antes += tamano_anterior
+                tamanos[nuevo] = tamano_nuevo
+
+        # Un UPDATE por imagen resultante; las fotos repetidas quedan con el mismo archivo
+        for nuevo, anteriores in reemplazos.items():
+            MovimientoCaja.objects.filter(imagen_comprobante__in=anteriores).update(imagen_comprobante=nuevo)
+            if not options['conservar_originales']:
+                for anterior in anteriores:
+                    storage.delete(anterior)
+
+        unificadas = sum(len(anteriores) for anteriores in reemplazos.values()) - len(reemplazos)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(reemplazos)} imágenes guardadas ({unificadas} repetidas unificadas), "
+            f"{antes / 1048576:.1f} MB -> {sum(tamanos.values()) / 1048576:.1f} MB, {errores} errores"
+        ))
@@ -0,0 +1,47 @@
+# management/commands/procesar_reportes.py
+import time
+
+from django.core.management.base import BaseCommand
+from caja.reportes import cerrar_trabajos_agotados, procesar_reportes, purgar_reportes_vencidos
+
+
+class Command(BaseCommand):
+    help = 'Genera los reportes de caja pedidos desde la web y elimina los vencidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limite',
+            type=int,
+            default=10,
+            help='Cantidad máxima de reportes por vuelta'
+        )
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='Queda en ejecución como worker'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2,
+            help='Segundos de espera cuando no hay reportes (modo continuo)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            agotados = cerrar_trabajos_agotados()
+            if agotados:
+                self.stdout.write(self.style.WARNING(f"{agotados} reportes abandonados pasados a error"))
+
+            eliminados = purgar_reportes_vencidos()
+            if eliminados:
+                self.stdout.write(self.style.SUCCESS(f"{eliminados} reportes vencidos eliminados"))
+
+            procesados = procesar_reportes(limite=options['limite'])
+            if procesados:
+                self.stdout.write(self.style.SUCCESS(f"{procesados} reportes procesados"))
+
+            if not options['continuo']:
+                break
+            if procesados < options['limite']:
+                time.sleep(options['intervalo'])
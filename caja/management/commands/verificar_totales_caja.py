@@ -0,0 +1,41 @@
+# management/commands/verificar_totales_caja.py
+from django.core.management.base import BaseCommand
+from caja.services import verificar_totales_sesiones
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los totales de las sesiones de caja y señala las que no coinciden'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sesion',
+            type=int,
+            action='append',
+            help='ID de sesión a verificar (se puede repetir; por defecto todas)'
+        )
+        parser.add_argument(
+            '--corregir',
+            action='store_true',
+            help='Reemplaza los totales guardados por los recalculados'
+        )
+
+    def handle(self, *args, **options):
+        diferencias = verificar_totales_sesiones(
+            sesion_ids=options['sesion'],
+            corregir=options['corregir']
+        )
+        for sesion, guardados, reales in diferencias:
+            self.stdout.write(self.style.WARNING(
+                f"{sesion}: guardado ingresos {guardados[0]} ({guardados[2]}) / "
+                f"egresos {guardados[1]} ({guardados[3]}); "
+                f"real ingresos {reales[0]} ({reales[2]}) / egresos {reales[1]} ({reales[3]})"
+            ))
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('Los totales de todas las sesiones coinciden'))
+        elif options['corregir']:
+            self.stdout.write(self.style.SUCCESS(f"{len(diferencias)} sesiones corregidas"))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"{len(diferencias)} sesiones con diferencias (usar --corregir para recalcularlas)"
+            ))
@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-19 14:55
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def calcular_totales(apps, schema_editor):
+    """Inicializa los totales de las sesiones existentes con un solo UPDATE"""
+    SesionCaja = apps.get_model('caja', 'SesionCaja')
+    MovimientoCaja = apps.get_model('caja', 'MovimientoCaja')
+
+    def agregado(tipo, expresion, vacio):
+        movimientos = MovimientoCaja.objects.filter(sesion=OuterRef('pk'), tipo=tipo)
+        return Coalesce(
+            Subquery(movimientos.values('sesion').annotate(v=expresion).values('v')[:1]),
+            vacio
+        )
+
+    SesionCaja.objects.update(
+        total_ingresos=agregado('INGRESO', Sum('monto'), Decimal('0')),
+        total_egresos=agregado('EGRESO', Sum('monto'), Decimal('0')),
+        cantidad_ingresos=agregado('INGRESO', Count('id'), 0),
+        cantidad_egresos=agregado('EGRESO', Count('id'), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caja', '0003_movimientocaja_nota_credito'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sesioncaja',
+            name='cantidad_egresos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sesioncaja',
+            name='cantidad_ingresos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sesioncaja',
+            name='total_egresos',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='sesioncaja',
+            name='total_ingresos',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(calcular_totales, migrations.RunPython.noop),
+    ]
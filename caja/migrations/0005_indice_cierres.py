@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 14:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caja', '0004_totales_sesion'),
+        ('usuarios', '0003_remove_perfilusuario_comision_entrega_inicial_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sesioncaja',
+            index=models.Index(fields=['estado', '-fecha_cierre', '-id'], name='caja_sesion_estado_4f6b58_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-19 15:10
+
+import caja.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caja', '0005_indice_cierres'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('MOVIMIENTOS_PDF', 'Movimientos de caja (PDF)'), ('MOVIMIENTOS_XLSX', 'Movimientos de caja (Excel)'), ('CIERRES_PDF', 'Cierres de caja (PDF)'), ('SESION_PDF', 'Sesión de caja (PDF)'), ('CIERRE_CAJA_PDF', 'Cierre de caja (PDF)')], max_length=20)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('COMPLETADO', 'Completado'), ('ERROR', 'Error')], default='PENDIENTE', max_length=12)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('finalizado', models.DateTimeField(blank=True, null=True)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('archivo', models.FileField(blank=True, storage=caja.models._almacenamiento_reportes, upload_to='%Y/%m/')),
+                ('nombre_archivo', models.CharField(blank=True, max_length=150)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('expira', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reportes_caja', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Trabajo de Reporte',
+                'verbose_name_plural': 'Trabajos de Reporte',
+                'ordering': ['-creado'],
+                'indexes': [models.Index(condition=models.Q(('estado', 'PENDIENTE')), fields=['id'], name='trabajo_reporte_pendiente'), models.Index(fields=['expira'], name='caja_trabaj_expira_91ba2c_idx')],
+            },
+        ),
+    ]
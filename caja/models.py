@@ -1,9 +1,13 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
 from django.utils import timezone
 from usuarios.models import PerfilUsuario
 from empresa.models import PuntoExpedicion
+from .eventos import publicar_evento_caja
+from .imagenes import es_imagen_procesada, guardar_imagen_comprobante, ruta_miniatura_comprobante
 
 class Caja(models.Model):
     ESTADO_CHOICES = [
@@ -43,6 +47,19 @@ class Caja(models.Model):
     def sesion_activa(self):
         return self.sesiones.filter(estado='ABIERTA').first()
 
+    @classmethod
+    def ajustar_saldo(cls, caja_id, delta):
+        """
+        Suma delta al saldo con un UPDATE atómico sobre la columna, sin leer
+        ni reescribir el resto de la fila: escritores concurrentes sobre la
+        misma caja no pierden actualizaciones.
+        """
+        if delta:
+            cls.objects.filter(pk=caja_id).update(
+                saldo_actual=F('saldo_actual') + delta,
+                actualizado=timezone.now()
+            )
+
     @transaction.atomic
     def abrir(self, responsable, saldo_inicial):
         if self.estado == 'ABIERTA':
@@ -61,6 +78,7 @@ class Caja(models.Model):
             responsable=responsable,
             saldo_inicial=saldo_inicial
         )
+        publicar_evento_caja([self.pk], 'estado')
 
     @transaction.atomic
     def cerrar(self, saldo_final=None):
@@ -74,7 +92,8 @@ class Caja(models.Model):
         
         self.estado = 'CERRADA'
         self.fecha_cierre = timezone.now()
-        self.save()
+        self.save(update_fields=['estado', 'fecha_cierre', 'actualizado'])
+        publicar_evento_caja([self.pk], 'estado')
 
 class SesionCaja(models.Model):
     caja = models.ForeignKey(Caja, on_delete=models.PROTECT, related_name='sesiones')
@@ -85,6 +104,11 @@ class SesionCaja(models.Model):
     fecha_cierre = models.DateTimeField(null=True, blank=True)
     observaciones = models.TextField(blank=True)
     estado = models.CharField(max_length=10, choices=[('ABIERTA', 'Abierta'), ('CERRADA', 'Cerrada')], default='ABIERTA')
+    # Totales acumulados con cada MovimientoCaja; verificar_totales_caja los recalcula
+    total_ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_egresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad_ingresos = models.PositiveIntegerField(default=0)
+    cantidad_egresos = models.PositiveIntegerField(default=0)
 
     class Meta:
         verbose_name = 'Sesión de Caja'
@@ -92,31 +116,35 @@ class SesionCaja(models.Model):
         ordering = ['-fecha_apertura']
         indexes = [
             models.Index(fields=['estado', 'fecha_apertura']),
+            models.Index(fields=['estado', '-fecha_cierre', '-id']),
         ]
 
     def __str__(self):
         return f"Sesión {self.id} - {self.caja.nombre} ({self.get_estado_display()})"
 
-    @property
-    def movimientos(self):
-        return MovimientoCaja.objects.filter(
-            caja=self.caja,
-            fecha__gte=self.fecha_apertura,
-            fecha__lte=self.fecha_cierre if self.fecha_cierre else timezone.now()
-        )
+    @classmethod
+    def acumular(cls, sesion_id, movimientos):
+        """
+        Suma los movimientos a los totales de la sesión con un único UPDATE
+        atómico (F()), sin leer la fila.
+        """
+        ingresos = [m.monto for m in movimientos if m.tipo == 'INGRESO']
+        egresos = [m.monto for m in movimientos if m.tipo != 'INGRESO']
+        if sesion_id and (ingresos or egresos):
+            cls.objects.filter(pk=sesion_id).update(
+                total_ingresos=F('total_ingresos') + sum(ingresos),
+                total_egresos=F('total_egresos') + sum(egresos),
+                cantidad_ingresos=F('cantidad_ingresos') + len(ingresos),
+                cantidad_egresos=F('cantidad_egresos') + len(egresos)
+            )
 
+    @property
+    def cantidad_movimientos(self):
+        return self.cantidad_ingresos + self.cantidad_egresos
 
     @property
     def saldo_teorico(self):
-        # Convertir el RelatedManager a una lista evaluando la consulta
-        movimientos = list(self.movimientos.all())
-        total = self.saldo_inicial
-        for movimiento in movimientos:
-            if movimiento.tipo == 'INGRESO':
-                total += movimiento.monto
-            else:
-                total -= movimiento.monto
-        return total
+        return self.saldo_inicial + self.total_ingresos - self.total_egresos
 
     @property
     def diferencia(self):
@@ -139,11 +167,12 @@ class SesionCaja(models.Model):
         self.fecha_cierre = timezone.now()
         self.observaciones = observaciones
         self.estado = 'CERRADA'
-        self.save()
+        # Sin tocar los totales acumulados, que se actualizan con F()
+        self.save(update_fields=['saldo_final', 'fecha_cierre', 'observaciones', 'estado'])
         
         # Actualizar saldo de la caja padre
         self.caja.saldo_actual = saldo_final
-        self.caja.save()
+        self.caja.save(update_fields=['saldo_actual', 'actualizado'])
 
 class MovimientoCaja(models.Model):
     TIPO_CHOICES = [
@@ -185,18 +214,45 @@ class MovimientoCaja(models.Model):
         return f"{self.get_tipo_display()} - ${self.monto} - {self.fecha.strftime('%d/%m/%Y %H:%M')}"
 
     def clean(self):
-        if self.monto <= 0:
+        if self.monto is not None and self.monto <= 0:
             raise ValidationError('El monto debe ser positivo')
         
-        # Solo intentar asignar sesión si la caja ya está asignada
-        if hasattr(self, 'caja') and not self.sesion and self.caja.sesion_activa:
+        # Solo intentar asignar sesión si la caja ya está asignada y no se
+        # recibió una sesión resuelta por quien crea el movimiento
+        if self.caja_id and not self.sesion_id:
             self.sesion = self.caja.sesion_activa
 
+    @property
+    def miniatura_comprobante_url(self):
+        """URL de la miniatura (None si no hay imagen o aún no se procesó)"""
+        if not es_imagen_procesada(self.imagen_comprobante.name):
+            return None
+        return self.imagen_comprobante.storage.url(ruta_miniatura_comprobante(self.imagen_comprobante.name))
+
+    @property
+    def importe_saldo(self):
+        """Efecto del movimiento sobre el saldo de la caja"""
+        return self.monto if self.tipo == 'INGRESO' else -self.monto
+
     def save(self, *args, **kwargs):
         """
         Guarda el movimiento y actualiza el saldo de la caja.
-        Asigna automáticamente la sesión activa si existe.
+        Asigna automáticamente la sesión activa si no se indicó una.
+
+        El saldo se actualiza con un UPDATE atómico (F()) y no con la
+        instancia de Caja en memoria, que puede estar desactualizada.
+        Para registrar varios movimientos juntos usar
+        caja.services.registrar_movimientos_caja.
+
+        Una imagen de comprobante recién subida se guarda reducida y en WebP
+        (ver caja.imagenes) antes de abrir la transacción.
         """
+        nuevo = self._state.adding
+        imagen = self.imagen_comprobante
+        if imagen and not imagen._committed:
+            imagen.name = guardar_imagen_comprobante(imagen.file, imagen.storage)
+            imagen._committed = True
+
         with transaction.atomic():
             # Primero validamos (esto incluirá la asignación de sesión si es posible)
             self.full_clean()
@@ -204,10 +260,87 @@ class MovimientoCaja(models.Model):
             # Guardamos el movimiento
             super().save(*args, **kwargs)
             
-            # Actualizar saldo de la caja solo si está asignada
-            if hasattr(self, 'caja'):
-                if self.tipo == 'INGRESO':
-                    self.caja.saldo_actual += self.monto
-                else:
-                    self.caja.saldo_actual -= self.monto
-                self.caja.save()
\ No newline at end of file
+            # Solo los movimientos nuevos afectan el saldo y los totales
+            if nuevo and self.caja_id:
+                Caja.ajustar_saldo(self.caja_id, self.importe_saldo)
+            if nuevo:
+                SesionCaja.acumular(self.sesion_id, [self])
+            if nuevo and self.caja_id:
+                publicar_evento_caja([self.caja_id], 'movimiento', {
+                    'id': self.pk,
+                    'tipo': self.tipo,
+                    'monto': self.monto,
+                    'descripcion': self.descripcion[:200],
+                    'comprobante': self.comprobante,
+                    'fecha': self.fecha,
+                    'imagen': reverse('caja:imagen_comprobante', args=[self.pk]) if self.imagen_comprobante else None,
+                })
+
+
+def _almacenamiento_reportes():
+    """Carpeta privada de los reportes generados: no se publica bajo MEDIA_URL"""
+    from django.conf import settings
+    from django.core.files.storage import FileSystemStorage
+    return FileSystemStorage(location=settings.CAJA_REPORTES_ROOT)
+
+
+class TrabajoReporte(models.Model):
+    """
+    Reporte pedido desde la web y generado por un worker
+    (manage.py procesar_reportes). El archivo queda disponible para su
+    dueño hasta la fecha de expiración.
+    """
+    TIPO_CHOICES = [
+        ('MOVIMIENTOS_PDF', 'Movimientos de caja (PDF)'),
+        ('MOVIMIENTOS_XLSX', 'Movimientos de caja (Excel)'),
+        ('CIERRES_PDF', 'Cierres de caja (PDF)'),
+        ('SESION_PDF', 'Sesión de caja (PDF)'),
+        ('CIERRE_CAJA_PDF', 'Cierre de caja (PDF)'),
+    ]
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('COMPLETADO', 'Completado'),
+        ('ERROR', 'Error'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    parametros = models.JSONField(default=dict, blank=True)
+    usuario = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='reportes_caja')
+    estado = models.CharField(max_length=12, choices=ESTADO_CHOICES, default='PENDIENTE')
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    finalizado = models.DateTimeField(null=True, blank=True)
+    intentos = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    archivo = models.FileField(upload_to='%Y/%m/', storage=_almacenamiento_reportes, blank=True)
+    nombre_archivo = models.CharField(max_length=150, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    expira = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-creado']
+        verbose_name = 'Trabajo de Reporte'
+        verbose_name_plural = 'Trabajos de Reporte'
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(estado='PENDIENTE'),
+                name='trabajo_reporte_pendiente'
+            ),
+            models.Index(fields=['expira']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.id} ({self.get_estado_display()})"
+
+    @property
+    def terminado(self):
+        return self.estado in ('COMPLETADO', 'ERROR')
+
+    @property
+    def disponible(self):
+        return (
+            self.estado == 'COMPLETADO' and bool(self.archivo)
+            and (self.expira is None or self.expira > timezone.now())
+        )
@@ -0,0 +1,187 @@
+# caja/proyeccion.py
+"""
+Proyección diaria del flujo de caja: cuotas por cobrar (entradas) contra
+cuentas por pagar (salidas) de los próximos días, por sucursal.
+
+El calendario sale de dos consultas agrupadas por sucursal y fecha de
+vencimiento; los saldos acumulados se calculan con numpy. El resultado se
+guarda en caché por día y se invalida cuando se registran pagos o cambian
+las cuentas.
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import DateField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from config.dependencias import cargar_numpy
+
+DIAS_PROYECCION = 90
+CLAVE_VERSION_PROYECCION = 'caja:proyeccion:version'
+
+# Cuotas y cuentas con saldo que todavía se espera cobrar o pagar
+ESTADOS_CUOTA_ABIERTA = ('PENDIENTE', 'PARCIAL', 'VENCIDA')
+ESTADOS_CUENTA_PAGAR_ABIERTA = ('PENDIENTE', 'VENCIDA')
+
+
+def _clave_proyeccion(hoy, dias):
+    version = cache.get(CLAVE_VERSION_PROYECCION)
+    if version is None:
+        cache.add(CLAVE_VERSION_PROYECCION, time.time_ns(), None)
+        version = cache.get(CLAVE_VERSION_PROYECCION)
+    return f'caja:proyeccion:{version}:{hoy.isoformat()}:{dias}'
+
+
+def invalidar_proyeccion_flujo():
+    """Deja obsoleta la proyección en caché al confirmar la transacción"""
+    transaction.on_commit(
+        lambda: cache.set(CLAVE_VERSION_PROYECCION, time.time_ns(), None)
+    )
+
+
+def _segundos_hasta_manana():
+    ahora = timezone.localtime()
+    manana = timezone.make_aware(datetime.combine(ahora.date() + timedelta(days=1), datetime.min.time()))
+    return max(int((manana - ahora).total_seconds()), 60)
+
+
+def _vencimientos(hoy, hasta):
+    """
+    Saldos abiertos agrupados por sucursal y día. Lo vencido se imputa a
+    hoy: es lo primero que se espera cobrar o pagar.
+
+    Returns:
+        Tupla (entradas, salidas) de listas de (sucursal_id, fecha, monto)
+    """
+    from compras.models import CuentaPorPagar, RecepcionCompra
+    from ventas.models import CuentaPorCobrar
+
+    dia = Greatest(F('fecha_vencimiento'), Value(hoy, output_field=DateField()))
+
+    entradas = CuentaPorCobrar.objects.filter(
+        estado__in=ESTADOS_CUOTA_ABIERTA,
+        saldo__gt=0,
+        fecha_vencimiento__lte=hasta
+    ).values(
+        sucursal=F('venta__caja__punto_expedicion__sucursal_id'),
+        dia=dia
+    ).annotate(monto=Sum('saldo')).values_list('sucursal', 'dia', 'monto')
+
+    # La sucursal de una compra es la del almacén donde se recibió
+    sucursal_compra = RecepcionCompra.objects.filter(
+        orden_id=OuterRef('orden_compra_id')
+    ).order_by('fecha', 'id').values('almacen__sucursal_id')[:1]
+    salidas = CuentaPorPagar.objects.filter(
+        estado__in=ESTADOS_CUENTA_PAGAR_ABIERTA,
+        saldo_pendiente__gt=0,
+        fecha_vencimiento__lte=hasta
+    ).annotate(
+        sucursal=Subquery(sucursal_compra)
+    ).values('sucursal', dia=dia).annotate(
+        monto=Sum('saldo_pendiente')
+    ).values_list('sucursal', 'dia', 'monto')
+
+    return list(entradas), list(salidas)
+
+
+def _calcular(hoy, dias):
+    from empresa.models import Sucursal
+
+    np = cargar_numpy('proyectar el flujo de caja')
+    hasta = hoy + timedelta(days=dias - 1)
+    entradas, salidas = _vencimientos(hoy, hasta)
+
+    sucursal_ids = sorted({s for s, _, _ in entradas + salidas if s is not None})
+    nombres = dict(Sucursal.objects.filter(pk__in=sucursal_ids).values_list('id', 'nombre'))
+    # Las cuentas sin sucursal (ventas sin caja, compras sin recepción) van en una fila aparte
+    filas = sucursal_ids + [None]
+    indice = {sucursal_id: i for i, sucursal_id in enumerate(filas)}
+
+    def matriz(vencimientos):
+        valores = np.zeros((len(filas), dias))
+        if vencimientos:
+            sucursales, fechas, montos = zip(*vencimientos)
+            np.add.at(
+                valores,
+                (
+                    np.fromiter((indice[s] for s in sucursales), dtype=np.intp, count=len(montos)),
+                    np.fromiter(((f - hoy).days for f in fechas), dtype=np.intp, count=len(montos)),
+                ),
+                np.array(montos, dtype=float)
+            )
+        return valores
+
+    ingresos = matriz(entradas)
+    egresos = matriz(salidas)
+    neto = ingresos - egresos
+    acumulado = np.cumsum(neto, axis=1)
+
+    def serie(i_ingresos, i_egresos, i_neto, i_acumulado):
+        minimo = int(np.argmin(i_acumulado))
+        return {
+            'entradas': np.round(i_ingresos, 2).tolist(),
+            'salidas': np.round(i_egresos, 2).tolist(),
+            'neto': np.round(i_neto, 2).tolist(),
+            'acumulado': np.round(i_acumulado, 2).tolist(),
+            'total_entradas': round(float(i_ingresos.sum()), 2),
+            'total_salidas': round(float(i_egresos.sum()), 2),
+            'minimo': round(float(i_acumulado[minimo]), 2),
+            'dia_minimo': (hoy + timedelta(days=minimo)).isoformat(),
+        }
+
+    sucursales = []
+    for i, sucursal_id in enumerate(filas):
+        if not ingresos[i].any() and not egresos[i].any():
+            continue
+        datos = serie(ingresos[i], egresos[i], neto[i], acumulado[i])
+        datos['id'] = sucursal_id
+        datos['nombre'] = nombres.get(sucursal_id, 'Sin sucursal')
+        sucursales.append(datos)
+
+    total = serie(ingresos.sum(axis=0), egresos.sum(axis=0), neto.sum(axis=0), acumulado.sum(axis=0))
+    return {
+        'desde': hoy.isoformat(),
+        'hasta': hasta.isoformat(),
+        'fechas': [(hoy + timedelta(days=d)).isoformat() for d in range(dias)],
+        'sucursales': sucursales,
+        'total': total,
+        'generado': timezone.now().isoformat(),
+    }
+
+
+def proyeccion_flujo(dias=DIAS_PROYECCION):
+    """
+    Proyección diaria de entradas y salidas de los próximos días, con el
+    neto y el saldo acumulado desde hoy.
+
+    Args:
+        dias: Cantidad de días proyectados (desde hoy inclusive)
+
+    Returns:
+        dict serializable a JSON con las fechas, una serie por sucursal y
+        el total. Cada serie trae entradas, salidas, neto y acumulado por
+        día, los totales y el día de menor saldo acumulado.
+    """
+    if dias < 1:
+        raise ValidationError('La proyección debe abarcar al menos un día')
+    hoy = timezone.localdate()
+    clave = _clave_proyeccion(hoy, dias)
+    datos = cache.get(clave)
+    if datos is None:
+        datos = _calcular(hoy, dias)
+        cache.set(clave, datos, _segundos_hasta_manana())
+    return datos
+
+
+def serie_sucursal(datos, sucursal_id=None):
+    """Serie de una sucursal dentro de la proyección (el total si no se indica)"""
+    if sucursal_id in (None, ''):
+        return datos['total']
+    for serie in datos['sucursales']:
+        if str(serie['id']) == str(sucursal_id):
+            return serie
+    return None
@@ -0,0 +1,444 @@
+# caja/reportes.py
+import datetime
+import logging
+import os
+from datetime import timedelta
+from decimal import Decimal
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+from django.utils.timezone import localtime, make_aware
+
+from .exportacion import (
+    CONTENT_TYPE_XLSX, TAMANO_LOTE_EXPORTACION, libro_xlsx, pdf_desde_plantilla, pdf_parcial,
+    renderizar_en_paralelo, unir_pdfs
+)
+from .filters import MovimientoFilter
+from .models import Caja, MovimientoCaja, SesionCaja, TrabajoReporte
+from .services import consulta_cierres
+
+logger = logging.getLogger(__name__)
+
+# Un trabajo que lleva más que esto en PROCESANDO se considera abandonado
+# (worker caído) y otro worker lo retoma
+MINUTOS_TRABAJO_ABANDONADO = 30
+MAX_INTENTOS_REPORTE = 3
+
+ENCABEZADOS_MOVIMIENTOS = ['Fecha', 'Caja', 'Tipo', 'Monto', 'Descripción', 'Comprobante', 'Responsable']
+
+
+def filas_movimientos(movimientos, fecha_como_texto):
+    """Filas de exportación leídas por lotes, sin instanciar los movimientos"""
+    tipos = dict(MovimientoCaja.TIPO_CHOICES)
+    filas = movimientos.values_list(
+        'fecha', 'caja__nombre', 'tipo', 'monto', 'descripcion', 'comprobante',
+        'responsable__usuario__username'
+    ).iterator(chunk_size=TAMANO_LOTE_EXPORTACION)
+    for fecha, caja, tipo, monto, descripcion, comprobante, responsable in filas:
+        fecha = localtime(fecha)
+        yield (
+            fecha.strftime('%d/%m/%Y %H:%M') if fecha_como_texto else fecha.replace(tzinfo=None),
+            caja, tipos.get(tipo, tipo), monto, descripcion, comprobante, responsable
+        )
+
+
+def html_filas_cierres(cierres):
+    """Renderiza las filas del PDF por lotes, sin instanciar las sesiones"""
+    plantilla = get_template('caja/reportes/_filas_cierres_pdf.html')
+    partes, lote = [], []
+    for cierre in cierres.iterator(chunk_size=TAMANO_LOTE_EXPORTACION):
+        lote.append(cierre)
+        if len(lote) == TAMANO_LOTE_EXPORTACION:
+            partes.append(plantilla.render({'cierres': lote}))
+            lote = []
+    if lote:
+        partes.append(plantilla.render({'cierres': lote}))
+    return mark_safe(''.join(partes))
+
+
+def movimientos_filtrados(parametros):
+    """
+    Movimientos según los filtros del reporte (los de MovimientoFilter).
+
+    Raises:
+        ValidationError: Si los filtros no son válidos
+    """
+    filtro = MovimientoFilter(parametros, queryset=MovimientoCaja.objects.all())
+    if not filtro.is_valid():
+        raise ValidationError([
+            str(error) for errores in filtro.errors.values() for error in errores
+        ])
+    return filtro.qs.order_by('-fecha', '-id')
+
+
+def cierres_filtrados(parametros):
+    """
+    Cierres según los filtros del reporte (caja, fecha_inicio, fecha_fin).
+
+    Raises:
+        ValueError: Si alguna fecha no tiene el formato AAAA-MM-DD
+    """
+    caja_id = parametros.get('caja')
+    cierres = consulta_cierres(caja_id=int(caja_id) if caja_id and str(caja_id).isdigit() else None)
+    if parametros.get('fecha_inicio'):
+        cierres = cierres.filter(fecha_cierre__gte=make_aware(
+            datetime.datetime.strptime(parametros['fecha_inicio'], '%Y-%m-%d')
+        ))
+    if parametros.get('fecha_fin'):
+        cierres = cierres.filter(fecha_cierre__lte=make_aware(
+            datetime.datetime.strptime(parametros['fecha_fin'] + ' 23:59:59', '%Y-%m-%d %H:%M:%S')
+        ))
+    return cierres
+
+
+def _periodo(parametros):
+    return f"{parametros.get('fecha_inicio') or 'inicio'}_{parametros.get('fecha_fin') or 'hoy'}"
+
+
+def _partes(valores, filas_por_parte):
+    """
+    Divide un reporte ordenado por (fecha, id) descendente en partes de
+    `filas_por_parte` filas. Cada parte lleva los totales acumulados antes y
+    al final de ella, para que se pueda renderizar sin conocer las demás.
+
+    Args:
+        valores: Iterable de (fecha, id, *montos a acumular)
+
+    Returns:
+        Lista de dicts con inicio, fin (claves del keyset), previo y acumulado
+    """
+    partes = []
+    acumulado = None
+    for n, (fecha, pk, *montos) in enumerate(valores):
+        if acumulado is None:
+            acumulado = [Decimal('0')] * len(montos)
+        if n % filas_por_parte == 0:
+            partes.append({'inicio': (fecha, pk), 'previo': acumulado})
+        acumulado = [total + (monto or 0) for total, monto in zip(acumulado, montos)]
+
+    for parte, siguiente in zip(partes, partes[1:] + [None]):
+        parte['fin'] = siguiente['inicio'] if siguiente else None
+        parte['acumulado'] = siguiente['previo'] if siguiente else acumulado
+    return partes
+
+
+def _en_parte(queryset, campo_fecha, parte):
+    """Filas de una parte de _partes: desde su inicio hasta el inicio de la siguiente"""
+    if not parte['inicio']:
+        return queryset
+    fecha, pk = parte['inicio']
+    queryset = queryset.filter(
+        Q(**{f'{campo_fecha}__lt': fecha}) | Q(**{campo_fecha: fecha, 'id__lte': pk})
+    )
+    if parte['fin']:
+        fecha, pk = parte['fin']
+        queryset = queryset.filter(
+            Q(**{f'{campo_fecha}__gt': fecha}) | Q(**{campo_fecha: fecha, 'id__gt': pk})
+        )
+    return queryset
+
+
+def _tareas(partes, contexto, parametros, vacio):
+    """Arma una tarea por parte (al menos una, aunque el reporte no tenga filas)"""
+    partes = partes or [{'inicio': None, 'fin': None, 'previo': vacio, 'acumulado': vacio}]
+    return [
+        dict(parte, contexto=contexto, parametros=parametros,
+             primera=n == 0, ultima=n == len(partes) - 1)
+        for n, parte in enumerate(partes)
+    ]
+
+
+def _pdf_por_partes(funcion, tareas):
+    return unir_pdfs(renderizar_en_paralelo(
+        funcion, tareas, procesos=settings.CAJA_REPORTES_PROCESOS
+    ))
+
+
+def _parte_movimientos_pdf(tarea):
+    """Renderiza una parte del reporte de movimientos (se ejecuta en un proceso hijo)"""
+    movimientos = _en_parte(movimientos_filtrados(tarea['parametros']), 'fecha', tarea)
+    transporte_ingresos, transporte_egresos = tarea['previo']
+    total_ingresos, total_egresos = tarea['acumulado']
+    return pdf_parcial('caja/reportes/reporte_movimientos_pdf.html', dict(
+        tarea['contexto'],
+        movimientos=movimientos.select_related('caja', 'responsable__usuario'),
+        continuacion=not tarea['primera'],
+        parcial=not tarea['ultima'],
+        transporte_ingresos=transporte_ingresos,
+        transporte_egresos=transporte_egresos,
+        total_ingresos=total_ingresos,
+        total_egresos=total_egresos,
+        saldo_neto=total_ingresos - total_egresos,
+    ))
+
+
+def _parte_cierres_pdf(tarea):
+    """Renderiza una parte del reporte de cierres (se ejecuta en un proceso hijo)"""
+    cierres = _en_parte(cierres_filtrados(tarea['parametros']), 'fecha_cierre', tarea)
+    transporte_ingresos, transporte_egresos, transporte_diferencia = tarea['previo']
+    total_ingresos, total_egresos, total_diferencia = tarea['acumulado']
+    return pdf_parcial('caja/reportes/reporte_cierres_pdf.html', dict(
+        tarea['contexto'],
+        filas=html_filas_cierres(cierres),
+        continuacion=not tarea['primera'],
+        parcial=not tarea['ultima'],
+        transporte_ingresos=transporte_ingresos,
+        transporte_egresos=transporte_egresos,
+        transporte_diferencia=transporte_diferencia,
+        total_ingresos=total_ingresos,
+        total_egresos=total_egresos,
+        total_diferencia=total_diferencia,
+    ))
+
+
+# Generadores: reciben los parámetros del trabajo y su usuario, y devuelven
+# (nombre de descarga, content type, archivo temporal)
+
+def _movimientos_pdf(parametros, usuario):
+    # Una sola lectura de (fecha, id, monto) arma las partes y los totales
+    valores = (
+        (fecha, pk, monto if tipo == 'INGRESO' else 0, monto if tipo == 'EGRESO' else 0)
+        for fecha, pk, tipo, monto in movimientos_filtrados(parametros).values_list(
+            'fecha', 'id', 'tipo', 'monto'
+        ).iterator(chunk_size=TAMANO_LOTE_EXPORTACION)
+    )
+    partes = _partes(valores, settings.CAJA_REPORTES_FILAS_POR_PARTE)
+    contexto = {
+        'fecha_inicio': parametros.get('fecha_inicio'),
+        'fecha_fin': parametros.get('fecha_fin'),
+        'usuario': usuario,
+        'empresa_nombre': "Mi Empresa S.A.",  # Ajusta estos valores
+        'empresa_direccion': "Av. Principal 123",
+        'fecha_reporte': datetime.datetime.now(),
+    }
+    archivo = _pdf_por_partes(
+        _parte_movimientos_pdf, _tareas(partes, contexto, parametros, [Decimal('0')] * 2)
+    )
+    return f"Movimientos_Caja_{_periodo(parametros)}.pdf", 'application/pdf', archivo
+
+
+def _movimientos_xlsx(parametros, usuario):
+    archivo = libro_xlsx(
+        'Movimientos', ENCABEZADOS_MOVIMIENTOS,
+        filas_movimientos(movimientos_filtrados(parametros), False)
+    )
+    return f"Movimientos_Caja_{_periodo(parametros)}.xlsx", CONTENT_TYPE_XLSX, archivo
+
+
+def _cierres_pdf(parametros, usuario):
+    try:
+        cierres = cierres_filtrados(parametros)
+    except ValueError as e:
+        raise ValidationError(f"Formato de fecha inválido: {e}")
+    partes = _partes(
+        cierres.values_list(
+            'fecha_cierre', 'id', 'total_ingresos', 'total_egresos', 'diferencia'
+        ).iterator(chunk_size=TAMANO_LOTE_EXPORTACION),
+        settings.CAJA_REPORTES_FILAS_POR_PARTE
+    )
+    contexto = {
+        'fecha_inicio': parametros.get('fecha_inicio'),
+        'fecha_fin': parametros.get('fecha_fin'),
+        'fecha_reporte': datetime.datetime.now(),
+        'usuario': usuario,
+    }
+    archivo = _pdf_por_partes(
+        _parte_cierres_pdf, _tareas(partes, contexto, parametros, [Decimal('0')] * 3)
+    )
+    return f"Reporte_Cierres_{_periodo(parametros)}.pdf", 'application/pdf', archivo
+
+
+def _sesion_pdf(parametros, usuario):
+    sesion = SesionCaja.objects.select_related('caja').filter(pk=parametros.get('sesion_id')).first()
+    if not sesion or not sesion.fecha_cierre:
+        raise ValidationError('La sesión no existe o no está cerrada')
+
+    # Calcular duración de la sesión
+    duracion = sesion.fecha_cierre - sesion.fecha_apertura
+    horas, remainder = divmod(duracion.total_seconds(), 3600)
+    minutos, _ = divmod(remainder, 60)
+
+    archivo = pdf_desde_plantilla('caja/reportes/reporte_sesion_pdf.html', {
+        'sesion': sesion,
+        'duracion': f"{int(horas)}h {int(minutos)}m",
+        'fecha_reporte': datetime.datetime.now(),
+        'usuario': usuario,
+        'empresa_nombre': "Su Empresa S.A.",  # Reemplazar con datos reales
+        'empresa_direccion': "Av. Principal 123, Lima, Perú",  # Reemplazar con datos reales
+        'total_ingresos': sesion.total_ingresos,
+        'total_egresos': sesion.total_egresos,
+    })
+    nombre = f"Sesion_Caja_{sesion.caja.nombre}_{sesion.fecha_cierre.date()}.pdf"
+    return nombre, 'application/pdf', archivo
+
+
+def _cierre_caja_pdf(parametros, usuario):
+    caja = Caja.objects.filter(pk=parametros.get('caja_id')).first()
+    if not caja:
+        raise ValidationError('La caja no existe')
+
+    movimientos = caja.movimientos.all().order_by('-fecha')
+    totales = movimientos.aggregate(
+        ingresos=Sum('monto', filter=Q(tipo='INGRESO')),
+        egresos=Sum('monto', filter=Q(tipo='EGRESO'))
+    )
+    archivo = pdf_desde_plantilla('caja/reporte_cierre_pdf.html', {
+        'caja': caja,
+        'movimientos': movimientos,
+        'ingresos': totales['ingresos'] or 0,
+        'egresos': totales['egresos'] or 0,
+        'fecha_reporte': datetime.datetime.now(),
+        'usuario': usuario,
+    })
+    return f"Cierre_Caja_{caja.nombre}_{datetime.date.today()}.pdf", 'application/pdf', archivo
+
+
+GENERADORES_REPORTE = {
+    'MOVIMIENTOS_PDF': _movimientos_pdf,
+    'MOVIMIENTOS_XLSX': _movimientos_xlsx,
+    'CIERRES_PDF': _cierres_pdf,
+    'SESION_PDF': _sesion_pdf,
+    'CIERRE_CAJA_PDF': _cierre_caja_pdf,
+}
+
+
+def encolar_reporte(tipo, parametros, usuario):
+    """
+    Registra un pedido de reporte. Con CAJA_REPORTES_EN_SEGUNDO_PLANO lo
+    genera el worker (manage.py procesar_reportes); si no, se genera en el
+    momento.
+
+    Args:
+        tipo: Clave de GENERADORES_REPORTE
+        parametros: Filtros del reporte (dict serializable a JSON)
+        usuario: Usuario que lo pide y único que puede descargarlo
+
+    Returns:
+        TrabajoReporte creado
+    """
+    if tipo not in GENERADORES_REPORTE:
+        raise ValidationError(f'Tipo de reporte desconocido: {tipo}')
+    trabajo = TrabajoReporte.objects.create(tipo=tipo, parametros=parametros, usuario=usuario)
+    if not settings.CAJA_REPORTES_EN_SEGUNDO_PLANO:
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(
+            estado='PROCESANDO', iniciado=timezone.now(), intentos=1
+        )
+        trabajo.refresh_from_db()
+        ejecutar_trabajo_reporte(trabajo)
+    return trabajo
+
+
+def _tomar_trabajo():
+    """
+    Reserva el próximo trabajo pendiente (o abandonado por un worker caído).
+    select_for_update(skip_locked=True) permite varios workers en paralelo
+    sin que dos tomen el mismo trabajo.
+    """
+    abandonado = timezone.now() - timedelta(minutes=MINUTOS_TRABAJO_ABANDONADO)
+    with transaction.atomic():
+        trabajo = TrabajoReporte.objects.select_for_update(skip_locked=True).filter(
+            Q(estado='PENDIENTE')
+            | Q(estado='PROCESANDO', iniciado__lt=abandonado, intentos__lt=MAX_INTENTOS_REPORTE)
+        ).order_by('id').first()
+        if trabajo is None:
+            return None
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(
+            estado='PROCESANDO', iniciado=timezone.now(), intentos=F('intentos') + 1
+        )
+    trabajo.refresh_from_db()
+    return trabajo
+
+
+def ejecutar_trabajo_reporte(trabajo):
+    """
+    Genera el archivo de un trabajo ya reservado y lo deja COMPLETADO, o en
+    ERROR con el mensaje. En ambos casos queda con fecha de expiración.
+
+    Returns:
+        True si el reporte se generó
+    """
+    archivo = None
+    try:
+        nombre, content_type, archivo = GENERADORES_REPORTE[trabajo.tipo](
+            trabajo.parametros, trabajo.usuario
+        )
+        extension = os.path.splitext(nombre)[1]
+        trabajo.archivo.save(f'{uuid4().hex}{extension}', File(archivo), save=False)
+        trabajo.nombre_archivo = nombre[:150]
+        trabajo.content_type = content_type
+        trabajo.estado = 'COMPLETADO'
+        trabajo.error = ''
+    except Exception as e:
+        logger.exception('Error al generar el reporte %s', trabajo.pk)
+        trabajo.estado = 'ERROR'
+        trabajo.error = ' '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+    finally:
+        if archivo is not None:
+            archivo.close()
+
+    trabajo.finalizado = timezone.now()
+    trabajo.expira = trabajo.finalizado + timedelta(hours=settings.CAJA_REPORTES_EXPIRACION_HORAS)
+    trabajo.save(update_fields=[
+        'archivo', 'nombre_archivo', 'content_type', 'estado', 'error', 'finalizado', 'expira'
+    ])
+    return trabajo.estado == 'COMPLETADO'
+
+
+def procesar_reportes(limite=10):
+    """
+    Genera hasta `limite` reportes pendientes, de a uno por vez.
+
+    Returns:
+        Cantidad de trabajos tomados
+    """
+    procesados = 0
+    while procesados < limite:
+        trabajo = _tomar_trabajo()
+        if trabajo is None:
+            break
+        ejecutar_trabajo_reporte(trabajo)
+        procesados += 1
+    return procesados
+
+
+def cerrar_trabajos_agotados():
+    """
+    Pasa a ERROR los trabajos abandonados que ya agotaron sus intentos, para
+    que no queden en PROCESANDO para siempre y expiren como los demás.
+
+    Returns:
+        Cantidad de trabajos cerrados
+    """
+    ahora = timezone.now()
+    return TrabajoReporte.objects.filter(
+        estado='PROCESANDO',
+        iniciado__lt=ahora - timedelta(minutes=MINUTOS_TRABAJO_ABANDONADO),
+        intentos__gte=MAX_INTENTOS_REPORTE
+    ).update(
+        estado='ERROR',
+        error='El reporte no se pudo generar tras varios intentos',
+        finalizado=ahora,
+        expira=ahora + timedelta(hours=settings.CAJA_REPORTES_EXPIRACION_HORAS)
+    )
+
+
+def purgar_reportes_vencidos():
+    """
+    Borra los trabajos vencidos junto con sus archivos.
+
+    Returns:
+        Cantidad de trabajos eliminados
+    """
+    vencidos = list(TrabajoReporte.objects.filter(expira__lt=timezone.now()))
+    for trabajo in vencidos:
+        if trabajo.archivo:
+            trabajo.archivo.delete(save=False)
+    TrabajoReporte.objects.filter(pk__in=[t.pk for t in vencidos]).delete()
+    return len(vencidos)
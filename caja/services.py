@@ -0,0 +1,277 @@
+# caja/services.py
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Concat
+
+from .eventos import publicar_evento_caja
+from .models import Caja, MovimientoCaja, SesionCaja
+
+# Movimientos por sentencia INSERT en los registros masivos
+TAMANO_LOTE_MOVIMIENTOS = 500
+
+# Totales acumulados de SesionCaja, en el orden de totales_reales_sesiones
+CAMPOS_TOTALES_SESION = ('total_ingresos', 'total_egresos', 'cantidad_ingresos', 'cantidad_egresos')
+
+# Sesiones por página del reporte de cierres
+TAMANO_PAGINA_CIERRES = 50
+
+
+def sesiones_activas(caja_ids):
+    """
+    Sesión abierta de cada caja, resuelta con una sola consulta.
+
+    Returns:
+        dict {caja_id: sesion_id}
+    """
+    caja_ids = set(caja_ids)
+    if not caja_ids:
+        return {}
+    # Como Caja.sesion_activa, gana la sesión abierta más reciente
+    return dict(
+        SesionCaja.objects.filter(caja_id__in=caja_ids, estado='ABIERTA')
+        .order_by('caja_id', 'fecha_apertura')
+        .values_list('caja_id', 'id')
+    )
+
+
+def _validar_lote(movimientos):
+    """Valida montos, tipos y comprobantes de todo el lote con una consulta"""
+    errores = []
+    tipos = dict(MovimientoCaja.TIPO_CHOICES)
+    comprobantes = defaultdict(int)
+    for movimiento in movimientos:
+        if movimiento.monto is None or movimiento.monto <= 0:
+            errores.append(f'El monto debe ser positivo ({movimiento.descripcion})')
+        if movimiento.tipo not in tipos:
+            errores.append(f'Tipo de movimiento inválido: {movimiento.tipo}')
+        if not movimiento.caja_id:
+            errores.append(f'El movimiento no tiene caja ({movimiento.descripcion})')
+        comprobantes[movimiento.comprobante] += 1
+
+    repetidos = [c for c, veces in comprobantes.items() if veces > 1]
+    repetidos += MovimientoCaja.objects.filter(
+        comprobante__in=list(comprobantes)
+    ).values_list('comprobante', flat=True)
+    if repetidos:
+        errores.append(
+            'Ya existe un movimiento con comprobante ' + ', '.join(sorted(set(repetidos)))
+        )
+    if errores:
+        raise ValidationError(errores)
+
+
+@transaction.atomic
+def registrar_movimientos_caja(movimientos):
+    """
+    Registra varios movimientos de caja en una operación: resuelve las
+    sesiones activas una sola vez, inserta con bulk_create y aplica a cada
+    caja y a cada sesión un único UPDATE atómico con el neto de sus
+    movimientos.
+
+    Args:
+        movimientos: MovimientoCaja sin guardar. Los que ya traen sesión
+            la conservan.
+
+    Returns:
+        Lista de movimientos creados
+    """
+    movimientos = list(movimientos)
+    if not movimientos:
+        return []
+    _validar_lote(movimientos)
+
+    sesiones = sesiones_activas(m.caja_id for m in movimientos if not m.sesion_id)
+    netos = defaultdict(int)
+    por_sesion = defaultdict(list)
+    for movimiento in movimientos:
+        if not movimiento.sesion_id:
+            movimiento.sesion_id = sesiones.get(movimiento.caja_id)
+        netos[movimiento.caja_id] += movimiento.importe_saldo
+        por_sesion[movimiento.sesion_id].append(movimiento)
+
+    creados = MovimientoCaja.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE_MOVIMIENTOS)
+
+    # Siempre en el mismo orden para que dos lotes no se bloqueen mutuamente
+    for caja_id in sorted(netos):
+        Caja.ajustar_saldo(caja_id, netos[caja_id])
+    for sesion_id in sorted(s for s in por_sesion if s):
+        SesionCaja.acumular(sesion_id, por_sesion[sesion_id])
+
+    # Un evento por caja para el tablero en vivo, no uno por movimiento
+    cantidades = defaultdict(int)
+    for movimiento in movimientos:
+        cantidades[movimiento.caja_id] += 1
+    for caja_id in sorted(netos):
+        publicar_evento_caja([caja_id], 'movimientos', {
+            'cantidad': cantidades[caja_id],
+            'neto': netos[caja_id],
+        })
+    return creados
+
+
+def totales_reales_sesiones(sesion_ids=None):
+    """
+    Recalcula desde los movimientos los totales de las sesiones con una
+    consulta agrupada.
+
+    Returns:
+        dict {sesion_id: (total_ingresos, total_egresos, cantidad_ingresos, cantidad_egresos)}
+    """
+    movimientos = MovimientoCaja.objects.filter(sesion__isnull=False)
+    if sesion_ids is not None:
+        movimientos = movimientos.filter(sesion_id__in=sesion_ids)
+    ingreso = Q(tipo='INGRESO')
+    filas = movimientos.values('sesion_id').annotate(
+        ingresos=Coalesce(Sum('monto', filter=ingreso), Decimal('0')),
+        egresos=Coalesce(Sum('monto', filter=~ingreso), Decimal('0')),
+        n_ingresos=Count('id', filter=ingreso),
+        n_egresos=Count('id', filter=~ingreso)
+    ).order_by()
+    return {
+        f['sesion_id']: (f['ingresos'], f['egresos'], f['n_ingresos'], f['n_egresos'])
+        for f in filas
+    }
+
+
+def verificar_totales_sesiones(sesion_ids=None, corregir=False):
+    """
+    Compara los totales guardados de cada sesión con los recalculados.
+
+    Args:
+        sesion_ids: Limita la verificación a estas sesiones
+        corregir: Reemplaza los totales guardados por los recalculados
+
+    Returns:
+        Lista de (sesion, guardados, reales) de las sesiones con diferencias
+    """
+    reales = totales_reales_sesiones(sesion_ids)
+    sesiones = SesionCaja.objects.select_related('caja').order_by('id')
+    if sesion_ids is not None:
+        sesiones = sesiones.filter(id__in=sesion_ids)
+
+    vacio = (Decimal('0'), Decimal('0'), 0, 0)
+    diferencias = []
+    for sesion in sesiones.iterator(chunk_size=TAMANO_LOTE_MOVIMIENTOS):
+        guardados = tuple(getattr(sesion, campo) for campo in CAMPOS_TOTALES_SESION)
+        real = reales.get(sesion.id, vacio)
+        if guardados != real:
+            diferencias.append((sesion, guardados, real))
+
+    if corregir:
+        for sesion, _, _ in diferencias:
+            _corregir_totales(sesion.id)
+    return diferencias
+
+
+@transaction.atomic
+def _corregir_totales(sesion_id):
+    """
+    Reemplaza los totales de una sesión por los recalculados. La fila queda
+    bloqueada mientras se recalcula, así un movimiento concurrente suma
+    después de la corrección y no se pierde.
+    """
+    SesionCaja.objects.select_for_update().get(pk=sesion_id)
+    real = totales_reales_sesiones([sesion_id]).get(sesion_id, (Decimal('0'), Decimal('0'), 0, 0))
+    SesionCaja.objects.filter(pk=sesion_id).update(**dict(zip(CAMPOS_TOTALES_SESION, real)))
+
+
+def consulta_cierres(caja_id=None, desde=None, hasta=None):
+    """
+    Sesiones cerradas con sus ingresos, egresos y diferencia en una sola
+    consulta (los totales salen de los acumulados de la sesión), ordenadas
+    de la más reciente a la más antigua.
+
+    Returns:
+        Queryset de dicts, apto para .iterator()
+    """
+    cierres = SesionCaja.objects.filter(estado='CERRADA')
+    if caja_id:
+        cierres = cierres.filter(caja_id=caja_id)
+    if desde:
+        cierres = cierres.filter(fecha_cierre__gte=desde)
+    if hasta:
+        cierres = cierres.filter(fecha_cierre__lte=hasta)
+    return cierres.values(
+        'id', 'fecha_apertura', 'fecha_cierre', 'saldo_inicial', 'saldo_final',
+        'total_ingresos', 'total_egresos', 'cantidad_ingresos', 'cantidad_egresos',
+        caja_nombre=F('caja__nombre'),
+        responsable_nombre=Concat(
+            'responsable__usuario__first_name', Value(' '), 'responsable__usuario__last_name'
+        ),
+        diferencia=F('saldo_final') - F('saldo_inicial') - F('total_ingresos') + F('total_egresos')
+    ).order_by('-fecha_cierre', '-id')
+
+
+def totales_cierres(cierres):
+    """Suma ingresos, egresos y diferencia de un queryset de consulta_cierres"""
+    totales = cierres.order_by().aggregate(
+        suma_ingresos=Sum('total_ingresos'),
+        suma_egresos=Sum('total_egresos'),
+        suma_diferencia=Sum('diferencia')
+    )
+    return {
+        'ingresos': totales['suma_ingresos'] or 0,
+        'egresos': totales['suma_egresos'] or 0,
+        'diferencia': totales['suma_diferencia'] or 0,
+    }
+
+
+def _cursor(fila):
+    """Cursor opaco de una sesión: microsegundos del cierre y id"""
+    epoca = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+    microsegundos = (fila['fecha_cierre'] - epoca) // timedelta(microseconds=1)
+    return f"{microsegundos}-{fila['id']}"
+
+
+def _leer_cursor(cursor):
+    try:
+        microsegundos, sesion_id = (int(parte) for parte in cursor.split('-'))
+    except (AttributeError, ValueError):
+        return None
+    return datetime(1970, 1, 1, tzinfo=dt_timezone.utc) + timedelta(microseconds=microsegundos), sesion_id
+
+
+def pagina_cierres(cierres, despues=None, antes=None, tamano=TAMANO_PAGINA_CIERRES):
+    """
+    Página del reporte de cierres por keyset sobre (fecha_cierre, id): el
+    costo no crece con el número de página, a diferencia de OFFSET.
+
+    Args:
+        cierres: Queryset de consulta_cierres
+        despues: Cursor de la última fila de la página anterior (avanzar)
+        antes: Cursor de la primera fila de la página siguiente (retroceder)
+
+    Returns:
+        dict con filas, siguiente y anterior (cursores o None)
+    """
+    limite = _leer_cursor(antes) if antes else _leer_cursor(despues)
+    retrocede = bool(antes) and limite is not None
+    if limite:
+        fecha, sesion_id = limite
+        if retrocede:
+            cierres = cierres.filter(
+                Q(fecha_cierre__gt=fecha) | Q(fecha_cierre=fecha, id__gt=sesion_id)
+            ).order_by('fecha_cierre', 'id')
+        else:
+            cierres = cierres.filter(
+                Q(fecha_cierre__lt=fecha) | Q(fecha_cierre=fecha, id__lt=sesion_id)
+            )
+
+    filas = list(cierres[:tamano + 1])
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+    if retrocede:
+        filas.reverse()
+
+    siguiente = anterior = None
+    if filas:
+        if hay_mas or retrocede:
+            siguiente = _cursor(filas[-1])
+        if limite and (not retrocede or hay_mas):
+            anterior = _cursor(filas[0])
+    return {'filas': filas, 'siguiente': siguiente, 'anterior': anterior}
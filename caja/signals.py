@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from compras.models import CuentaPorPagar, PagoProveedor
+from ventas.models import CuentaPorCobrar, PagoCuota
+from .proyeccion import invalidar_proyeccion_flujo
+
+
+@receiver(post_save, sender=PagoCuota)
+@receiver(post_delete, sender=PagoCuota)
+@receiver(post_save, sender=PagoProveedor)
+@receiver(post_delete, sender=PagoProveedor)
+@receiver(post_save, sender=CuentaPorCobrar)
+@receiver(post_delete, sender=CuentaPorCobrar)
+@receiver(post_save, sender=CuentaPorPagar)
+@receiver(post_delete, sender=CuentaPorPagar)
+def invalidar_proyeccion(sender, **kwargs):
+    invalidar_proyeccion_flujo()
@@ -11,13 +11,20 @@ urlpatterns = [
     path('<int:caja_id>/cerrar/', views.cerrar_caja, name='cerrar_caja'),
     path('<int:caja_id>/movimiento/', views.registrar_movimiento, name='registrar_movimiento'),
     path('<int:caja_id>/reporte-pdf/', views.reporte_cierre_pdf, name='reporte_cierre_pdf'),
+    path('movimientos/<int:movimiento_id>/imagen/', views.imagen_comprobante, name='imagen_comprobante'),
 
     path('reportes/', views.reportes_caja, name='reportes_caja'),
     path('reportes/movimientos/', views.reporte_movimientos, name='reporte_movimientos'),
     path('reportes/cierres/', views.reporte_cierres, name='reporte_cierres'),
     path('reportes/sesion/<int:sesion_id>/pdf/', views.reporte_sesion_pdf, name='reporte_sesion_pdf'),
+    path('reportes/trabajos/<int:trabajo_id>/', views.estado_reporte, name='estado_reporte'),
+    path('reportes/trabajos/<int:trabajo_id>/descargar/', views.descargar_reporte, name='descargar_reporte'),
 
     path('api/caja/<int:caja_id>/punto-expedicion/', views.obtener_datos_caja, name='api_punto_expedicion'),
+    path('api/reportes/<int:trabajo_id>/estado/', views.api_estado_reporte, name='api_estado_reporte'),
+    path('eventos/', views.eventos_caja, name='eventos_caja'),
+    path('proyeccion/', views.proyeccion_flujo_caja, name='proyeccion_flujo'),
+    path('api/proyeccion/', views.api_proyeccion_flujo, name='api_proyeccion_flujo'),
 
     
 ]
\ No newline at end of file
@@ -6,14 +6,12 @@ from .models import Caja, MovimientoCaja,SesionCaja
 from .forms import CajaForm, AperturaCajaForm, MovimientoCajaForm, CierreCajaForm
 from usuarios.models import PerfilUsuario
 
-from django.http import HttpResponse, JsonResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
+from django.http import JsonResponse
 from io import BytesIO
 import datetime
 
 from django.db.models import Sum, Q
-from django.utils.timezone import make_aware
+from django.utils.timezone import localtime
 
 @login_required
 def lista_cajas(request):
@@ -105,47 +103,8 @@ def registrar_movimiento(request, caja_id):
 
 @login_required
 def reporte_cierre_pdf(request, caja_id):
-    try:
-        caja = get_object_or_404(Caja, pk=caja_id)
-        
-        # Obtener movimientos y cálculos
-        movimientos = caja.movimientos.all().order_by('-fecha')
-        ingresos = sum(m.monto for m in movimientos.filter(tipo='INGRESO'))
-        egresos = sum(m.monto for m in movimientos.filter(tipo='EGRESO'))
-        
-        context = {
-            'caja': caja,
-            'movimientos': movimientos,
-            'ingresos': ingresos,
-            'egresos': egresos,
-            'fecha_reporte': datetime.datetime.now(),
-            'usuario': request.user,
-        }
-        
-        template = get_template('caja/reporte_cierre_pdf.html')
-        html = template.render(context)
-        
-        response = HttpResponse(content_type='application/pdf')
-        filename = f"Cierre_Caja_{caja.nombre}_{datetime.date.today()}.pdf"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Configuración simplificada (sin duplicar 'encoding')
-        pisa_status = pisa.CreatePDF(
-            html,
-            dest=response,
-            encoding='UTF-8',  # Solo aquí una vez
-            link_callback=None
-        )
-        
-        if pisa_status.err:
-            messages.error(request, 'Error al generar el PDF')
-            return redirect('caja:detalle_caja', caja_id=caja.id)
-            
-        return response
-        
-    except Exception as e:
-        messages.error(request, f'Error inesperado: {str(e)}')
-        return redirect('caja:detalle_caja', caja_id=caja_id)
+    caja = get_object_or_404(Caja, pk=caja_id)
+    return _encolar(request, 'CIERRE_CAJA_PDF', {'caja_id': caja.id}, 'caja:detalle_caja', caja_id=caja.id)
 
 
 
@@ -158,75 +117,103 @@ def reportes_caja(request):
         'titulo': 'Reportes de Caja'
     })
 
+from django.core.exceptions import ValidationError
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from .models import TrabajoReporte
+from .exportacion import respuesta_csv
+from .reportes import (
+    ENCABEZADOS_MOVIMIENTOS, cierres_filtrados, encolar_reporte, filas_movimientos,
+    movimientos_filtrados
+)
+
+
+def _encolar(request, tipo, parametros, *redireccion_error, **kwargs_redireccion):
+    """Pide el reporte y lleva al usuario a la página que sigue su estado"""
+    try:
+        trabajo = encolar_reporte(tipo, parametros, request.user)
+    except ValidationError as e:
+        messages.error(request, ' '.join(e.messages))
+        return redirect(*redireccion_error, **kwargs_redireccion)
+    return redirect('caja:estado_reporte', trabajo_id=trabajo.id)
+
+
+@login_required
+def estado_reporte(request, trabajo_id):
+    trabajo = get_object_or_404(TrabajoReporte, pk=trabajo_id, usuario=request.user)
+    return render(request, 'caja/reportes/estado_reporte.html', {
+        'trabajo': trabajo,
+        'titulo': trabajo.get_tipo_display()
+    })
+
+
+@login_required
+def api_estado_reporte(request, trabajo_id):
+    trabajo = get_object_or_404(TrabajoReporte, pk=trabajo_id, usuario=request.user)
+    return JsonResponse({
+        'estado': trabajo.estado,
+        'estado_display': trabajo.get_estado_display(),
+        'terminado': trabajo.terminado,
+        'error': trabajo.error,
+        'descarga': reverse('caja:descargar_reporte', args=[trabajo.id]) if trabajo.disponible else None,
+    })
+
+
+@login_required
+def descargar_reporte(request, trabajo_id):
+    trabajo = get_object_or_404(TrabajoReporte, pk=trabajo_id, usuario=request.user)
+    if not trabajo.disponible:
+        raise Http404('El reporte no está disponible')
+    return FileResponse(
+        trabajo.archivo.open('rb'),
+        as_attachment=True,
+        filename=trabajo.nombre_archivo,
+        content_type=trabajo.content_type
+    )
+
+
 @login_required
 def reporte_movimientos(request):
-    # Filtros
+    # Filtros (los mismos de MovimientoFilter para la vista y las exportaciones)
     caja_id = request.GET.get('caja')
     fecha_inicio = request.GET.get('fecha_inicio')
     fecha_fin = request.GET.get('fecha_fin')
     tipo = request.GET.get('tipo')
 
-    # Consulta base
-    movimientos = MovimientoCaja.objects.select_related(
-        'caja', 'responsable__usuario'
-    ).order_by('-fecha')
+    parametros = {
+        clave: valor for clave, valor in
+        (('caja', caja_id), ('fecha_inicio', fecha_inicio), ('fecha_fin', fecha_fin), ('tipo', tipo))
+        if valor
+    }
+    try:
+        movimientos = movimientos_filtrados(parametros)
+    except ValidationError as e:
+        messages.error(request, 'Filtros inválidos: ' + ' '.join(e.messages))
+        movimientos = MovimientoCaja.objects.none()
+
+    # CSV en streaming; PDF y Excel los genera el worker de reportes
+    exportar = request.GET.get('exportar')
+    if exportar == 'csv':
+        return respuesta_csv(
+            f"Movimientos_Caja_{fecha_inicio or 'inicio'}_{fecha_fin or 'hoy'}.csv",
+            ENCABEZADOS_MOVIMIENTOS, filas_movimientos(movimientos, True)
+        )
+    if exportar in ('pdf', 'xlsx') and movimientos.query.is_empty():
+        return redirect('caja:reporte_movimientos')
+    if exportar == 'xlsx':
+        return _encolar(request, 'MOVIMIENTOS_XLSX', parametros, 'caja:reporte_movimientos')
+    if exportar:
+        return _encolar(request, 'MOVIMIENTOS_PDF', parametros, 'caja:reporte_movimientos')
 
-    # Aplicar filtros
-    if caja_id:
-        movimientos = movimientos.filter(caja_id=caja_id)
-    if fecha_inicio:
-        movimientos = movimientos.filter(fecha__gte=make_aware(
-            datetime.datetime.strptime(fecha_inicio, '%Y-%m-%d')
-        ))
-    if fecha_fin:
-        movimientos = movimientos.filter(fecha__lte=make_aware(
-            datetime.datetime.strptime(fecha_fin + ' 23:59:59', '%Y-%m-%d %H:%M:%S')
-        ))
-    if tipo:
-        movimientos = movimientos.filter(tipo=tipo)
+    movimientos = movimientos.select_related('caja', 'responsable__usuario')
 
     # Totales
-    total_ingresos = movimientos.filter(tipo='INGRESO').aggregate(
-        Sum('monto'))['monto__sum'] or 0
-    total_egresos = movimientos.filter(tipo='EGRESO').aggregate(
-        Sum('monto'))['monto__sum'] or 0
-
-    # PDF o HTML
-    if 'exportar' in request.GET:
-        context = {
-            'movimientos': movimientos,
-            'total_ingresos': total_ingresos,
-            'total_egresos': total_egresos,
-            'fecha_inicio': fecha_inicio,
-            'fecha_fin': fecha_fin,
-            'usuario': request.user,
-            'empresa_nombre': "Mi Empresa S.A.",  # Ajusta estos valores
-            'empresa_direccion': "Av. Principal 123",
-            'saldo_neto': total_ingresos - total_egresos,
-            'fecha_reporte': datetime.datetime.now(),
-            'usuario': request.user,
-        }
-
-        template = get_template('caja/reportes/reporte_movimientos_pdf.html')
-        html = template.render(context)
-
-        response = HttpResponse(content_type='application/pdf')
-        filename = f"Movimientos_Caja_{fecha_inicio or 'inicio'}_{fecha_fin or 'hoy'}.pdf"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-        # Configuración mejorada de pisa.CreatePDF()
-        pisa_status = pisa.CreatePDF(
-            html,
-            dest=response,
-            encoding='UTF-8',
-            link_callback=None,
-            show_error_as_pdf=True  # ¡Esto es clave para debug!
-        )
-
-        if pisa_status.err:
-            messages.error(request, 'Error al generar el PDF. Revise los logs.')
-            return redirect('caja:reportes_caja')
-        return response
+    totales = movimientos.aggregate(
+        ingresos=Sum('monto', filter=Q(tipo='INGRESO')),
+        egresos=Sum('monto', filter=Q(tipo='EGRESO'))
+    )
+    total_ingresos = totales['ingresos'] or 0
+    total_egresos = totales['egresos'] or 0
 
     return render(request, 'caja/reportes/reporte_movimientos.html', {
         'movimientos': movimientos,
@@ -242,135 +229,76 @@ def reporte_movimientos(request):
     })
 
 
-@login_required
-def reporte_cierres(request):
-    try:
-        # Filtros
-        caja_id = request.GET.get('caja')
-        fecha_inicio = request.GET.get('fecha_inicio')
-        fecha_fin = request.GET.get('fecha_fin')
-
-        # Consulta base optimizada (sin prefetch_related si usamos iterator)
-        cierres = SesionCaja.objects.filter(
-            estado='CERRADA'
-        ).select_related(
-            'caja', 
-            'responsable__usuario'
-        ).order_by('-fecha_cierre')
-
-        # Aplicar filtros con validación
-        if caja_id and caja_id.isdigit():
-            cierres = cierres.filter(caja_id=int(caja_id))
-        
-        try:
-            if fecha_inicio:
-                fecha_inicio_dt = make_aware(
-                    datetime.datetime.strptime(fecha_inicio, '%Y-%m-%d')
-                )
-                cierres = cierres.filter(fecha_cierre__gte=fecha_inicio_dt)
-            
-            if fecha_fin:
-                fecha_fin_dt = make_aware(
-                    datetime.datetime.strptime(fecha_fin + ' 23:59:59', '%Y-%m-%d %H:%M:%S')
-                )
-                cierres = cierres.filter(fecha_cierre__lte=fecha_fin_dt)
-        except ValueError as e:
-            messages.error(request, f"Formato de fecha inválido: {str(e)}")
-            cierres = cierres.none()
-
-        # Cálculo de totales optimizado
-        total_ingresos = 0
-        total_egresos = 0
-        total_diferencia = 0
-
-        # Opción 1: Sin iterator (para conjuntos de datos no muy grandes)
-        for sesion in cierres:
-            try:
-                # Usamos aggregate para evitar cargar todos los movimientos
-                ingresos = sesion.movimientos.filter(tipo='INGRESO').aggregate(
-                    Sum('monto')
-                )['monto__sum'] or 0
-                egresos = sesion.movimientos.filter(tipo='EGRESO').aggregate(
-                    Sum('monto')
-                )['monto__sum'] or 0
-                
-                total_ingresos += ingresos
-                total_egresos += egresos
-                
-                if sesion.saldo_final is not None:
-                    total_diferencia += (sesion.saldo_final - (sesion.saldo_inicial + ingresos - egresos))
-            except Exception as e:
-                messages.warning(request, f"Error calculando totales para sesión {sesion.id}: {str(e)}")
-                continue
-
-        # Opción 2: Si necesitas iterator para grandes conjuntos de datos
-        # (pero sin prefetch_related)
-        # for sesion in cierres.iterator(chunk_size=2000):
-        #     ... mismo código que arriba ...
-
-        # Generación de PDF
-        if 'exportar' in request.GET:
-            context = {
-                'sesiones': cierres,
-                'fecha_inicio': fecha_inicio,
-                'fecha_fin': fecha_fin,
-                'total_ingresos': total_ingresos,
-                'total_egresos': total_egresos,
-                'total_diferencia': total_diferencia,
-                'fecha_reporte': datetime.datetime.now(),
-                'usuario': request.user,
-                'empresa_nombre': "Su Empresa",
-                'empresa_direccion': "Dirección de la empresa",
-            }
+from urllib.parse import urlencode
+from .exportacion import TAMANO_LOTE_EXPORTACION
+from .services import consulta_cierres, pagina_cierres, totales_cierres
 
-            try:
-                template = get_template('caja/reportes/reporte_cierres_pdf.html')
-                html = template.render(context)
 
-                response = HttpResponse(content_type='application/pdf')
-                filename = f"Reporte_Cierres_{fecha_inicio or 'inicio'}_{fecha_fin or 'hoy'}.pdf"
-                response['Content-Disposition'] = f'attachment; filename="{filename}"'
+def _filas_csv_cierres(cierres):
+    for c in cierres.iterator(chunk_size=TAMANO_LOTE_EXPORTACION):
+        yield (
+            c['id'], c['caja_nombre'], c['responsable_nombre'].strip(),
+            localtime(c['fecha_apertura']).strftime('%d/%m/%Y %H:%M'),
+            localtime(c['fecha_cierre']).strftime('%d/%m/%Y %H:%M'),
+            c['saldo_inicial'], c['total_ingresos'], c['total_egresos'],
+            c['saldo_final'], c['diferencia']
+        )
 
-                pdf_status = pisa.CreatePDF(
-                    html,
-                    dest=response,
-                    encoding='UTF-8'
-                )
 
-                if pdf_status.err:
-                    messages.error(request, 'Error al generar el PDF')
-                    return redirect('caja:reporte_cierres')
+@login_required
+def reporte_cierres(request):
+    # Filtros
+    caja_id = request.GET.get('caja')
+    fecha_inicio = request.GET.get('fecha_inicio')
+    fecha_fin = request.GET.get('fecha_fin')
 
-                return response
+    parametros = {
+        clave: valor for clave, valor in
+        (('caja', caja_id), ('fecha_inicio', fecha_inicio), ('fecha_fin', fecha_fin)) if valor
+    }
+    try:
+        cierres = cierres_filtrados(parametros)
+    except ValueError as e:
+        messages.error(request, f"Formato de fecha inválido: {str(e)}")
+        cierres = consulta_cierres().none()
+
+    periodo = f"{fecha_inicio or 'inicio'}_{fecha_fin or 'hoy'}"
+
+    exportar = request.GET.get('exportar')
+    if exportar == 'csv':
+        return respuesta_csv(
+            f"Reporte_Cierres_{periodo}.csv",
+            ['Sesión', 'Caja', 'Responsable', 'Apertura', 'Cierre', 'Saldo Inicial',
+             'Ingresos', 'Egresos', 'Saldo Final', 'Diferencia'],
+            _filas_csv_cierres(cierres)
+        )
 
-            except Exception as e:
-                messages.error(request, f'Error generando PDF: {str(e)}')
-                return redirect('caja:reporte_cierres')
-
-        # Vista HTML
-        return render(request, 'caja/reportes/reporte_cierres.html', {
-            'sesiones': cierres,
-            'cajas': Caja.objects.all(),
-            'total_ingresos': total_ingresos,
-            'total_egresos': total_egresos,
-            'total_diferencia': total_diferencia,
-            'filtros': {
-                'caja_id': caja_id,
-                'fecha_inicio': fecha_inicio,
-                'fecha_fin': fecha_fin,
-            }
-        })
+    if exportar:
+        if cierres.query.is_empty():
+            return redirect('caja:reporte_cierres')
+        return _encolar(request, 'CIERRES_PDF', parametros, 'caja:reporte_cierres')
 
-    except Exception as e:
-        messages.error(request, f'Error inesperado: {str(e)}')
-        return render(request, 'caja/reportes/reporte_cierres.html', {
-            'sesiones': SesionCaja.objects.none(),
-            'cajas': Caja.objects.all(),
-            'total_ingresos': 0,
-            'total_egresos': 0,
-            'total_diferencia': 0,
-            'filtros': {}
-        })
+    # Totales del período completo en una sola consulta
+    totales = totales_cierres(cierres)
+
+    # Vista HTML paginada por keyset
+    pagina = pagina_cierres(cierres, despues=request.GET.get('despues'), antes=request.GET.get('antes'))
+    filtros = {
+        'caja_id': caja_id,
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin,
+    }
+    return render(request, 'caja/reportes/reporte_cierres.html', {
+        'sesiones': pagina['filas'],
+        'siguiente': pagina['siguiente'],
+        'anterior': pagina['anterior'],
+        'filtros_query': urlencode(parametros),
+        'cajas': Caja.objects.all(),
+        'total_ingresos': totales['ingresos'],
+        'total_egresos': totales['egresos'],
+        'total_diferencia': totales['diferencia'],
+        'filtros': filtros
+    })
 
 
 @login_required
@@ -381,15 +309,10 @@ def cerrar_caja(request, caja_id):
         messages.error(request, 'La caja ya está cerrada')
         return redirect('caja:detalle_caja', caja_id=caja.id)
     
-    # Calcular resumen para el cierre
-    movimientos = caja.movimientos.filter(
-        sesion=caja.sesion_activa
-    ) if caja.sesion_activa else caja.movimientos.none()
-    
-    ingresos = movimientos.filter(tipo='INGRESO').aggregate(
-        Sum('monto'))['monto__sum'] or 0
-    egresos = movimientos.filter(tipo='EGRESO').aggregate(
-        Sum('monto'))['monto__sum'] or 0
+    # Resumen para el cierre: totales acumulados de la sesión
+    sesion = caja.sesion_activa
+    ingresos = sesion.total_ingresos if sesion else 0
+    egresos = sesion.total_egresos if sesion else 0
     
     if request.method == 'POST':
         form = CierreCajaForm(request.POST)
@@ -397,8 +320,8 @@ def cerrar_caja(request, caja_id):
             try:
                 with transaction.atomic():
                     # Cerrar la sesión activa primero
-                    if caja.sesion_activa:
-                        caja.sesion_activa.cerrar(
+                    if sesion:
+                        sesion.cerrar(
                             saldo_final=caja.saldo_actual,
                             observaciones=form.cleaned_data['observaciones']
                         )
@@ -427,49 +350,146 @@ def cerrar_caja(request, caja_id):
 
 @login_required
 def reporte_sesion_pdf(request, sesion_id):
-    sesion = get_object_or_404(SesionCaja, pk=sesion_id)
-    
-    # Calcular duración de la sesión
-    duracion = sesion.fecha_cierre - sesion.fecha_apertura
-    horas, remainder = divmod(duracion.total_seconds(), 3600)
-    minutos, _ = divmod(remainder, 60)
-    duracion_str = f"{int(horas)}h {int(minutos)}m"
-    
-    # Calcular totales de movimientos
-    total_ingresos = sesion.movimientos.filter(tipo='INGRESO').aggregate(
-        Sum('monto')
-    )['monto__sum'] or 0
-    
-    total_egresos = sesion.movimientos.filter(tipo='EGRESO').aggregate(
-        Sum('monto')
-    )['monto__sum'] or 0
-    
-    context = {
-        'sesion': sesion,
-        'duracion': duracion_str,
-        'fecha_reporte': datetime.datetime.now(),
-        'usuario': request.user,
-        'empresa_nombre': "Su Empresa S.A.",  # Reemplazar con datos reales
-        'empresa_direccion': "Av. Principal 123, Lima, Perú",  # Reemplazar con datos reales
-        'total_ingresos': total_ingresos,
-        'total_egresos': total_egresos,
-    }
-    
-    template = get_template('caja/reportes/reporte_sesion_pdf.html')
-    html = template.render(context)
-    
-    response = HttpResponse(content_type='application/pdf')
-    filename = f"Sesion_Caja_{sesion.caja.nombre}_{sesion.fecha_cierre.date()}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    pisa_status = pisa.CreatePDF(html, dest=response, encoding='UTF-8')
-    
-    if pisa_status.err:
-        return HttpResponse('Error al generar el PDF', status=500)
-    
+    sesion = get_object_or_404(SesionCaja, pk=sesion_id, estado='CERRADA')
+    return _encolar(request, 'SESION_PDF', {'sesion_id': sesion.id}, 'caja:reporte_cierres')
+
+
+import asyncio
+import json
+from django.http import StreamingHttpResponse
+from .eventos import bus
+
+# Comentario SSE enviado si no hay eventos, para que los proxies no corten la conexión
+SEGUNDOS_LATIDO_EVENTOS = 15
+
+
+def _evento_sse(evento):
+    return f"data: {json.dumps(evento)}\n\n"
+
+
+@login_required
+async def eventos_caja(request):
+    """
+    Flujo SSE con los saldos y movimientos de las cajas (o de una, con
+    ?caja=ID) a medida que se confirman. Se sirve con el servidor ASGI:
+    uvicorn config.asgi:application
+    """
+    caja_id = request.GET.get('caja')
+    caja_id = int(caja_id) if caja_id and caja_id.isdigit() else None
+
+    async def flujo():
+        cola = await bus.suscribir(caja_id)
+        try:
+            # Estado inicial: se lee después de suscribirse para no perder eventos
+            cajas = Caja.objects.values('id', 'saldo_actual', 'estado')
+            if caja_id:
+                cajas = cajas.filter(pk=caja_id)
+            async for caja in cajas:
+                yield _evento_sse({
+                    'tipo': 'estado', 'caja_id': caja['id'],
+                    'saldo': str(caja['saldo_actual']), 'estado': caja['estado'], 'datos': {}
+                })
+            while True:
+                try:
+                    evento = await asyncio.wait_for(cola.get(), SEGUNDOS_LATIDO_EVENTOS)
+                except asyncio.TimeoutError:
+                    yield ': latido\n\n'
+                    continue
+                yield _evento_sse(evento)
+        finally:
+            bus.cancelar(cola)
+
+    response = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
     return response
 
 
+import mimetypes
+from .imagenes import es_imagen_procesada
+
+
+@login_required
+def imagen_comprobante(request, movimiento_id):
+    """Imagen completa del comprobante; las listas solo cargan la miniatura"""
+    movimiento = get_object_or_404(MovimientoCaja, pk=movimiento_id)
+    imagen = movimiento.imagen_comprobante
+    if not imagen or not imagen.storage.exists(imagen.name):
+        raise Http404('El movimiento no tiene imagen de comprobante')
+
+    response = FileResponse(
+        imagen.open('rb'),
+        content_type=mimetypes.guess_type(imagen.name)[0] or 'application/octet-stream'
+    )
+    if es_imagen_procesada(imagen.name):
+        # El nombre es el hash del contenido: nunca cambia
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+
+from django.utils.dateparse import parse_datetime
+from .proyeccion import DIAS_PROYECCION, proyeccion_flujo, serie_sucursal
+
+# Horizonte máximo que se puede pedir a la API de proyección
+DIAS_PROYECCION_MAXIMO = 365
+
+
+@login_required
+def proyeccion_flujo_caja(request):
+    """Calendario de entradas y salidas previstas para los próximos días"""
+    sucursal_id = request.GET.get('sucursal', '')
+    datos, serie, filas = None, None, []
+    try:
+        datos = proyeccion_flujo()
+    except ValidationError as e:
+        messages.error(request, ' '.join(e.messages))
+    if datos:
+        serie = serie_sucursal(datos, sucursal_id)
+    if serie:
+        filas = [
+            (datetime.date.fromisoformat(fecha), entradas, salidas, neto, acumulado)
+            for fecha, entradas, salidas, neto, acumulado in zip(
+                datos['fechas'], serie['entradas'], serie['salidas'], serie['neto'], serie['acumulado']
+            )
+            # Los días sin vencimientos no agregan información al calendario
+            if entradas or salidas
+        ]
+    return render(request, 'caja/proyeccion_flujo.html', {
+        'datos': datos,
+        'serie': serie,
+        'filas': filas,
+        'dia_minimo': datetime.date.fromisoformat(serie['dia_minimo']) if serie else None,
+        'generado': parse_datetime(datos['generado']) if datos else None,
+        'sucursal_id': sucursal_id,
+        'dias': DIAS_PROYECCION,
+        'titulo': 'Proyección de Flujo de Caja'
+    })
+
+
+@login_required
+def api_proyeccion_flujo(request):
+    """Proyección en JSON para el widget del panel de control"""
+    try:
+        dias = min(max(int(request.GET.get('dias', DIAS_PROYECCION)), 1), DIAS_PROYECCION_MAXIMO)
+    except ValueError:
+        dias = DIAS_PROYECCION
+    try:
+        datos = proyeccion_flujo(dias)
+    except ValidationError as e:
+        return JsonResponse({'error': ' '.join(e.messages)}, status=503)
+    serie = serie_sucursal(datos, request.GET.get('sucursal'))
+    if serie is None:
+        raise Http404('La sucursal no tiene vencimientos en el período')
+    return JsonResponse({
+        'desde': datos['desde'],
+        'hasta': datos['hasta'],
+        'fechas': datos['fechas'],
+        'serie': serie,
+        'sucursales': [{'id': s['id'], 'nombre': s['nombre']} for s in datos['sucursales']],
+        'generado': datos['generado'],
+    })
+
+
 from empresa.models import SecuenciaDocumento
 
 def obtener_datos_caja(request, caja_id):
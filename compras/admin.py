@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Proveedor, OrdenCompra, DetalleOrdenCompra, RecepcionCompra
+from .models import (
+    Proveedor, OrdenCompra, DetalleOrdenCompra, RecepcionCompra, DetalleRecepcionCompra, PrecioProveedor
+)
 
 class DetalleOrdenInline(admin.TabularInline):
     model = DetalleOrdenCompra
@@ -17,10 +19,31 @@ class ProveedorAdmin(admin.ModelAdmin):
     list_display = ('razon_social', 'ruc', 'telefono', 'activo')
     search_fields = ('razon_social', 'ruc')
 
+class DetalleRecepcionInline(admin.TabularInline):
+    model = DetalleRecepcionCompra
+    extra = 0
+    readonly_fields = ('detalle_orden', 'cantidad')
+    can_delete = False
+
 @admin.register(RecepcionCompra)
 class RecepcionCompraAdmin(admin.ModelAdmin):
-    list_display = ('orden', 'fecha', 'almacen', 'recibido_por')
+    list_display = ('orden', 'fecha', 'almacen', 'recibido_por', 'numero_documento', 'monto')
     list_filter = ('almacen',)
+    inlines = [DetalleRecepcionInline]
+
+@admin.register(PrecioProveedor)
+class PrecioProveedorAdmin(admin.ModelAdmin):
+    """El historial se llena al recibir órdenes: solo lectura"""
+    list_display = ('producto', 'proveedor', 'fecha', 'precio')
+    list_filter = ('proveedor',)
+    search_fields = ('producto__nombre', 'producto__codigo', 'proveedor__razon_social')
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 
@@ -223,4 +246,40 @@ class PagoProveedorAdmin(admin.ModelAdmin):
                 })
             except CuentaPorPagar.DoesNotExist:
                 pass
-        return initial
\ No newline at end of file
+        return initial
+
+from .models import EjecucionReposicion, SugerenciaReposicion
+
+
+@admin.register(EjecucionReposicion)
+class EjecucionReposicionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'fecha', 'estado', 'pares_analizados', 'cantidad_sugerencias',
+                    'ordenes_generadas', 'duracion')
+    list_filter = ('estado',)
+
+
+@admin.register(SugerenciaReposicion)
+class SugerenciaReposicionAdmin(admin.ModelAdmin):
+    list_display = ('producto', 'almacen', 'proveedor', 'cantidad_sugerida', 'punto_reorden', 'ejecucion', 'orden')
+    list_select_related = ('producto', 'almacen', 'proveedor', 'ejecucion', 'orden')
+    list_filter = ('almacen',)
+    search_fields = ('producto__codigo', 'producto__nombre')
+    raw_id_fields = ('ejecucion', 'producto', 'orden')
+
+
+from .models import LotePagoProveedores, RemesaPagoProveedor
+
+
+class RemesaPagoInline(admin.TabularInline):
+    model = RemesaPagoProveedor
+    extra = 0
+    readonly_fields = ('numero', 'proveedor', 'total', 'cantidad_pagos', 'movimiento_caja')
+    can_delete = False
+
+
+@admin.register(LotePagoProveedores)
+class LotePagoProveedoresAdmin(admin.ModelAdmin):
+    list_display = ('id', 'fecha_pago', 'forma_pago', 'caja', 'cantidad_pagos', 'total', 'usuario')
+    list_filter = ('forma_pago',)
+    date_hierarchy = 'fecha_pago'
+    inlines = [RemesaPagoInline]
@@ -208,5 +208,24 @@ class PagoProveedorForm(forms.ModelForm):
         }
 
 
+class LotePagoProveedoresForm(forms.Form):
+    """Datos comunes a todos los pagos de un lote"""
+    fecha_pago = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    forma_pago = forms.ChoiceField(choices=PagoProveedor.FORMA_PAGO_CHOICES)
+    caja = forms.ModelChoiceField(queryset=Caja.objects.none(), required=False)
+    notas = forms.CharField(widget=forms.Textarea(attrs={'rows': 2}), required=False)
 
+    def __init__(self, user, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['caja'].queryset = Caja.objects.filter(
+            estado='ABIERTA',
+            responsable=user.perfil
+        )
+        self.fields['fecha_pago'].initial = timezone.now().date()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('forma_pago') == 'EFECTIVO' and not cleaned_data.get('caja'):
+            self.add_error('caja', "Los pagos en efectivo requieren una caja abierta")
+        return cleaned_data
 
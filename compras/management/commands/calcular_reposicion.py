@@ -0,0 +1,57 @@
+# management/commands/calcular_reposicion.py
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from compras.services import (
+    calcular_reposicion, generar_ordenes_reposicion, DIAS_HISTORIA_REPOSICION,
+    DIAS_ENTREGA_REPOSICION, DIAS_REVISION_REPOSICION, NIVEL_SERVICIO_REPOSICION,
+    TAMANO_LOTE_REPOSICION
+)
+from usuarios.models import PerfilUsuario
+
+
+class Command(BaseCommand):
+    help = 'Calcula las sugerencias de reposición (pensado para correr cada noche)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias-historia', type=int, default=DIAS_HISTORIA_REPOSICION,
+                            help='Días de salidas a analizar')
+        parser.add_argument('--dias-entrega', type=int, default=DIAS_ENTREGA_REPOSICION,
+                            help='Tiempo de entrega del proveedor en días')
+        parser.add_argument('--dias-revision', type=int, default=DIAS_REVISION_REPOSICION,
+                            help='Días hasta la próxima corrida')
+        parser.add_argument('--nivel-servicio', type=Decimal, default=NIVEL_SERVICIO_REPOSICION,
+                            help='Nivel de servicio deseado (por ejemplo 0.95)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE_REPOSICION,
+                            help='Pares producto/almacén por lote')
+        parser.add_argument('--generar-ordenes', metavar='USUARIO',
+                            help='Genera las órdenes de compra en borrador a nombre de este usuario')
+
+    def handle(self, *args, **options):
+        perfil = None
+        if options['generar_ordenes']:
+            perfil = PerfilUsuario.objects.filter(usuario__username=options['generar_ordenes']).first()
+            if not perfil:
+                raise CommandError(f"No existe el usuario {options['generar_ordenes']}")
+
+        try:
+            ejecucion = calcular_reposicion(
+                usuario=perfil,
+                dias_historia=options['dias_historia'],
+                dias_entrega=options['dias_entrega'],
+                dias_revision=options['dias_revision'],
+                nivel_servicio=options['nivel_servicio'],
+                tamano_lote=options['lote']
+            )
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Reposición #{ejecucion.id}: {ejecucion.pares_analizados} productos/almacén analizados, "
+            f"{ejecucion.cantidad_sugerencias} sugerencias en {ejecucion.duracion}"
+        ))
+
+        if perfil:
+            ordenes = generar_ordenes_reposicion(ejecucion.id, perfil)
+            self.stdout.write(self.style.SUCCESS(f"{len(ordenes)} órdenes de compra generadas en borrador"))
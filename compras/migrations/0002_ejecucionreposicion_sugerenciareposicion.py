@@ -0,0 +1,64 @@
+# Generated by Django 5.2 on 2026-10-19 14:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('almacen', '0007_costoproducto'),
+        ('compras', '0001_initial'),
+        ('usuarios', '0003_remove_perfilusuario_comision_entrega_inicial_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EjecucionReposicion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('estado', models.CharField(choices=[('PROCESANDO', 'Procesando'), ('COMPLETADA', 'Completada'), ('ERROR', 'Error')], default='PROCESANDO', max_length=20)),
+                ('dias_historia', models.PositiveIntegerField(help_text='Días de salidas analizados')),
+                ('dias_entrega', models.PositiveIntegerField(help_text='Tiempo de entrega del proveedor (días)')),
+                ('dias_revision', models.PositiveIntegerField(help_text='Días entre una corrida y la siguiente')),
+                ('nivel_servicio', models.DecimalField(decimal_places=3, max_digits=4)),
+                ('pares_analizados', models.PositiveIntegerField(default=0)),
+                ('cantidad_sugerencias', models.PositiveIntegerField(default=0)),
+                ('ordenes_generadas', models.PositiveIntegerField(default=0)),
+                ('duracion', models.DurationField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='usuarios.perfilusuario')),
+            ],
+            options={
+                'verbose_name': 'Ejecución de Reposición',
+                'verbose_name_plural': 'Ejecuciones de Reposición',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SugerenciaReposicion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('demanda_diaria', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('factor_estacional', models.DecimalField(decimal_places=3, max_digits=6)),
+                ('desviacion', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('stock_actual', models.IntegerField()),
+                ('en_transito', models.PositiveIntegerField(default=0)),
+                ('stock_seguridad', models.PositiveIntegerField()),
+                ('punto_reorden', models.PositiveIntegerField()),
+                ('cantidad_sugerida', models.PositiveIntegerField()),
+                ('precio_unitario', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('almacen', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='almacen.almacen')),
+                ('ejecucion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sugerencias', to='compras.ejecucionreposicion')),
+                ('orden', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sugerencias_reposicion', to='compras.ordencompra')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='almacen.producto')),
+                ('proveedor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='compras.proveedor')),
+            ],
+            options={
+                'verbose_name': 'Sugerencia de Reposición',
+                'verbose_name_plural': 'Sugerencias de Reposición',
+                'constraints': [models.UniqueConstraint(fields=('ejecucion', 'producto', 'almacen'), name='sugerencia_unica_por_ejecucion')],
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2 on 2026-10-19 15:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def inicializar_pendientes(apps, schema_editor):
+    """
+    Las órdenes aprobadas aún no recibidas tienen todo pendiente; las
+    recepciones existentes fueron de la orden completa.
+    """
+    DetalleOrdenCompra = apps.get_model('compras', 'DetalleOrdenCompra')
+    OrdenCompra = apps.get_model('compras', 'OrdenCompra')
+    RecepcionCompra = apps.get_model('compras', 'RecepcionCompra')
+
+    DetalleOrdenCompra.objects.filter(orden__estado='APROBADA', recibido=False).update(
+        cantidad_pendiente=F('cantidad') - F('cantidad_recibida')
+    )
+    RecepcionCompra.objects.update(
+        monto=Subquery(OrdenCompra.objects.filter(pk=OuterRef('orden_id')).values('total')[:1]),
+        numero_documento=Subquery(OrdenCompra.objects.filter(pk=OuterRef('orden_id')).values('numero_documento')[:1]),
+        timbrado=Subquery(OrdenCompra.objects.filter(pk=OuterRef('orden_id')).values('timbrado')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('almacen', '0008_clasificacionproducto'),
+        ('compras', '0002_ejecucionreposicion_sugerenciareposicion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetalleRecepcionCompra',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Detalle de Recepción',
+                'verbose_name_plural': 'Detalles de Recepción',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='recepcioncompra',
+            options={'ordering': ['fecha', 'id'], 'verbose_name': 'Recepción de Compra', 'verbose_name_plural': 'Recepciones de Compras'},
+        ),
+        migrations.AddField(
+            model_name='detalleordencompra',
+            name='cantidad_pendiente',
+            field=models.PositiveIntegerField(default=0, help_text='Cantidad aprobada que todavía no llegó; se actualiza con cada entrega'),
+        ),
+        migrations.AddField(
+            model_name='recepcioncompra',
+            name='monto',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='recepcioncompra',
+            name='numero_documento',
+            field=models.CharField(blank=True, max_length=15),
+        ),
+        migrations.AddField(
+            model_name='recepcioncompra',
+            name='timbrado',
+            field=models.CharField(blank=True, max_length=8),
+        ),
+        migrations.AlterField(
+            model_name='ordencompra',
+            name='estado',
+            field=models.CharField(choices=[('BORRADOR', 'Borrador'), ('APROBADA', 'Aprobada'), ('PARCIAL', 'Recibida Parcialmente'), ('RECIBIDA', 'Recibida'), ('CANCELADA', 'Cancelada'), ('PAGADA', 'Pagada')], default='BORRADOR', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='detalleordencompra',
+            index=models.Index(condition=models.Q(('cantidad_pendiente__gt', 0)), fields=['producto', 'orden'], name='detalle_oc_pendiente_idx'),
+        ),
+        migrations.AddField(
+            model_name='detallerecepcioncompra',
+            name='detalle_orden',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='recepciones', to='compras.detalleordencompra'),
+        ),
+        migrations.AddField(
+            model_name='detallerecepcioncompra',
+            name='recepcion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='compras.recepcioncompra'),
+        ),
+        migrations.RunPython(inicializar_pendientes, migrations.RunPython.noop),
+    ]
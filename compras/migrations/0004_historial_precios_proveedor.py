@@ -0,0 +1,65 @@
+# Generated by Django 5.2 on 2026-10-19 15:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def cargar_historial(apps, schema_editor):
+    """Un precio por producto de cada recepción ya registrada"""
+    RecepcionCompra = apps.get_model('compras', 'RecepcionCompra')
+    DetalleOrdenCompra = apps.get_model('compras', 'DetalleOrdenCompra')
+    DetalleRecepcionCompra = apps.get_model('compras', 'DetalleRecepcionCompra')
+    PrecioProveedor = apps.get_model('compras', 'PrecioProveedor')
+
+    lote = []
+    recepciones = RecepcionCompra.objects.values_list('id', 'orden_id', 'orden__proveedor_id', 'fecha')
+    for recepcion_id, orden_id, proveedor_id, fecha in recepciones.order_by('id').iterator():
+        lineas = DetalleRecepcionCompra.objects.filter(recepcion_id=recepcion_id).values_list(
+            'detalle_orden__producto_id', 'detalle_orden__precio_unitario'
+        )
+        if not lineas.exists():
+            # Recepciones anteriores a las entregas parciales: la orden completa
+            lineas = DetalleOrdenCompra.objects.filter(
+                orden_id=orden_id, cantidad_recibida__gt=0
+            ).values_list('producto_id', 'precio_unitario')
+        for producto_id, precio in set(lineas):
+            lote.append(PrecioProveedor(
+                producto_id=producto_id,
+                proveedor_id=proveedor_id,
+                fecha=timezone.localtime(fecha).date() if timezone.is_aware(fecha) else fecha.date(),
+                precio=precio,
+                recepcion_id=recepcion_id
+            ))
+        if len(lote) >= 1000:
+            PrecioProveedor.objects.bulk_create(lote)
+            lote = []
+    PrecioProveedor.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('almacen', '0008_clasificacionproducto'),
+        ('compras', '0003_recepciones_parciales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecioProveedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='precios_proveedor', to='almacen.producto')),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='precios', to='compras.proveedor')),
+                ('recepcion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='precios', to='compras.recepcioncompra')),
+            ],
+            options={
+                'verbose_name': 'Precio de Proveedor',
+                'verbose_name_plural': 'Historial de Precios de Proveedores',
+                'indexes': [models.Index(fields=['producto', 'proveedor', '-fecha', '-id'], name='precio_prov_ultimo_idx'), models.Index(fields=['producto', 'fecha', 'precio'], name='precio_prov_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(cargar_historial, migrations.RunPython.noop),
+    ]
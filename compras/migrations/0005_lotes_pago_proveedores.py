@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-19 15:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caja', '0006_trabajos_reporte'),
+        ('compras', '0004_historial_precios_proveedor'),
+        ('usuarios', '0003_remove_perfilusuario_comision_entrega_inicial_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LotePagoProveedores',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('fecha_pago', models.DateField()),
+                ('vencimiento_hasta', models.DateField(help_text='Vencimiento máximo de las cuentas seleccionadas')),
+                ('forma_pago', models.CharField(choices=[('EFECTIVO', 'Efectivo'), ('TRANSFERENCIA', 'Transferencia'), ('CHEQUE', 'Cheque'), ('TARJETA', 'Tarjeta')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cantidad_pagos', models.PositiveIntegerField(default=0)),
+                ('notas', models.TextField(blank=True)),
+                ('caja', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='caja.caja')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lotes_pago_proveedores', to='usuarios.perfilusuario')),
+            ],
+            options={
+                'verbose_name': 'Lote de Pagos a Proveedores',
+                'verbose_name_plural': 'Lotes de Pagos a Proveedores',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RemesaPagoProveedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.CharField(max_length=30, unique=True)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('cantidad_pagos', models.PositiveIntegerField()),
+                ('lote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='remesas', to='compras.lotepagoproveedores')),
+                ('movimiento_caja', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='caja.movimientocaja')),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='remesas_pago', to='compras.proveedor')),
+            ],
+            options={
+                'verbose_name': 'Remesa de Pago a Proveedor',
+                'verbose_name_plural': 'Remesas de Pago a Proveedores',
+                'ordering': ['lote', 'numero'],
+            },
+        ),
+        migrations.AddField(
+            model_name='pagoproveedor',
+            name='remesa',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pagos', to='compras.remesapagoproveedor'),
+        ),
+    ]
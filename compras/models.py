@@ -1,8 +1,12 @@
 
+from collections import defaultdict
+
 from django.db import models
 from django.db import transaction
+from django.db.models import Case, F, Q, Sum, Value, When
 from django.core.exceptions import ValidationError
 from almacen.models import Producto, MovimientoInventario, Almacen
+from almacen.services import TAMANO_LOTE_STOCK, aplicar_ajustes_stock, registrar_costo_movimientos
 from usuarios.models import PerfilUsuario
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -23,10 +27,16 @@ class Proveedor(models.Model):
     def __str__(self):
         return self.razon_social
 
+
+# Órdenes que admiten una nueva entrega
+ESTADOS_RECEPCION = ('APROBADA', 'PARCIAL')
+
+
 class OrdenCompra(models.Model):
     ESTADO_CHOICES = [
         ('BORRADOR', 'Borrador'),
         ('APROBADA', 'Aprobada'),
+        ('PARCIAL', 'Recibida Parcialmente'),
         ('RECIBIDA', 'Recibida'),
         ('CANCELADA', 'Cancelada'),
         ('PAGADA', 'Pagada'),
@@ -89,13 +99,23 @@ class OrdenCompra(models.Model):
         if self.estado == 'BORRADOR':
             self.estado = 'APROBADA'
             self.save()
+            # Desde la aprobación la mercadería queda pendiente de recepción
+            self.detalles.update(cantidad_pendiente=F('cantidad') - F('cantidad_recibida'))
             # Aquí podrías agregar notificaciones o historial
 
     @transaction.atomic
-    def recibir(self, usuario, almacen, tipo_pago, tipo_documento, numero_documento, timbrado,condicion, caja=None,plazo_dias=0):
-        """Marca la orden como recibida y actualiza inventario"""
-        if self.estado != 'APROBADA':
-            raise ValidationError('Solo se pueden recibir órdenes aprobadas')
+    def recibir(self, usuario, almacen, tipo_pago, tipo_documento, numero_documento, timbrado,condicion, caja=None,plazo_dias=0, cantidades=None):
+        """
+        Registra una entrega del proveedor y actualiza inventario. La orden
+        puede recibirse en varias entregas; queda RECIBIDA cuando no le
+        quedan cantidades pendientes.
+
+        Args:
+            cantidades: dict {detalle_id: cantidad recibida en esta entrega}.
+                        None recibe todo lo pendiente.
+        """
+        if self.estado not in ESTADOS_RECEPCION:
+            raise ValidationError('Solo se pueden recibir órdenes aprobadas o recibidas parcialmente')
         
         # Asegurarnos que plazo_dias es un entero
         try:
@@ -103,7 +123,7 @@ class OrdenCompra(models.Model):
         except (ValueError, TypeError):
             plazo_dias = 0
 
-        # Actualizar condición y plazo
+        # Actualizar condición y plazo (de la última entrega)
         self.timbrado = timbrado
         self.condicion = condicion
         self.plazo_dias = plazo_dias
@@ -113,55 +133,155 @@ class OrdenCompra(models.Model):
         if condicion == '2':  # Crédito
             self.fecha_vencimiento = (timezone.now() + timezone.timedelta(days=int(plazo_dias))).date()
         
-        with transaction.atomic():
-            # Registrar recepción
-            recepcion = RecepcionCompra.objects.create(
-                orden=self,
-                recibido_por=usuario,
-                almacen=almacen,
-                tipo_pago=tipo_pago
+        # Bloquear la orden: dos recepciones simultáneas no deben sumar el stock dos veces
+        estado = OrdenCompra.objects.select_for_update().filter(pk=self.pk).values_list(
+            'estado', flat=True
+        ).first()
+        if estado not in ESTADOS_RECEPCION:
+            raise ValidationError('Solo se pueden recibir órdenes aprobadas o recibidas parcialmente')
+
+        # Validar todas las líneas antes de modificar nada
+        detalles = list(self.detalles.select_related('producto').order_by('id'))
+        errores = []
+        recibidos = []
+        for detalle in detalles:
+            if cantidades is None:
+                cantidad = detalle.cantidad_pendiente
+            else:
+                cantidad = cantidades.get(detalle.id, 0)
+            if cantidad < 0:
+                errores.append(f'La cantidad para {detalle.producto.nombre} no puede ser negativa')
+            elif cantidad > detalle.cantidad_pendiente:
+                errores.append(
+                    f'No puedes recibir más de lo pendiente para {detalle.producto.nombre}. '
+                    f'Pendiente: {detalle.cantidad_pendiente}'
+                )
+            elif cantidad:
+                recibidos.append((detalle, cantidad))
+        if errores:
+            raise ValidationError(errores)
+        if not recibidos:
+            raise ValidationError('Indique al menos una cantidad recibida')
+
+        monto = sum(detalle.precio_unitario * cantidad for detalle, cantidad in recibidos)
+
+        # Registrar recepción
+        recepcion = RecepcionCompra.objects.create(
+            orden=self,
+            recibido_por=usuario,
+            almacen=almacen,
+            tipo_pago=tipo_pago,
+            numero_documento=numero_documento,
+            timbrado=timbrado,
+            monto=monto
+        )
+        DetalleRecepcionCompra.objects.bulk_create(
+            [
+                DetalleRecepcionCompra(recepcion=recepcion, detalle_orden=detalle, cantidad=cantidad)
+                for detalle, cantidad in recibidos
+            ],
+            batch_size=TAMANO_LOTE_STOCK
+        )
+
+        # Registrar movimiento de caja si se especificó
+        movimiento = None
+
+        if condicion == '1' and tipo_pago == 'EFECTIVO' and caja and caja.estado == 'ABIERTA':
+            movimiento = MovimientoCaja.objects.create(
+                caja=caja,
+                tipo='EGRESO',
+                monto=monto,
+                responsable=usuario,
+                descripcion=f"Compra {self.numero}",
+                compra=self,
+                # Una orden puede recibirse en varias partes: un comprobante por recepción
+                comprobante=f"OC-{self.numero}-R{recepcion.pk}"
             )
-            
-            # Registrar movimiento de caja si se especificó
-            movimiento = None
+        elif condicion == '2':
+            self._sumar_cuenta_por_pagar(monto)
+
+        # Procesar los detalles en bloque: la cantidad de consultas no depende
+        # de la cantidad de líneas
+        for detalle, cantidad in recibidos:
+            detalle.cantidad_recibida += cantidad
+            detalle.cantidad_pendiente -= cantidad
+            detalle.recibido = detalle.cantidad_pendiente == 0
+        DetalleOrdenCompra.objects.bulk_update(
+            [detalle for detalle, _ in recibidos],
+            ['cantidad_recibida', 'cantidad_pendiente', 'recibido'],
+            batch_size=TAMANO_LOTE_STOCK
+        )
 
-            if condicion == '1' and tipo_pago == 'EFECTIVO' and caja and caja.estado == 'ABIERTA':
-                movimiento = MovimientoCaja.objects.create(
-                    caja=caja,
-                    tipo='EGRESO',
-                    monto=self.total,
-                    responsable=usuario,
-                    descripcion=f"Compra {self.numero}",
-                    compra=self,
-                    comprobante=f"OC-{self.numero}"
-                )
-            
-            # Procesar cada detalle
-            for detalle in self.detalles.all():
-                detalle.cantidad_recibida = detalle.cantidad
-                detalle.recibido = True
-                detalle.save()
-                
-                # Actualizar precio de compra
-                if detalle.producto.precio_compra != detalle.precio_unitario:
-                    detalle.producto.precio_compra = detalle.precio_unitario
-                    detalle.producto.save()
-                
-                # Registrar movimiento de inventario
-                MovimientoInventario.objects.create(
-                    producto=detalle.producto,
-                    almacen=almacen,
-                    cantidad=detalle.cantidad,
-                    tipo='ENTRADA',
-                    usuario=usuario,
-                    motivo=f"Recepción de OC-{self.numero}"
+        # Movimientos de inventario (la entrada recalcula el costo promedio)
+        movimientos = [
+            MovimientoInventario(
+                producto_id=detalle.producto_id,
+                almacen=almacen,
+                cantidad=cantidad,
+                tipo='ENTRADA',
+                usuario=usuario,
+                motivo=f"Recepción de OC-{self.numero}",
+                costo_unitario=detalle.precio_unitario
+            )
+            for detalle, cantidad in recibidos
+        ]
+        registrar_costo_movimientos(movimientos)
+        MovimientoInventario.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE_STOCK)
+        ajustes = defaultdict(int)
+        for entrada in movimientos:
+            ajustes[(entrada.producto_id, almacen.id)] += entrada.cantidad
+        aplicar_ajustes_stock(ajustes)
+        # El último precio de compra se registra después de costear: un costo
+        # nuevo parte del stock existente valuado al precio anterior
+        actualizar_precios_compra({detalle.producto_id: detalle.precio_unitario for detalle, _ in recibidos})
+        precios = {(detalle.producto_id, detalle.precio_unitario) for detalle, _ in recibidos}
+        PrecioProveedor.objects.bulk_create(
+            [
+                PrecioProveedor(
+                    producto_id=producto_id,
+                    proveedor_id=self.proveedor_id,
+                    fecha=timezone.localdate(),
+                    precio=precio,
+                    recepcion=recepcion
                 )
-            
-            # Actualizar estado de la orden
-            self.estado = 'RECIBIDA'
-            self.caja = caja if condicion == '1' else None  # Solo asignar caja si es contado
-            self.movimiento_caja = movimiento
-            self.save()
+                for producto_id, precio in sorted(precios)
+            ],
+            batch_size=TAMANO_LOTE_STOCK
+        )
+
+        # Actualizar estado de la orden
+        completa = all(detalle.cantidad_pendiente == 0 for detalle in detalles)
+        self.estado = 'RECIBIDA' if completa else 'PARCIAL'
+        self.caja = caja if condicion == '1' else None  # Solo asignar caja si es contado
+        self.movimiento_caja = movimiento
+        self.save()
+        return recepcion
+
+    def _sumar_cuenta_por_pagar(self, monto):
+        """Agrega una entrega a crédito a la cuenta por pagar de la orden"""
+        cuenta = CuentaPorPagar.objects.select_for_update().filter(orden_compra=self).first()
+        if cuenta is None:
+            CuentaPorPagar.objects.create(
+                orden_compra=self,
+                saldo_pendiente=monto,
+                fecha_vencimiento=self.fecha_vencimiento
+            )
+            return
+        cuenta.saldo_pendiente += monto
+        if cuenta.estado == 'PAGADA':
+            # Se pagó lo entregado antes: la deuda nueva vence con esta entrega
+            cuenta.estado = 'PENDIENTE'
+            cuenta.fecha_pago = None
+            cuenta.fecha_vencimiento = self.fecha_vencimiento
+        cuenta.save()
+
+    @property
+    def pendiente_recepcion(self):
+        """Importe de la mercadería aprobada que todavía no llegó"""
+        return self.detalles.aggregate(
+            total=Sum(F('cantidad_pendiente') * F('precio_unitario'))
+        )['total'] or 0
+
 
 class DetalleOrdenCompra(models.Model):
     orden = models.ForeignKey(OrdenCompra, on_delete=models.CASCADE, related_name='detalles')
@@ -171,10 +291,23 @@ class DetalleOrdenCompra(models.Model):
     subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     recibido = models.BooleanField(default=False)
     cantidad_recibida = models.PositiveIntegerField(default=0)
+    cantidad_pendiente = models.PositiveIntegerField(
+        default=0,
+        help_text="Cantidad aprobada que todavía no llegó; se actualiza con cada entrega"
+    )
 
     class Meta:
         verbose_name = 'Detalle de Orden'
         verbose_name_plural = 'Detalles de Orden'
+        indexes = [
+            # Solo las líneas con mercadería por llegar: el índice no crece
+            # con el historial de órdenes recibidas
+            models.Index(
+                fields=['producto', 'orden'],
+                condition=Q(cantidad_pendiente__gt=0),
+                name='detalle_oc_pendiente_idx'
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         self.subtotal = self.cantidad * self.precio_unitario
@@ -194,6 +327,10 @@ class DetalleOrdenCompra(models.Model):
     def __str__(self):
         return f"{self.producto} x {self.cantidad}"
 
+    @property
+    def importe_pendiente(self):
+        return self.cantidad_pendiente * self.precio_unitario
+
 class RecepcionCompra(models.Model):
     TIPO_PAGO_CHOICES = [
         ('EFECTIVO', 'Efectivo'),
@@ -207,23 +344,95 @@ class RecepcionCompra(models.Model):
     almacen = models.ForeignKey(Almacen, on_delete=models.PROTECT)
     notas = models.TextField(blank=True)
     tipo_pago = models.CharField(max_length=20, choices=TIPO_PAGO_CHOICES, blank=True)
+    numero_documento = models.CharField(max_length=15, blank=True)
+    timbrado = models.CharField(max_length=8, blank=True)
+    monto = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
     class Meta:
+        ordering = ['fecha', 'id']
         verbose_name = 'Recepción de Compra'
         verbose_name_plural = 'Recepciones de Compras'
 
     def __str__(self):
         return f"Recepción de {self.orden}"
 
+
+class DetalleRecepcionCompra(models.Model):
+    """Cantidad de una línea de la orden que llegó en una entrega"""
+    recepcion = models.ForeignKey(RecepcionCompra, on_delete=models.CASCADE, related_name='detalles')
+    detalle_orden = models.ForeignKey(DetalleOrdenCompra, on_delete=models.PROTECT, related_name='recepciones')
+    cantidad = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name = 'Detalle de Recepción'
+        verbose_name_plural = 'Detalles de Recepción'
+
+    def __str__(self):
+        return f"{self.detalle_orden.producto} x {self.cantidad}"
+
+
+class PrecioProveedor(models.Model):
+    """
+    Historial de precios de compra por producto y proveedor. Solo se
+    agregan filas (una por producto en cada recepción); Producto.precio_compra
+    guarda únicamente el último.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='precios_proveedor')
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE, related_name='precios')
+    fecha = models.DateField()
+    precio = models.DecimalField(max_digits=12, decimal_places=2)
+    recepcion = models.ForeignKey(
+        RecepcionCompra,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='precios'
+    )
+
+    class Meta:
+        verbose_name = 'Precio de Proveedor'
+        verbose_name_plural = 'Historial de Precios de Proveedores'
+        indexes = [
+            # Último precio de un proveedor: primera fila del rango
+            models.Index(fields=['producto', 'proveedor', '-fecha', '-id'], name='precio_prov_ultimo_idx'),
+            # Mejor precio reciente: rango por fecha que ya trae el precio
+            models.Index(fields=['producto', 'fecha', 'precio'], name='precio_prov_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto} - {self.proveedor}: {self.precio} ({self.fecha:%d/%m/%Y})"
+
+def actualizar_precios_compra(precios):
+    """
+    Registra el último precio de compra de varios productos con un UPDATE
+    ... CASE por lote, solo en los que cambió.
+
+    Args:
+        precios: dict {producto_id: precio_unitario}
+    """
+    actuales = dict(Producto.objects.filter(pk__in=precios).values_list('id', 'precio_compra'))
+    cambios = [(pk, precio) for pk, precio in precios.items() if pk in actuales and actuales[pk] != precio]
+    for inicio in range(0, len(cambios), TAMANO_LOTE_STOCK):
+        lote = cambios[inicio:inicio + TAMANO_LOTE_STOCK]
+        Producto.objects.filter(pk__in=[pk for pk, _ in lote]).update(
+            precio_compra=Case(
+                *[When(pk=pk, then=Value(precio)) for pk, precio in lote],
+                output_field=Producto._meta.get_field('precio_compra')
+            )
+        )
+
+
 @receiver(post_save, sender=DetalleOrdenCompra)
 def actualizar_precio_producto(sender, instance, created, **kwargs):
     """
-    Actualiza el precio de compra del producto cuando se recibe
+    Actualiza el último precio de compra del producto cuando se recibe.
+    La valuación del inventario usa el costo promedio (CostoProducto).
+    OrdenCompra.recibir usa bulk_update y llama a actualizar_precios_compra.
     """
     if instance.recibido and instance.cantidad_recibida > 0:
-        producto = instance.producto
-        producto.precio_compra = instance.precio_unitario
-        producto.save()
+        Producto.objects.filter(pk=instance.producto_id).exclude(
+            precio_compra=instance.precio_unitario
+        ).update(precio_compra=instance.precio_unitario)
 
 
 
@@ -323,6 +532,13 @@ class PagoProveedor(models.Model):
         null=True,
         blank=True
     )
+    remesa = models.ForeignKey(
+        'RemesaPagoProveedor',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='pagos'
+    )
     
     class Meta:
         verbose_name = 'Pago a Proveedor'
@@ -391,7 +607,9 @@ class PagoProveedor(models.Model):
             self.cuenta.saldo_pendiente -= self.monto
             if self.cuenta.saldo_pendiente <= 0:
                 self.cuenta.estado = 'PAGADA'
-                self.cuenta.orden_compra.estado = 'PAGADA'
+                # Una orden con entregas pendientes sigue abierta
+                if self.cuenta.orden_compra.estado == 'RECIBIDA':
+                    self.cuenta.orden_compra.estado = 'PAGADA'
                 self.cuenta.fecha_pago = self.fecha_pago
             self.cuenta.save()
             self.cuenta.orden_compra.save()
@@ -399,6 +617,53 @@ class PagoProveedor(models.Model):
         super().save(*args, **kwargs)
 
 
+class LotePagoProveedores(models.Model):
+    """Corrida de pagos: cancela juntas las cuentas por pagar seleccionadas"""
+    fecha = models.DateTimeField(auto_now_add=True)
+    usuario = models.ForeignKey(PerfilUsuario, on_delete=models.PROTECT, related_name='lotes_pago_proveedores')
+    fecha_pago = models.DateField()
+    vencimiento_hasta = models.DateField(help_text="Vencimiento máximo de las cuentas seleccionadas")
+    forma_pago = models.CharField(max_length=20, choices=PagoProveedor.FORMA_PAGO_CHOICES)
+    caja = models.ForeignKey('caja.Caja', on_delete=models.PROTECT, null=True, blank=True)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad_pagos = models.PositiveIntegerField(default=0)
+    notas = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = 'Lote de Pagos a Proveedores'
+        verbose_name_plural = 'Lotes de Pagos a Proveedores'
+
+    def __str__(self):
+        return f"Lote de pagos #{self.id} ({self.fecha_pago:%d/%m/%Y})"
+
+
+class RemesaPagoProveedor(models.Model):
+    """
+    Aviso de pago a un proveedor dentro de un lote: detalla las cuentas
+    canceladas y tiene un único movimiento de caja por el total.
+    """
+    lote = models.ForeignKey(LotePagoProveedores, on_delete=models.CASCADE, related_name='remesas')
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.PROTECT, related_name='remesas_pago')
+    numero = models.CharField(max_length=30, unique=True)
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    cantidad_pagos = models.PositiveIntegerField()
+    movimiento_caja = models.ForeignKey(
+        'caja.MovimientoCaja',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        ordering = ['lote', 'numero']
+        verbose_name = 'Remesa de Pago a Proveedor'
+        verbose_name_plural = 'Remesas de Pago a Proveedores'
+
+    def __str__(self):
+        return f"{self.numero} - {self.proveedor}"
+
+
 
 # En compras/models.py
 
@@ -415,6 +680,93 @@ def crear_cuenta_por_pagar(sender, instance, created, **kwargs):
         )
 
 
+@receiver(post_save, sender=OrdenCompra)
+def liberar_pendientes_orden_cancelada(sender, instance, **kwargs):
+    """Lo pendiente de una orden cancelada ya no va a llegar"""
+    if instance.estado == 'CANCELADA':
+        instance.detalles.filter(cantidad_pendiente__gt=0).update(cantidad_pendiente=0)
+
+
+
 
 
 
+
+class EjecucionReposicion(models.Model):
+    """Corrida del cálculo de reposición (normalmente nocturna)"""
+    ESTADO_CHOICES = [
+        ('PROCESANDO', 'Procesando'),
+        ('COMPLETADA', 'Completada'),
+        ('ERROR', 'Error'),
+    ]
+    fecha = models.DateTimeField(auto_now_add=True)
+    usuario = models.ForeignKey(PerfilUsuario, on_delete=models.PROTECT, null=True, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PROCESANDO')
+    dias_historia = models.PositiveIntegerField(help_text="Días de salidas analizados")
+    dias_entrega = models.PositiveIntegerField(help_text="Tiempo de entrega del proveedor (días)")
+    dias_revision = models.PositiveIntegerField(help_text="Días entre una corrida y la siguiente")
+    nivel_servicio = models.DecimalField(max_digits=4, decimal_places=3)
+    pares_analizados = models.PositiveIntegerField(default=0)
+    cantidad_sugerencias = models.PositiveIntegerField(default=0)
+    ordenes_generadas = models.PositiveIntegerField(default=0)
+    duracion = models.DurationField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = 'Ejecución de Reposición'
+        verbose_name_plural = 'Ejecuciones de Reposición'
+
+    def __str__(self):
+        return f"Reposición #{self.id} ({self.fecha:%d/%m/%Y %H:%M})"
+
+
+class SugerenciaReposicion(models.Model):
+    """Cantidad sugerida a comprar de un producto para un almacén"""
+    ejecucion = models.ForeignKey(EjecucionReposicion, on_delete=models.CASCADE, related_name='sugerencias')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    almacen = models.ForeignKey(Almacen, on_delete=models.CASCADE)
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.SET_NULL, null=True, blank=True)
+    demanda_diaria = models.DecimalField(max_digits=12, decimal_places=4)
+    factor_estacional = models.DecimalField(max_digits=6, decimal_places=3)
+    desviacion = models.DecimalField(max_digits=12, decimal_places=4)
+    stock_actual = models.IntegerField()
+    en_transito = models.PositiveIntegerField(default=0)
+    stock_seguridad = models.PositiveIntegerField()
+    punto_reorden = models.PositiveIntegerField()
+    cantidad_sugerida = models.PositiveIntegerField()
+    precio_unitario = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orden = models.ForeignKey(
+        OrdenCompra,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='sugerencias_reposicion'
+    )
+
+    class Meta:
+        verbose_name = 'Sugerencia de Reposición'
+        verbose_name_plural = 'Sugerencias de Reposición'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ejecucion', 'producto', 'almacen'],
+                name='sugerencia_unica_por_ejecucion'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.producto} en {self.almacen}: {self.cantidad_sugerida}"
+
+    @property
+    def explicacion(self):
+        """Explica en palabras de dónde sale la cantidad sugerida"""
+        ejecucion = self.ejecucion
+        return (
+            f"Venta promedio reciente de {self.demanda_diaria:.2f} u/día con factor estacional "
+            f"{self.factor_estacional:.2f} y desvío diario de {self.desviacion:.2f}. "
+            f"Con {ejecucion.dias_entrega} días de entrega y nivel de servicio del "
+            f"{ejecucion.nivel_servicio * 100:.1f}% el stock de seguridad es {self.stock_seguridad} "
+            f"y el punto de reorden {self.punto_reorden}. Disponible: {self.stock_actual} en stock + "
+            f"{self.en_transito} en órdenes abiertas; se sugiere comprar {self.cantidad_sugerida} "
+            f"para cubrir {ejecucion.dias_entrega + ejecucion.dias_revision} días."
+        )
@@ -0,0 +1,616 @@
+# compras/services.py
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from statistics import NormalDist
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, Count, F, Min, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from almacen.models import Almacen, MovimientoInventario, Producto, Stock
+from caja.models import Caja, MovimientoCaja
+from caja.proyeccion import ESTADOS_CUENTA_PAGAR_ABIERTA, invalidar_proyeccion_flujo
+from caja.services import registrar_movimientos_caja
+from config.dependencias import cargar_numpy
+from .models import (
+    CuentaPorPagar, DetalleOrdenCompra, EjecucionReposicion, LotePagoProveedores, OrdenCompra,
+    PagoProveedor, PrecioProveedor, Proveedor, RemesaPagoProveedor, SugerenciaReposicion
+)
+
+# Parámetros por defecto del cálculo de reposición
+DIAS_HISTORIA_REPOSICION = 90
+DIAS_ENTREGA_REPOSICION = 7
+DIAS_REVISION_REPOSICION = 7
+NIVEL_SERVICIO_REPOSICION = Decimal('0.95')
+
+# Días más recientes que forman el promedio móvil de la demanda
+VENTANA_PROMEDIO_MOVIL = 28
+
+# Pares producto/almacén por lote: limita la memoria de la matriz de demanda
+TAMANO_LOTE_REPOSICION = 20000
+
+# Días considerados para el mejor precio reciente de un producto
+DIAS_MEJOR_PRECIO = 90
+
+# Pagos por sentencia INSERT en los lotes de pago a proveedores
+TAMANO_LOTE_PAGOS = 500
+
+
+def _salidas_diarias(desde, hasta, producto_ids=None, almacen_id=None):
+    """
+    Ventas diarias por producto y almacén, agrupadas en la base de datos y
+    ordenadas por par. Los traslados no son demanda y se excluyen.
+    """
+    zona = timezone.get_current_timezone()
+    salidas = MovimientoInventario.objects.filter(
+        tipo='SALIDA',
+        traslado__isnull=True,
+        fecha__gte=datetime.combine(desde, time.min, tzinfo=zona),
+        fecha__lt=datetime.combine(hasta, time.min, tzinfo=zona)
+    )
+    if producto_ids is not None:
+        salidas = salidas.filter(producto_id__in=producto_ids)
+    if almacen_id:
+        salidas = salidas.filter(almacen_id=almacen_id)
+    return salidas.annotate(dia=TruncDate('fecha')).values(
+        'producto_id', 'almacen_id', 'dia'
+    ).annotate(total=Sum('cantidad')).order_by('producto_id', 'almacen_id').values_list(
+        'producto_id', 'almacen_id', 'dia', 'total'
+    )
+
+
+def _lotes_demanda(filas, tamano_lote):
+    """
+    Agrupa las filas (producto, almacén, día, total) en lotes de hasta
+    tamano_lote pares, sin partir la historia de un par entre dos lotes.
+    """
+    pares, ventas, actual = [], [], None
+    for producto_id, almacen_id, dia, total in filas:
+        if (producto_id, almacen_id) != actual:
+            if len(pares) >= tamano_lote:
+                yield pares, ventas
+                pares, ventas = [], []
+            actual = (producto_id, almacen_id)
+            pares.append(actual)
+        ventas.append((len(pares) - 1, dia, total))
+    if pares:
+        yield pares, ventas
+
+
+def _datos_productos(producto_ids):
+    """Stock mínimo, último proveedor y último precio de compra por producto"""
+    ultima_compra = DetalleOrdenCompra.objects.filter(
+        producto_id=OuterRef('pk')
+    ).exclude(orden__estado='CANCELADA').order_by('-orden__fecha', '-id')
+    return {
+        p['id']: p
+        for p in Producto.objects.filter(pk__in=producto_ids).annotate(
+            ultimo_proveedor=Subquery(ultima_compra.values('orden__proveedor_id')[:1]),
+            ultimo_precio=Subquery(ultima_compra.values('precio_unitario')[:1])
+        ).values('id', 'stock_minimo', 'precio_compra', 'ultimo_proveedor', 'ultimo_precio')
+    }
+
+
+def _en_transito(producto_ids, almacen_principal_id):
+    """
+    Cantidades pedidas en órdenes abiertas, por producto y almacén: todo lo
+    de los borradores y lo pendiente de entrega de las aprobadas. Las
+    órdenes generadas por la reposición llevan el almacén en sus
+    sugerencias; las cargadas a mano se imputan al almacén principal.
+    """
+    detalles = list(DetalleOrdenCompra.objects.filter(
+        Q(orden__estado='BORRADOR') | Q(cantidad_pendiente__gt=0),
+        producto_id__in=producto_ids
+    ).annotate(
+        por_llegar=Case(
+            When(orden__estado='BORRADOR', then=F('cantidad')),
+            default=F('cantidad_pendiente')
+        )
+    ).values_list('orden_id', 'producto_id', 'por_llegar'))
+    destinos = dict(SugerenciaReposicion.objects.filter(
+        orden_id__in={orden_id for orden_id, _, _ in detalles}
+    ).values_list('orden_id', 'almacen_id'))
+
+    transito = defaultdict(int)
+    for orden_id, producto_id, cantidad in detalles:
+        transito[(producto_id, destinos.get(orden_id, almacen_principal_id))] += cantidad
+    return transito
+
+
+def _pronosticar(np, demanda, dias_semana, disponibles, minimos, ejecucion):
+    """
+    Calcula, para todos los pares del lote a la vez, la demanda esperada,
+    el stock de seguridad, el punto de reorden y la cantidad a comprar.
+
+    Args:
+        np: Módulo numpy
+        demanda: Matriz (pares x días) de ventas diarias
+        dias_semana: Día de la semana (0=lunes) de cada columna
+        disponibles: Stock + en tránsito de cada par
+        minimos: Stock mínimo configurado de cada par
+        ejecucion: EjecucionReposicion con los parámetros
+
+    Returns:
+        dict de arrays: nivel, factor, desviacion, seguridad, punto_reorden, sugerida
+    """
+    pares, historia = demanda.shape
+    entrega = ejecucion.dias_entrega
+    cobertura = entrega + ejecucion.dias_revision
+
+    # Promedio móvil de los últimos días como nivel de demanda
+    nivel = demanda[:, -min(VENTANA_PROMEDIO_MOVIL, historia):].mean(axis=1)
+    media = demanda.mean(axis=1)
+    desviacion = demanda.std(axis=1, ddof=1) if historia > 1 else np.zeros(pares)
+
+    # Estacionalidad semanal: venta de cada día de la semana sobre la media
+    factores = np.ones((pares, 7))
+    if historia >= 14:
+        for dia in range(7):
+            factores[:, dia] = demanda[:, dias_semana == dia].mean(axis=1)
+        factores = np.divide(
+            factores, media[:, None], out=np.ones_like(factores), where=media[:, None] > 0
+        )
+    proximos = (dias_semana[-1] + 1 + np.arange(max(cobertura, 1))) % 7
+    factor_entrega = factores[:, proximos[:max(entrega, 1)]].mean(axis=1)
+    factor_cobertura = factores[:, proximos].mean(axis=1)
+
+    z = NormalDist().inv_cdf(float(ejecucion.nivel_servicio))
+    seguridad = np.ceil(np.maximum(z, 0) * desviacion * np.sqrt(entrega))
+    punto_reorden = np.maximum(np.ceil(nivel * factor_entrega * entrega + seguridad), minimos)
+    objetivo = np.maximum(nivel * factor_cobertura * cobertura + seguridad, punto_reorden)
+    sugerida = np.where(
+        disponibles <= punto_reorden, np.maximum(np.ceil(objetivo - disponibles), 0), 0
+    )
+    return {
+        'nivel': nivel,
+        'factor': factor_cobertura,
+        'desviacion': desviacion,
+        'seguridad': seguridad,
+        'punto_reorden': punto_reorden,
+        'sugerida': sugerida,
+    }
+
+
+def _sugerencias_lote(np, ejecucion, pares, ventas, desde, dias_semana, almacen_principal_id,
+                      solo_sugeridas=True):
+    """Arma la matriz de demanda de un lote y devuelve sus SugerenciaReposicion sin guardar"""
+    producto_ids = {producto_id for producto_id, _ in pares}
+    productos = _datos_productos(producto_ids)
+    stocks = {
+        (producto_id, almacen_id): cantidad
+        for producto_id, almacen_id, cantidad in Stock.objects.filter(
+            producto_id__in=producto_ids
+        ).values_list('producto_id', 'almacen_id', 'cantidad')
+    }
+    transito = _en_transito(producto_ids, almacen_principal_id)
+
+    demanda = np.zeros((len(pares), len(dias_semana)))
+    if ventas:
+        filas, dias, totales = zip(*ventas)
+        demanda[np.array(filas), np.array([(dia - desde).days for dia in dias])] = totales
+    stock = np.array([stocks.get(par, 0) for par in pares], dtype=float)
+    en_transito = np.array([transito.get(par, 0) for par in pares], dtype=float)
+    minimos = np.array([productos[producto_id]['stock_minimo'] for producto_id, _ in pares], dtype=float)
+
+    resultado = _pronosticar(np, demanda, dias_semana, stock + en_transito, minimos, ejecucion)
+
+    indices = np.flatnonzero(resultado['sugerida'] > 0) if solo_sugeridas else range(len(pares))
+    sugerencias = []
+    for i in indices:
+        producto_id, almacen_id = pares[i]
+        datos = productos[producto_id]
+        sugerencias.append(SugerenciaReposicion(
+            ejecucion=ejecucion,
+            producto_id=producto_id,
+            almacen_id=almacen_id,
+            proveedor_id=datos['ultimo_proveedor'],
+            demanda_diaria=Decimal(f"{resultado['nivel'][i]:.4f}"),
+            factor_estacional=Decimal(f"{resultado['factor'][i]:.3f}"),
+            desviacion=Decimal(f"{resultado['desviacion'][i]:.4f}"),
+            stock_actual=int(stock[i]),
+            en_transito=int(en_transito[i]),
+            stock_seguridad=int(resultado['seguridad'][i]),
+            punto_reorden=int(resultado['punto_reorden'][i]),
+            cantidad_sugerida=int(resultado['sugerida'][i]),
+            precio_unitario=datos['ultimo_precio'] or datos['precio_compra'] or 0
+        ))
+    return sugerencias
+
+
+def _validar_parametros(dias_historia, dias_entrega, dias_revision, nivel_servicio):
+    if dias_historia < 7:
+        raise ValidationError('Se necesitan al menos 7 días de historia')
+    if dias_entrega < 0 or dias_revision < 0:
+        raise ValidationError('Los días de entrega y de revisión no pueden ser negativos')
+    if not Decimal('0.5') <= Decimal(nivel_servicio) < 1:
+        raise ValidationError('El nivel de servicio debe estar entre 0.5 y 1 (por ejemplo 0.95)')
+
+
+def _dias_semana(np, desde, dias_historia):
+    return np.array([(desde + timedelta(days=i)).weekday() for i in range(dias_historia)])
+
+
+def calcular_reposicion(usuario=None, dias_historia=DIAS_HISTORIA_REPOSICION,
+                        dias_entrega=DIAS_ENTREGA_REPOSICION, dias_revision=DIAS_REVISION_REPOSICION,
+                        nivel_servicio=NIVEL_SERVICIO_REPOSICION, tamano_lote=TAMANO_LOTE_REPOSICION):
+    """
+    Calcula las sugerencias de compra de todos los productos con ventas.
+
+    Lee las salidas agregadas por día en una sola consulta en streaming y
+    procesa los pares producto/almacén por lotes: en cada lote arma una
+    matriz de demanda y calcula con numpy el promedio móvil, la
+    estacionalidad semanal, el stock de seguridad y el punto de reorden de
+    todos los pares a la vez. Solo se guardan los pares que deben reponerse.
+
+    Args:
+        usuario: PerfilUsuario que lanza el cálculo (None si es automático)
+        dias_historia: Días de salidas a analizar
+        dias_entrega: Tiempo de entrega del proveedor en días
+        dias_revision: Días hasta la próxima corrida (período a cubrir)
+        nivel_servicio: Probabilidad de no quebrar stock durante la entrega
+        tamano_lote: Pares producto/almacén procesados por lote
+
+    Returns:
+        EjecucionReposicion completada
+    """
+    np = cargar_numpy('calcular la reposición')
+    _validar_parametros(dias_historia, dias_entrega, dias_revision, nivel_servicio)
+
+    inicio = timezone.now()
+    ejecucion = EjecucionReposicion.objects.create(
+        usuario=usuario,
+        dias_historia=dias_historia,
+        dias_entrega=dias_entrega,
+        dias_revision=dias_revision,
+        nivel_servicio=nivel_servicio
+    )
+    hasta = timezone.localdate()
+    desde = hasta - timedelta(days=dias_historia)
+    dias_semana = _dias_semana(np, desde, dias_historia)
+    almacen_principal_id = Almacen.objects.filter(es_principal=True).values_list('id', flat=True).first()
+
+    try:
+        filas = _salidas_diarias(desde, hasta).iterator(chunk_size=10000)
+        for pares, ventas in _lotes_demanda(filas, tamano_lote):
+            sugerencias = _sugerencias_lote(
+                np, ejecucion, pares, ventas, desde, dias_semana, almacen_principal_id
+            )
+            SugerenciaReposicion.objects.bulk_create(sugerencias, batch_size=1000)
+            ejecucion.pares_analizados += len(pares)
+            ejecucion.cantidad_sugerencias += len(sugerencias)
+    except Exception as e:
+        ejecucion.estado = 'ERROR'
+        ejecucion.error = str(e)
+        ejecucion.duracion = timezone.now() - inicio
+        ejecucion.save()
+        raise
+
+    ejecucion.estado = 'COMPLETADA'
+    ejecucion.duracion = timezone.now() - inicio
+    ejecucion.save()
+    return ejecucion
+
+
+def explicar_reposicion(producto_id, almacen_id, dias_historia=DIAS_HISTORIA_REPOSICION,
+                        dias_entrega=DIAS_ENTREGA_REPOSICION, dias_revision=DIAS_REVISION_REPOSICION,
+                        nivel_servicio=NIVEL_SERVICIO_REPOSICION):
+    """
+    Calcula en el momento la reposición de un solo producto y almacén con el
+    mismo modelo que la corrida nocturna, aunque no requiera compra.
+
+    Returns:
+        SugerenciaReposicion sin guardar (ver su propiedad explicacion)
+    """
+    np = cargar_numpy('calcular la reposición')
+    _validar_parametros(dias_historia, dias_entrega, dias_revision, nivel_servicio)
+    ejecucion = EjecucionReposicion(
+        dias_historia=dias_historia,
+        dias_entrega=dias_entrega,
+        dias_revision=dias_revision,
+        nivel_servicio=Decimal(nivel_servicio)
+    )
+    hasta = timezone.localdate()
+    desde = hasta - timedelta(days=dias_historia)
+    ventas = [
+        (0, dia, total)
+        for _, _, dia, total in _salidas_diarias(desde, hasta, [producto_id], almacen_id)
+    ]
+    almacen_principal_id = Almacen.objects.filter(es_principal=True).values_list('id', flat=True).first()
+    return _sugerencias_lote(
+        np, ejecucion, [(producto_id, almacen_id)], ventas, desde,
+        _dias_semana(np, desde, dias_historia), almacen_principal_id, solo_sugeridas=False
+    )[0]
+
+
+@transaction.atomic
+def generar_ordenes_reposicion(ejecucion_id, usuario):
+    """
+    Genera órdenes de compra en borrador con las sugerencias de una corrida,
+    una por proveedor y almacén de destino. Las sugerencias sin proveedor
+    conocido (productos nunca comprados) quedan sin orden.
+
+    Órdenes, detalles y vínculos se insertan en bloque.
+
+    Args:
+        ejecucion_id: ID de la EjecucionReposicion completada
+        usuario: PerfilUsuario que queda como creador de las órdenes
+
+    Returns:
+        Lista de OrdenCompra creadas
+    """
+    ejecucion = EjecucionReposicion.objects.select_for_update().get(pk=ejecucion_id)
+    if ejecucion.estado != 'COMPLETADA':
+        raise ValidationError('Solo se pueden generar órdenes de una reposición completada')
+
+    sugerencias = list(ejecucion.sugerencias.filter(
+        orden__isnull=True, proveedor__isnull=False, cantidad_sugerida__gt=0
+    ).select_related('almacen').order_by('proveedor_id', 'almacen_id', 'producto_id'))
+    grupos = defaultdict(list)
+    for sugerencia in sugerencias:
+        grupos[(sugerencia.proveedor_id, sugerencia.almacen_id)].append(sugerencia)
+
+    fecha_entrega = timezone.localdate() + timedelta(days=ejecucion.dias_entrega)
+    ordenes = []
+    for numero, ((proveedor_id, _), items) in enumerate(grupos.items(), start=ejecucion.ordenes_generadas + 1):
+        total = sum(s.cantidad_sugerida * s.precio_unitario for s in items)
+        ordenes.append(OrdenCompra(
+            numero=f"OC-R{ejecucion.id}-{numero:04d}",
+            proveedor_id=proveedor_id,
+            fecha_entrega=fecha_entrega,
+            estado='BORRADOR',
+            subtotal=total,
+            total=total,
+            creado_por=usuario,
+            notas=f"Reposición sugerida #{ejecucion.id} para {items[0].almacen}"
+        ))
+    OrdenCompra.objects.bulk_create(ordenes)
+
+    detalles = []
+    for orden, items in zip(ordenes, grupos.values()):
+        for sugerencia in items:
+            sugerencia.orden = orden
+            detalles.append(DetalleOrdenCompra(
+                orden=orden,
+                producto_id=sugerencia.producto_id,
+                cantidad=sugerencia.cantidad_sugerida,
+                precio_unitario=sugerencia.precio_unitario,
+                subtotal=sugerencia.cantidad_sugerida * sugerencia.precio_unitario
+            ))
+    DetalleOrdenCompra.objects.bulk_create(detalles, batch_size=1000)
+    SugerenciaReposicion.objects.bulk_update(sugerencias, ['orden'], batch_size=1000)
+
+    ejecucion.ordenes_generadas += len(ordenes)
+    ejecucion.save(update_fields=['ordenes_generadas'])
+    return ordenes
+
+
+def precios_referencia(producto_ids, proveedor_id=None, dias=DIAS_MEJOR_PRECIO):
+    """
+    Precios de referencia para cargar una orden de compra: el último precio
+    del proveedor y el mejor precio de los últimos días entre todos los
+    proveedores.
+
+    Cada valor es una subconsulta correlacionada que se resuelve con un
+    recorrido de índice de PrecioProveedor por producto, sin leer los
+    detalles de órdenes anteriores.
+
+    Args:
+        producto_ids: Productos a consultar
+        proveedor_id: Proveedor de la orden (opcional)
+        dias: Antigüedad máxima del mejor precio
+
+    Returns:
+        dict {producto_id: {'precio_compra', 'ultimo', 'mejor'}} donde
+        ultimo y mejor son dicts con precio y fecha (mejor también con el
+        proveedor) o None si no hay historial
+    """
+    desde = timezone.localdate() - timedelta(days=dias)
+    historial = PrecioProveedor.objects.filter(producto_id=OuterRef('pk'))
+    mejor = historial.filter(fecha__gte=desde).order_by('precio', '-fecha', '-id')
+    anotaciones = {
+        'mejor_precio': Subquery(mejor.values('precio')[:1]),
+        'mejor_fecha': Subquery(mejor.values('fecha')[:1]),
+        'mejor_proveedor': Subquery(mejor.values('proveedor_id')[:1]),
+    }
+    if proveedor_id:
+        ultimo = historial.filter(proveedor_id=proveedor_id).order_by('-fecha', '-id')
+        anotaciones['ultimo_precio'] = Subquery(ultimo.values('precio')[:1])
+        anotaciones['ultimo_fecha'] = Subquery(ultimo.values('fecha')[:1])
+
+    filas = list(Producto.objects.filter(pk__in=producto_ids).annotate(**anotaciones).values(
+        'id', 'precio_compra', *anotaciones
+    ))
+    proveedores = dict(Proveedor.objects.filter(
+        pk__in={fila['mejor_proveedor'] for fila in filas if fila['mejor_proveedor']}
+    ).values_list('id', 'razon_social'))
+
+    precios = {}
+    for fila in filas:
+        precios[fila['id']] = {
+            'precio_compra': fila['precio_compra'],
+            'ultimo': {
+                'precio': fila['ultimo_precio'],
+                'fecha': fila['ultimo_fecha'],
+            } if fila.get('ultimo_precio') is not None else None,
+            'mejor': {
+                'precio': fila['mejor_precio'],
+                'fecha': fila['mejor_fecha'],
+                'proveedor_id': fila['mejor_proveedor'],
+                'proveedor': proveedores.get(fila['mejor_proveedor'], ''),
+            } if fila['mejor_precio'] is not None else None,
+        }
+    return precios
+
+
+def cuentas_para_pago(vencimiento_hasta, proveedor_ids=None):
+    """
+    Cuentas por pagar abiertas que vencen hasta la fecha indicada (las ya
+    vencidas incluidas), ordenadas por proveedor y vencimiento.
+
+    Args:
+        vencimiento_hasta: Último vencimiento a incluir
+        proveedor_ids: Limita la selección a estos proveedores
+
+    Returns:
+        Queryset de CuentaPorPagar
+    """
+    cuentas = CuentaPorPagar.objects.filter(
+        estado__in=ESTADOS_CUENTA_PAGAR_ABIERTA,
+        saldo_pendiente__gt=0,
+        fecha_vencimiento__lte=vencimiento_hasta
+    )
+    if proveedor_ids:
+        cuentas = cuentas.filter(orden_compra__proveedor_id__in=proveedor_ids)
+    return cuentas.select_related('orden_compra__proveedor').order_by(
+        'orden_compra__proveedor__razon_social', 'fecha_vencimiento', 'id'
+    )
+
+
+def resumen_pagos_por_proveedor(cuentas):
+    """
+    Totales a pagar por proveedor calculados en la base con una consulta
+    agrupada, más el total general.
+
+    Args:
+        cuentas: Queryset de CuentaPorPagar (normalmente de cuentas_para_pago)
+
+    Returns:
+        Tupla (lista de dicts por proveedor, dict con el total general)
+    """
+    hoy = timezone.localdate()
+    vencido = Q(fecha_vencimiento__lt=hoy)
+    agregados = {
+        'total': Sum('saldo_pendiente'),
+        'vencido': Sum('saldo_pendiente', filter=vencido),
+        'cantidad': Count('id'),
+        'primer_vencimiento': Min('fecha_vencimiento'),
+    }
+    proveedores = list(cuentas.values(
+        proveedor_id=F('orden_compra__proveedor_id'),
+        proveedor=F('orden_compra__proveedor__razon_social')
+    ).annotate(**agregados).order_by('proveedor'))
+    total = cuentas.aggregate(**agregados)
+    total['proveedores'] = len(proveedores)
+    return proveedores, total
+
+
+@transaction.atomic
+def ejecutar_lote_pagos(cuenta_ids, usuario, fecha_pago, forma_pago, vencimiento_hasta, caja=None, notas=''):
+    """
+    Cancela en una operación el saldo de las cuentas seleccionadas: una
+    remesa y un movimiento de caja por proveedor, los pagos con
+    bulk_create y un UPDATE para las cuentas y otro para las órdenes.
+
+    Las cuentas se bloquean antes de pagarlas; si alguna ya no está
+    pendiente (la pagó otro usuario) no se paga ninguna.
+
+    Args:
+        cuenta_ids: CuentaPorPagar a pagar
+        usuario: PerfilUsuario que registra el lote
+        fecha_pago: Fecha de los pagos
+        forma_pago: Una de PagoProveedor.FORMA_PAGO_CHOICES
+        vencimiento_hasta: Vencimiento máximo usado en la selección
+        caja: Caja abierta de la que sale el dinero (obligatoria en efectivo)
+        notas: Observaciones del lote
+
+    Returns:
+        LotePagoProveedores creado
+    """
+    cuenta_ids = sorted(set(cuenta_ids))
+    if not cuenta_ids:
+        raise ValidationError('Seleccione al menos una cuenta a pagar')
+    if forma_pago not in dict(PagoProveedor.FORMA_PAGO_CHOICES):
+        raise ValidationError(f'Forma de pago inválida: {forma_pago}')
+    if forma_pago == 'EFECTIVO' and not caja:
+        raise ValidationError('Los pagos en efectivo requieren una caja')
+    if caja and not Caja.objects.filter(pk=caja.pk, estado='ABIERTA').exists():
+        raise ValidationError('La caja seleccionada no está abierta')
+
+    cuentas = list(
+        CuentaPorPagar.objects.select_for_update(of=('self',)).filter(
+            pk__in=cuenta_ids,
+            estado__in=ESTADOS_CUENTA_PAGAR_ABIERTA,
+            saldo_pendiente__gt=0
+        ).select_related('orden_compra').order_by('id')
+    )
+    if len(cuentas) != len(cuenta_ids):
+        raise ValidationError(
+            f'{len(cuenta_ids) - len(cuentas)} de las cuentas seleccionadas ya no están pendientes. '
+            'Actualice la selección.'
+        )
+
+    por_proveedor = defaultdict(list)
+    for cuenta in cuentas:
+        por_proveedor[cuenta.orden_compra.proveedor_id].append(cuenta)
+    nombres = dict(Proveedor.objects.filter(pk__in=por_proveedor).values_list('id', 'razon_social'))
+
+    lote = LotePagoProveedores.objects.create(
+        usuario=usuario,
+        fecha_pago=fecha_pago,
+        vencimiento_hasta=vencimiento_hasta,
+        forma_pago=forma_pago,
+        caja=caja,
+        total=sum(cuenta.saldo_pendiente for cuenta in cuentas),
+        cantidad_pagos=len(cuentas),
+        notas=notas
+    )
+
+    remesas = []
+    for n, proveedor_id in enumerate(sorted(por_proveedor, key=lambda p: (nombres[p], p)), start=1):
+        remesas.append(RemesaPagoProveedor(
+            lote=lote,
+            proveedor_id=proveedor_id,
+            numero=f"RP-{lote.pk:06d}-{n:03d}",
+            total=sum(cuenta.saldo_pendiente for cuenta in por_proveedor[proveedor_id]),
+            cantidad_pagos=len(por_proveedor[proveedor_id])
+        ))
+
+    if caja:
+        # Un solo egreso por proveedor, con el número de remesa como comprobante
+        movimientos = registrar_movimientos_caja([
+            MovimientoCaja(
+                caja=caja,
+                tipo='EGRESO',
+                monto=remesa.total,
+                responsable=usuario,
+                descripcion=f"Pago a {nombres[remesa.proveedor_id]} ({remesa.cantidad_pagos} cuentas)",
+                comprobante=remesa.numero
+            )
+            for remesa in remesas
+        ])
+        for remesa, movimiento in zip(remesas, movimientos):
+            remesa.movimiento_caja = movimiento
+    RemesaPagoProveedor.objects.bulk_create(remesas)
+
+    pagos = []
+    for remesa in remesas:
+        for cuenta in por_proveedor[remesa.proveedor_id]:
+            pagos.append(PagoProveedor(
+                cuenta=cuenta,
+                monto=cuenta.saldo_pendiente,
+                forma_pago=forma_pago,
+                fecha_pago=fecha_pago,
+                comprobante=f"{remesa.numero}/{cuenta.orden_compra.numero}",
+                notas=notas,
+                caja=caja,
+                movimiento_caja=remesa.movimiento_caja,
+                remesa=remesa
+            ))
+    # bulk_create no pasa por PagoProveedor.save: los saldos se cancelan abajo
+    PagoProveedor.objects.bulk_create(pagos, batch_size=TAMANO_LOTE_PAGOS)
+
+    CuentaPorPagar.objects.filter(pk__in=cuenta_ids).update(
+        saldo_pendiente=0,
+        estado='PAGADA',
+        fecha_pago=fecha_pago
+    )
+    # Una orden con entregas pendientes sigue abierta
+    OrdenCompra.objects.filter(
+        pk__in={cuenta.orden_compra_id for cuenta in cuentas},
+        estado='RECIBIDA'
+    ).update(estado='PAGADA')
+    invalidar_proyeccion_flujo()
+    return lote
@@ -19,6 +19,9 @@ urlpatterns = [
     path('ordenes/<int:orden_id>/editar/', views.editar_orden_compra, name='editar_orden'),
     path('ordenes/<int:orden_id>/aprobar/', views.aprobar_orden_compra, name='aprobar_orden'),
     path('ordenes/<int:orden_id>/recibir/', views.recibir_orden_compra, name='recibir_orden'),
+    path('ordenes/pendientes/', views.pendientes_recepcion, name='pendientes_recepcion'),
+    path('reposicion/', views.reposicion, name='reposicion'),
+    path('api/precios-proveedor/', views.api_precios_proveedor, name='api_precios_proveedor'),
 
 
     # Cuentas por Pagar
@@ -26,6 +29,9 @@ urlpatterns = [
     path('cuentas-por-pagar/<int:pk>/', views.detalle_cuenta_por_pagar, name='detalle_cuenta_por_pagar'),
     path('cuentas-por-pagar/<int:pk>/pagar/', views.registrar_pago_proveedor, name='registrar_pago_proveedor'),
     path('pagos-proveedor/<int:pk>/eliminar/', views.eliminar_pago_proveedor, name='eliminar_pago_proveedor'),
+    path('cuentas-por-pagar/lote/', views.lote_pagos_proveedores, name='lote_pagos_proveedores'),
+    path('cuentas-por-pagar/lote/<int:pk>/', views.detalle_lote_pagos, name='detalle_lote_pagos'),
+    path('remesas/<int:pk>/', views.remesa_pago_proveedor, name='remesa_pago_proveedor'),
     
 
 ]
\ No newline at end of file
@@ -193,8 +193,16 @@ def aprobar_orden_compra(request, orden_id):
 def recibir_orden_compra(request, orden_id):
     orden = get_object_or_404(OrdenCompra, pk=orden_id)
     
+    detalles = list(orden.detalles.select_related('producto').order_by('id'))
+
     if request.method == 'POST':
         form = RecibirOrdenForm(request.POST, user=request.user)
+        # Cantidad que llegó en esta entrega por línea (cantidad_<detalle_id>)
+        cantidades = {}
+        for detalle in detalles:
+            valor = request.POST.get(f'cantidad_{detalle.id}', '').strip()
+            detalle.cantidad_entrega = valor
+            cantidades[detalle.id] = int(valor) if valor.lstrip('-').isdigit() else 0
         if form.is_valid():
             try:
                 with transaction.atomic():
@@ -212,26 +220,38 @@ def recibir_orden_compra(request, orden_id):
                         numero_documento=form.cleaned_data['numero_documento'],
                         timbrado=form.cleaned_data['timbrado'],
                         condicion=form.cleaned_data['condicion'],
-                        plazo_dias=plazo_dias  # Aseguramos que es un entero
+                        plazo_dias=plazo_dias,  # Aseguramos que es un entero
+                        cantidades=cantidades
                     )
-                    messages.success(request, 'Orden recibida y stock actualizado correctamente')
+                    if orden.estado == 'PARCIAL':
+                        messages.success(request, 'Entrega registrada; la orden sigue con mercadería pendiente')
+                    else:
+                        messages.success(request, 'Orden recibida y stock actualizado correctamente')
                     return redirect('compras:detalle_orden', orden_id=orden.id)
             except ValidationError as e:
-                messages.error(request, str(e))
+                messages.error(request, ' '.join(e.messages))
             except Exception as e:
                 messages.error(request, f'Error al recibir la orden: {str(e)}')
     else:
         form = RecibirOrdenForm(user=request.user)
+        for detalle in detalles:
+            detalle.cantidad_entrega = detalle.cantidad_pendiente
     
     return render(request, 'compras/recibir_orden.html', {
         'orden': orden,
+        'detalles': detalles,
         'form': form,
         'titulo': f'Recibir Orden: {orden.numero}'
     })
 
 @login_required
 def detalle_orden_compra(request, orden_id):
-    orden = get_object_or_404(OrdenCompra, pk=orden_id)
+    orden = get_object_or_404(
+        OrdenCompra.objects.prefetch_related(
+            'recepciones__almacen', 'recepciones__detalles__detalle_orden__producto'
+        ),
+        pk=orden_id
+    )
     return render(request, 'compras/detalle_orden.html', {
         'orden': orden,
         'titulo': f'Detalle de Orden: {orden.numero}'
@@ -367,8 +387,9 @@ def eliminar_pago_proveedor(request, pk):
                 if cuenta.estado == 'PAGADA':
                     cuenta.estado = 'VENCIDA' if cuenta.esta_vencida else 'PENDIENTE'
                     cuenta.fecha_pago = None
-                    cuenta.orden_compra.estado = 'RECIBIDA'
-                    cuenta.orden_compra.save()
+                    if cuenta.orden_compra.estado == 'PAGADA':
+                        cuenta.orden_compra.estado = 'RECIBIDA'
+                        cuenta.orden_compra.save()
                 
                 cuenta.save()
                 
@@ -384,4 +405,244 @@ def eliminar_pago_proveedor(request, pk):
     return render(request, 'compras/cuentas_por_pagar/confirmar_eliminar_pago.html', {
         'pago': pago,
         'cuenta': pago.cuenta  # Pasamos la cuenta al template por si es necesario
-    })
\ No newline at end of file
+    })
+
+# Reposición de inventario
+from .models import EjecucionReposicion
+from .services import explicar_reposicion, generar_ordenes_reposicion
+from almacen.models import ClasificacionProducto, Producto
+from almacen.services import anotar_clasificacion
+from django.db.models import F
+
+# Sugerencias mostradas por página de reposición
+LIMITE_SUGERENCIAS_VISTA = 500
+
+
+@login_required
+def reposicion(request):
+    ejecucion_id = request.GET.get('ejecucion')
+    if ejecucion_id:
+        ejecucion = get_object_or_404(EjecucionReposicion, pk=ejecucion_id)
+    else:
+        ejecucion = EjecucionReposicion.objects.filter(estado='COMPLETADA').first()
+
+    if request.method == 'POST':
+        if not ejecucion:
+            messages.error(request, 'No hay una reposición calculada')
+            return redirect('compras:reposicion')
+        try:
+            ordenes = generar_ordenes_reposicion(ejecucion.id, request.user.perfil)
+            messages.success(request, f'{len(ordenes)} órdenes de compra generadas en borrador')
+        except ValidationError as e:
+            messages.error(request, ' '.join(e.messages))
+        return redirect(f"{reverse('compras:reposicion')}?ejecucion={ejecucion.id}")
+
+    sugerencias = []
+    clase_abc = request.GET.get('abc', '')
+    clase_xyz = request.GET.get('xyz', '')
+    orden = request.GET.get('orden', '')
+    if ejecucion:
+        sugerencias = anotar_clasificacion(ejecucion.sugerencias.select_related(
+            'ejecucion', 'producto', 'almacen', 'proveedor', 'orden'
+        ))
+        if clase_abc:
+            sugerencias = sugerencias.filter(clase_abc=clase_abc)
+        if clase_xyz:
+            sugerencias = sugerencias.filter(clase_xyz=clase_xyz)
+        if orden == 'clase':
+            sugerencias = sugerencias.order_by(
+                F('clase_abc').asc(nulls_last=True),
+                F('clase_xyz').asc(nulls_last=True),
+                'proveedor__razon_social', 'producto__nombre'
+            )
+        else:
+            sugerencias = sugerencias.order_by('proveedor__razon_social', 'almacen__nombre', 'producto__nombre')
+        sugerencias = sugerencias[:LIMITE_SUGERENCIAS_VISTA]
+
+    # Explicación en el momento de un producto puntual (aunque no necesite compra)
+    explicada = None
+    codigo = request.GET.get('codigo', '').strip()
+    almacen_id = request.GET.get('almacen')
+    if codigo and almacen_id:
+        producto = Producto.objects.filter(codigo=codigo).first()
+        if not producto:
+            messages.error(request, f'No existe un producto con código {codigo}')
+        else:
+            try:
+                explicada = explicar_reposicion(producto.id, int(almacen_id))
+            except (ValidationError, ValueError) as e:
+                messages.error(request, str(e))
+
+    return render(request, 'compras/reposicion.html', {
+        'ejecucion': ejecucion,
+        'ejecuciones': EjecucionReposicion.objects.all()[:10],
+        'sugerencias': sugerencias,
+        'limite': LIMITE_SUGERENCIAS_VISTA,
+        'almacenes': Almacen.objects.filter(activo=True).order_by('nombre'),
+        'explicada': explicada,
+        'clases_abc': ClasificacionProducto.CLASE_ABC_CHOICES,
+        'clases_xyz': ClasificacionProducto.CLASE_XYZ_CHOICES,
+        'clase_abc': clase_abc,
+        'clase_xyz': clase_xyz,
+        'orden': orden,
+        'codigo': codigo,
+        'almacen_id': almacen_id,
+        'titulo': 'Reposición de Inventario'
+    })
+
+
+
+# Líneas mostradas en la vista de mercadería por recibir
+LIMITE_PENDIENTES_VISTA = 500
+
+
+@login_required
+def pendientes_recepcion(request):
+    """
+    Mercadería aprobada que todavía no llegó. Lee solo las líneas con
+    cantidad pendiente (índice parcial detalle_oc_pendiente_idx), sin
+    recalcular lo recibido de cada orden.
+    """
+    proveedor_id = request.GET.get('proveedor', '')
+    buscar = request.GET.get('q', '').strip()
+
+    pendientes = DetalleOrdenCompra.objects.filter(cantidad_pendiente__gt=0)
+    if proveedor_id:
+        pendientes = pendientes.filter(orden__proveedor_id=proveedor_id)
+    if buscar:
+        pendientes = pendientes.filter(Q(producto__codigo=buscar) | Q(producto__nombre__icontains=buscar))
+    pendientes = pendientes.select_related('orden__proveedor', 'producto').order_by(
+        'orden__fecha_entrega', 'orden_id', 'id'
+    )[:LIMITE_PENDIENTES_VISTA + 1]
+    pendientes = list(pendientes)
+
+    return render(request, 'compras/pendientes_recepcion.html', {
+        'pendientes': pendientes[:LIMITE_PENDIENTES_VISTA],
+        'hay_mas': len(pendientes) > LIMITE_PENDIENTES_VISTA,
+        'limite': LIMITE_PENDIENTES_VISTA,
+        'proveedores': Proveedor.objects.filter(activo=True).order_by('razon_social'),
+        'proveedor_id': proveedor_id,
+        'buscar': buscar,
+        'hoy': timezone.localdate(),
+        'titulo': 'Mercadería por Recibir'
+    })
+
+
+from .services import DIAS_MEJOR_PRECIO, precios_referencia
+
+
+@login_required
+def api_precios_proveedor(request):
+    """
+    Último precio del proveedor y mejor precio reciente de los productos
+    de una orden en carga (?proveedor=ID&productos=1,2,3).
+    """
+    try:
+        producto_ids = [int(p) for p in request.GET.get('productos', '').split(',') if p.strip()]
+        proveedor_id = int(request.GET['proveedor']) if request.GET.get('proveedor') else None
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+
+    precios = precios_referencia(producto_ids[:200], proveedor_id)
+    return JsonResponse({
+        'dias': DIAS_MEJOR_PRECIO,
+        'precios': {str(producto_id): datos for producto_id, datos in precios.items()},
+    })
+
+
+# Pagos a proveedores por lote
+from datetime import date, timedelta
+from .forms import LotePagoProveedoresForm
+from .models import LotePagoProveedores, RemesaPagoProveedor
+from .services import cuentas_para_pago, ejecutar_lote_pagos, resumen_pagos_por_proveedor
+
+# Días hacia adelante que se proponen por defecto en la corrida de pagos
+DIAS_CORRIDA_PAGOS = 7
+# Cuentas listadas en la pantalla de selección
+LIMITE_CUENTAS_CORRIDA = 1000
+
+
+@login_required
+def lote_pagos_proveedores(request):
+    """
+    Corrida de pagos: lista las cuentas que vencen hasta una fecha con los
+    totales por proveedor y paga las seleccionadas en una operación.
+    """
+    try:
+        vencimiento_hasta = date.fromisoformat(request.GET.get('hasta', ''))
+    except ValueError:
+        vencimiento_hasta = timezone.localdate() + timedelta(days=DIAS_CORRIDA_PAGOS)
+    proveedor_ids = [int(p) for p in request.GET.getlist('proveedor') if p.isdigit()]
+    cuentas = cuentas_para_pago(vencimiento_hasta, proveedor_ids)
+
+    if request.method == 'POST':
+        form = LotePagoProveedoresForm(request.user, request.POST)
+        cuenta_ids = [int(c) for c in request.POST.getlist('cuentas') if c.isdigit()]
+        if form.is_valid():
+            try:
+                lote = ejecutar_lote_pagos(
+                    cuenta_ids,
+                    request.user.perfil,
+                    form.cleaned_data['fecha_pago'],
+                    form.cleaned_data['forma_pago'],
+                    vencimiento_hasta,
+                    caja=form.cleaned_data['caja'],
+                    notas=form.cleaned_data['notas']
+                )
+                messages.success(
+                    request,
+                    f'{lote.cantidad_pagos} pagos registrados en {lote.remesas.count()} remesas'
+                )
+                return redirect('compras:detalle_lote_pagos', pk=lote.pk)
+            except ValidationError as e:
+                messages.error(request, ' '.join(e.messages))
+    else:
+        form = LotePagoProveedoresForm(request.user)
+        cuenta_ids = None
+
+    proveedores, total = resumen_pagos_por_proveedor(cuentas)
+    cuentas = list(cuentas[:LIMITE_CUENTAS_CORRIDA + 1])
+
+    return render(request, 'compras/cuentas_por_pagar/lote_pagos.html', {
+        'form': form,
+        'cuentas': cuentas[:LIMITE_CUENTAS_CORRIDA],
+        'hay_mas': len(cuentas) > LIMITE_CUENTAS_CORRIDA,
+        'limite': LIMITE_CUENTAS_CORRIDA,
+        'seleccionadas': cuenta_ids,
+        'resumen': proveedores,
+        'total': total,
+        'vencimiento_hasta': vencimiento_hasta,
+        'proveedor_ids': proveedor_ids,
+        'proveedores': Proveedor.objects.filter(activo=True).order_by('razon_social'),
+        'lotes': LotePagoProveedores.objects.select_related('caja', 'usuario__usuario')[:10],
+        'hoy': timezone.localdate(),
+        'titulo': 'Pagos a Proveedores por Lote'
+    })
+
+
+@login_required
+def detalle_lote_pagos(request, pk):
+    lote = get_object_or_404(LotePagoProveedores.objects.select_related('caja', 'usuario__usuario'), pk=pk)
+    remesas = lote.remesas.select_related('proveedor', 'movimiento_caja')
+    return render(request, 'compras/cuentas_por_pagar/detalle_lote_pagos.html', {
+        'lote': lote,
+        'remesas': remesas,
+        'titulo': f'Lote de Pagos #{lote.pk}'
+    })
+
+
+@login_required
+def remesa_pago_proveedor(request, pk):
+    """Aviso de pago imprimible para enviar al proveedor"""
+    remesa = get_object_or_404(
+        RemesaPagoProveedor.objects.select_related('lote__usuario__empresa', 'proveedor', 'movimiento_caja'),
+        pk=pk
+    )
+    pagos = remesa.pagos.select_related('cuenta__orden_compra').order_by(
+        'cuenta__fecha_vencimiento', 'id'
+    )
+    return render(request, 'compras/cuentas_por_pagar/remesa_pago.html', {
+        'remesa': remesa,
+        'pagos': pagos,
+        'titulo': f'Remesa {remesa.numero}'
+    })
@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from decouple import config
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'psvent.settings')
+# Mismo módulo de settings que manage.py. La aplicación se sirve por ASGI
+# (procfile: gunicorn con workers de uvicorn) porque el flujo de eventos de
+# caja (SSE) mantiene conexiones abiertas que bajo WSGI ocuparían un worker
+# cada una
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', config('DJANGO_SETTINGS_MODULE'))
 
 application = get_asgi_application()
@@ -0,0 +1,20 @@
+# config/dependencias.py
+from django.core.exceptions import ValidationError
+
+
+def cargar_numpy(para):
+    """
+    Importa numpy, que solo necesitan los cálculos vectorizados.
+
+    Args:
+        para: Qué se intentaba hacer, para el mensaje de error
+            (p. ej. 'calcular la reposición')
+
+    Returns:
+        El módulo numpy
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ValidationError(f'Para {para} debe instalarse numpy')
+    return numpy
@@ -72,6 +72,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
@@ -106,11 +109,57 @@ LOGGING = {
 
 LOGIN_URL = 'login'
 
+# Caché compartida entre todos los workers: las invalidaciones (catálogo,
+# listas de materiales, proyección de caja) deben verse en todos los procesos.
+# En producción se espera Redis (REDIS_URL); sin él se usa una tabla de la
+# base de datos (manage.py createcachetable, ver build.sh), más lenta: cada
+# lectura es una consulta. development.py usa la caché local si no hay Redis.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_compartida',
+            # Por defecto son 300 entradas: un catálogo de miles de productos
+            # (dos claves por lista de materiales) viviría descartando claves
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+
+# Procesar los eventos de inventario (almacen.EventoInventario) al confirmar la
+# transacción. En False quedan para el worker: manage.py procesar_eventos_inventario --continuo
+ALMACEN_PROCESAR_EVENTOS_AL_CONFIRMAR = True
+
+# Costo promedio ponderado (almacen.CostoProducto): global por producto o
+# separado por almacén. Cambiarlo requiere recalcular los costos existentes.
+ALMACEN_COSTO_POR_ALMACEN = False
+
+# Reportes de caja pesados (caja.TrabajoReporte): en True los genera el worker
+# manage.py procesar_reportes --continuo; en False se generan dentro de la petición.
+CAJA_REPORTES_EN_SEGUNDO_PLANO = True
+# Carpeta privada de los archivos generados y horas que quedan disponibles
+CAJA_REPORTES_ROOT = BASE_DIR / 'reportes_generados'
+CAJA_REPORTES_EXPIRACION_HORAS = 24
+# Los PDF largos se renderizan en partes de esta cantidad de filas, cada una
+# en un proceso (None = uno por núcleo), y se unen con pypdf
+CAJA_REPORTES_FILAS_POR_PARTE = 5000
+CAJA_REPORTES_PROCESOS = None
+
 # Configuración común para todos los entornos
 SIFEN_CONFIG = {
     'API_TIMEOUT': 30,  # Tiempo máximo de espera en segundos
     'MAX_REINTENTOS': 3,  # Número máximo de reintentos
     'TIEMPO_ENTRE_REINTENTOS': 5,  # Segundos entre reintentos
+    'ESPERA_MAXIMA_REINTENTO': 300,  # Tope en segundos de la espera exponencial
+    'ENVIOS_SIMULTANEOS': 8,  # Documentos en vuelo por worker (enviar_pendientes_sifen)
+    'ENVIOS_POR_SEGUNDO': 10,  # Límite global entre workers, requiere Redis (entero, 0 = sin límite)
     'LOG_LEVEL': 'INFO',  # Nivel de logging
     
     # Plantillas para documentos
@@ -19,6 +19,16 @@ DATABASES = {
    }
 }
 
+# Sin Redis, caché en memoria: un solo proceso (runserver) no necesita
+# compartirla y no hace falta crear la tabla de caché
+if not REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+
 
 # Configuración específica para desarrollo
 USE_SIFEN_MOCK = os.getenv('USE_SIFEN_MOCK', 'True') == 'True'
@@ -14,6 +14,8 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from django.shortcuts import redirect
@@ -30,3 +32,6 @@ urlpatterns = [
     path('ventas/', include('ventas.urls')), #rutas de compras
     path('facturacion/', include('facturacion.urls')), #rutas de facturacion
 ]
+
+# Archivos subidos (imágenes de productos) en desarrollo
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,8 +1,9 @@
 # management/commands/enviar_pendientes_sifen.py
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from facturacion.models import DocumentoElectronico
-from facturacion.services import SifenService
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from facturacion.services.envio import enviar_pendientes
 
 class Command(BaseCommand):
     help = 'Envía documentos electrónicos pendientes al SET'
@@ -11,33 +12,68 @@ class Command(BaseCommand):
         parser.add_argument(
             '--max-intentos',
             type=int,
-            default=3,
+            default=settings.SIFEN_CONFIG.get('MAX_REINTENTOS', 3),
             help='Número máximo de intentos de envío'
         )
+        parser.add_argument(
+            '--simultaneos',
+            type=int,
+            default=None,
+            help='Envíos en paralelo (por defecto SIFEN_CONFIG["ENVIOS_SIMULTANEOS"])'
+        )
+        parser.add_argument(
+            '--por-segundo',
+            type=int,
+            default=None,
+            help='Límite de envíos por segundo (requiere Redis), 0 = sin límite (por defecto SIFEN_CONFIG["ENVIOS_POR_SEGUNDO"])'
+        )
+        parser.add_argument(
+            '--limite',
+            type=int,
+            default=None,
+            help='Cantidad máxima de documentos por vuelta'
+        )
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='Queda en ejecución como worker'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5,
+            help='Segundos de espera cuando no hay documentos (modo continuo)'
+        )
     
     def handle(self, *args, **options):
-        max_intentos = options['max_intentos']
-        pendientes = DocumentoElectronico.objects.filter(
-            estado__in=['VALIDADO', 'ERROR'],
-            intentos__lt=max_intentos
-        ).select_related('venta')
-        
-        self.stdout.write(f"Encontré {pendientes.count()} documentos pendientes")
-        
-        for doc in pendientes:
-            try:
-                self.stdout.write(f"Procesando venta {doc.venta.numero}...")
-                
-                if SifenService.enviar_al_set(doc):
-                    self.stdout.write(
-                        self.style.SUCCESS(f"Documento {doc.codigo_set} aceptado")
-                    )
-                else:
-                    self.stdout.write(
-                        self.style.WARNING(f"Error en venta {doc.venta.numero}: {doc.errores}")
-                    )
-            
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f"Error crítico: {str(e)}")
-                )
\ No newline at end of file
+        if options['por_segundo'] is not None and options['por_segundo'] < 0:
+            raise CommandError('--por-segundo debe ser 0 (sin límite) o un entero positivo')
+        verbosidad = options['verbosity']
+
+        def informar(documento, resultado):
+            if verbosidad < 2:
+                return
+            estilo = {'aceptado': self.style.SUCCESS, 'rechazado': self.style.WARNING}.get(resultado, self.style.ERROR)
+            self.stdout.write(estilo(f"Venta {documento['venta_numero']}: {resultado}"))
+
+        while True:
+            inicio = time.monotonic()
+            resultados = enviar_pendientes(
+                limite=options['limite'],
+                simultaneos=options['simultaneos'],
+                por_segundo=options['por_segundo'],
+                max_intentos=options['max_intentos'],
+                al_terminar=informar
+            )
+            total = sum(resultados.values())
+            if total:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{total} documentos enviados en {time.monotonic() - inicio:.1f} s: "
+                    f"{resultados['aceptado']} aceptados, {resultados['rechazado']} rechazados, "
+                    f"{resultados['error']} con error (se reintentan más tarde)"
+                ))
+
+            if not options['continuo']:
+                break
+            if not total:
+                time.sleep(options['intervalo'])
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 15:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0001_initial'),
+        ('ventas', '0013_detalleventa_costo_unitario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentoelectronico',
+            name='proximo_intento',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='documentoelectronico',
+            name='estado',
+            field=models.CharField(choices=[('NO_GENERADO', 'No generado'), ('BORRADOR', 'Borrador (XML generado)'), ('VALIDADO', 'Validado contra XSD'), ('ENVIADO', 'Enviado al SET'), ('ACEPTADO', 'Aceptado por SET'), ('RECHAZADO', 'Rechazado por SET'), ('ERROR', 'Error')], default='NO_GENERADO', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='documentoelectronico',
+            index=models.Index(fields=['estado', 'proximo_intento'], name='de_envio_pendiente_idx'),
+        ),
+    ]
@@ -12,6 +12,7 @@ class DocumentoElectronico(models.Model):
         ('VALIDADO', 'Validado contra XSD'),
         ('ENVIADO', 'Enviado al SET'),
         ('ACEPTADO', 'Aceptado por SET'),
+        ('RECHAZADO', 'Rechazado por SET'),
         ('ERROR', 'Error'),
     )
 
@@ -27,6 +28,8 @@ class DocumentoElectronico(models.Model):
     fecha_aceptacion = models.DateTimeField(null=True, blank=True)  # Añadido
     errores = models.TextField(null=True, blank=True)
     intentos = models.PositiveSmallIntegerField(default=0)  # Añadido para reintentos
+    # Los reintentos se espacian: no se reenvía antes de esta fecha
+    proximo_intento = models.DateTimeField(null=True, blank=True)
 
     kude_generado = models.BooleanField(default=False)
     kude_pdf = models.BinaryField(null=True, blank=True)
@@ -38,6 +41,7 @@ class DocumentoElectronico(models.Model):
         indexes = [
             models.Index(fields=['estado']),
             models.Index(fields=['codigo_set']),
+            models.Index(fields=['estado', 'proximo_intento'], name='de_envio_pendiente_idx'),
         ]
 
     def __str__(self):
@@ -0,0 +1,261 @@
+# services/envio.py
+"""
+Envío de documentos electrónicos al SET con concurrencia acotada.
+
+Los documentos se reservan con select_for_update(skip_locked=True), así
+varios workers pueden correr en paralelo sin enviar dos veces el mismo.
+Los hilos solo hacen la petición HTTP; la base de datos se actualiza desde
+el hilo principal. Cada documento con error se reintenta más tarde con
+espera exponencial y jitter, y todos los envíos respetan un límite de
+documentos por segundo.
+"""
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import DocumentoElectronico
+
+logger = logging.getLogger(__name__)
+
+# Un documento ENVIADO sin respuesta durante este tiempo (worker caído) se vuelve a tomar
+MINUTOS_ENVIO_ABANDONADO = 10
+# Documentos reservados por encima de los hilos, para que ninguno quede ocioso
+FACTOR_RESERVA = 2
+# Cachés cuyo incr es atómico (la de base de datos lee y luego escribe)
+CACHES_CON_INCR_ATOMICO = (RedisCache, BaseMemcachedCache, LocMemCache)
+
+_sesiones = threading.local()
+
+
+def _config(clave, defecto=None):
+    return settings.SIFEN_CONFIG.get(clave, defecto)
+
+
+def _sesion():
+    """Sesión HTTP por hilo: reutiliza la conexión TLS entre envíos"""
+    if not hasattr(_sesiones, 'sesion'):
+        _sesiones.sesion = requests.Session()
+    return _sesiones.sesion
+
+
+def enviar_xml_set(xml_firmado):
+    """
+    Envía un XML firmado al SET (o al simulador si USE_SIFEN_MOCK).
+    No toca la base de datos: se puede llamar desde cualquier hilo.
+
+    Returns:
+        dict con la respuesta del SET
+    """
+    if getattr(settings, 'USE_SIFEN_MOCK', False):
+        from .mock_services import MockSifenService
+        return MockSifenService.enviar_documento(xml_firmado)
+
+    respuesta = _sesion().post(
+        _config('ENDPOINT'),
+        data=xml_firmado,
+        headers={
+            'Authorization': f'Bearer {_config("API_KEY")}',
+            'Content-Type': 'application/xml'
+        },
+        timeout=_config('API_TIMEOUT', 30)
+    )
+    respuesta.raise_for_status()
+    return respuesta.json()
+
+
+class LimiteEnvios:
+    """
+    Límite de envíos por segundo en ventanas fijas contadas con cache.incr.
+    Requiere una caché con incremento atómico: con Redis (o Memcached) el
+    límite es global entre workers; con la caché local de desarrollo vale
+    por proceso. La tabla de caché (DatabaseCache) lee y escribe sin
+    bloquear y perdería envíos concurrentes, por eso se rechaza.
+    """
+
+    def __init__(self, por_segundo):
+        # Con un límite fraccionario (0.5) ningún envío cabría en la ventana
+        if por_segundo and (por_segundo < 0 or por_segundo != int(por_segundo)):
+            raise ValidationError('El límite de envíos por segundo debe ser un entero, 0 = sin límite')
+        if por_segundo and not isinstance(caches['default'], CACHES_CON_INCR_ATOMICO):
+            raise ImproperlyConfigured(
+                'El límite de envíos por segundo requiere Redis (REDIS_URL); '
+                'configure REDIS_URL o use ENVIOS_POR_SEGUNDO = 0'
+            )
+        self.por_segundo = int(por_segundo or 0)
+
+    def esperar(self):
+        if not self.por_segundo:
+            return
+        while True:
+            ahora = time.time()
+            clave = f'facturacion:envios_set:{int(ahora)}'
+            cache.add(clave, 0, 5)
+            try:
+                enviados = cache.incr(clave)
+            except ValueError:
+                # La clave expiró entre add e incr
+                continue
+            if enviados <= self.por_segundo:
+                return
+            time.sleep(1 - (ahora % 1) + random.uniform(0, 0.05))
+
+
+def espera_reintento(intentos):
+    """
+    Segundos hasta el próximo reintento: exponencial con tope y jitter
+    (la mitad fija, la otra mitad aleatoria) para no reenviar en bloque.
+    """
+    techo = min(
+        _config('ESPERA_MAXIMA_REINTENTO', 300),
+        _config('TIEMPO_ENTRE_REINTENTOS', 5) * 2 ** max(intentos - 1, 0)
+    )
+    return techo / 2 + random.uniform(0, techo / 2)
+
+
+def documentos_pendientes(max_intentos):
+    """Documentos listos para enviar ahora, incluidos los envíos abandonados"""
+    ahora = timezone.now()
+    abandonado = ahora - timedelta(minutes=MINUTOS_ENVIO_ABANDONADO)
+    return DocumentoElectronico.objects.filter(
+        Q(estado__in=['VALIDADO', 'ERROR'])
+        & (Q(proximo_intento__isnull=True) | Q(proximo_intento__lte=ahora))
+        | Q(estado='ENVIADO', fecha_envio__lt=abandonado),
+        intentos__lt=max_intentos,
+        xml_firmado__isnull=False
+    )
+
+
+def _tomar_documentos(cantidad, max_intentos):
+    """
+    Reserva hasta `cantidad` documentos y los marca ENVIADO antes de
+    liberar el bloqueo.
+
+    Returns:
+        Lista de dicts con id, xml_firmado, intentos y número de venta
+    """
+    with transaction.atomic():
+        documentos = list(
+            documentos_pendientes(max_intentos).select_for_update(skip_locked=True, of=('self',))
+            .order_by(F('proximo_intento').asc(nulls_first=True), 'id')
+            .values('id', 'xml_firmado', 'intentos', venta_numero=F('venta__numero'))[:cantidad]
+        )
+        if documentos:
+            DocumentoElectronico.objects.filter(pk__in=[d['id'] for d in documentos]).update(
+                estado='ENVIADO',
+                fecha_envio=timezone.now(),
+                intentos=F('intentos') + 1
+            )
+    for documento in documentos:
+        documento['intentos'] += 1
+    return documentos
+
+
+def _enviar(documento, limite):
+    limite.esperar()
+    return enviar_xml_set(documento['xml_firmado'])
+
+
+def _registrar_resultado(documento, futuro):
+    """
+    Guarda la respuesta del SET. Un rechazo es definitivo; un error de
+    comunicación se reintenta más tarde.
+
+    Returns:
+        'aceptado', 'rechazado' o 'error'
+    """
+    ahora = timezone.now()
+    enviado = DocumentoElectronico.objects.filter(pk=documento['id'], estado='ENVIADO')
+    try:
+        respuesta = futuro.result()
+    except Exception as e:
+        espera = espera_reintento(documento['intentos'])
+        logger.error('Error enviando documento %s al SET: %s', documento['id'], e)
+        enviado.update(
+            estado='ERROR',
+            errores=str(e),
+            proximo_intento=ahora + timedelta(seconds=espera)
+        )
+        return 'error'
+
+    if respuesta.get('estado') == 'VALIDO':
+        enviado.update(
+            estado='ACEPTADO',
+            respuesta_set=respuesta,
+            codigo_set=respuesta.get('numero'),
+            qr_url=respuesta.get('qr_url'),
+            fecha_aceptacion=ahora,
+            errores='',
+            proximo_intento=None
+        )
+        return 'aceptado'
+
+    enviado.update(
+        estado='RECHAZADO',
+        respuesta_set=respuesta,
+        errores=respuesta.get('mensaje', 'Rechazado por el SET'),
+        proximo_intento=None
+    )
+    return 'rechazado'
+
+
+def enviar_pendientes(limite=None, simultaneos=None, por_segundo=None, max_intentos=None, al_terminar=None):
+    """
+    Envía los documentos pendientes con hasta `simultaneos` peticiones en
+    vuelo. A medida que terminan se reservan más, hasta agotar los
+    pendientes o llegar a `limite`.
+
+    Args:
+        limite: Cantidad máxima de documentos a tomar (None = todos)
+        simultaneos: Peticiones en paralelo (SIFEN_CONFIG['ENVIOS_SIMULTANEOS'])
+        por_segundo: Límite de envíos por segundo (SIFEN_CONFIG['ENVIOS_POR_SEGUNDO'])
+        max_intentos: Intentos antes de abandonar un documento (SIFEN_CONFIG['MAX_REINTENTOS'])
+        al_terminar: Función (documento, resultado) llamada por cada envío
+
+    Returns:
+        Counter con la cantidad de documentos aceptados, rechazados y con error
+    """
+    simultaneos = simultaneos or _config('ENVIOS_SIMULTANEOS', 8)
+    max_intentos = max_intentos or _config('MAX_REINTENTOS', 3)
+    limite_envios = LimiteEnvios(por_segundo if por_segundo is not None else _config('ENVIOS_POR_SEGUNDO'))
+    resultados = Counter()
+    tomados = 0
+    agotados = False
+
+    with ThreadPoolExecutor(max_workers=simultaneos, thread_name_prefix='envio-set') as hilos:
+        en_vuelo = {}
+        while True:
+            faltan = simultaneos * FACTOR_RESERVA - len(en_vuelo)
+            if limite is not None:
+                faltan = min(faltan, limite - tomados)
+            if faltan > 0 and not agotados:
+                documentos = _tomar_documentos(faltan, max_intentos)
+                agotados = len(documentos) < faltan
+                tomados += len(documentos)
+                for documento in documentos:
+                    en_vuelo[hilos.submit(_enviar, documento, limite_envios)] = documento
+            if not en_vuelo:
+                break
+
+            terminados, _ = wait(en_vuelo, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                documento = en_vuelo.pop(futuro)
+                resultado = _registrar_resultado(documento, futuro)
+                resultados[resultado] += 1
+                if al_terminar:
+                    al_terminar(documento, resultado)
+    return resultados
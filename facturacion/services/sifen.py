@@ -1,8 +1,6 @@
 # services/sifen.py
-import requests
 import pdfkit  # Necesitarás instalar esta librería: pip install pdfkit
 import logging
-from django.conf import settings
 from config.settings import base
 from django.utils import timezone
 from ..models import DocumentoElectronico
@@ -15,6 +13,7 @@ from empresa.models import Empresa, ActividadesEconomicas, Sucursal
 
 #from config.settings import development as settings
 from .mock_services import MockSifenService
+from .envio import enviar_xml_set
 
 # Configuración del logger
 logger = logging.getLogger(__name__)
@@ -56,20 +55,8 @@ class SifenService:
         try:
             documento.marcar_como_enviado()
             
-            if settings.USE_SIFEN_MOCK:
-                from .mock_services import MockSifenService
-                response = MockSifenService.enviar_documento(documento.xml_firmado)
-            else:
-                headers = {
-                    'Authorization': f'Bearer {settings.SIFEN_CONFIG["API_KEY"]}',
-                    'Content-Type': 'application/xml'
-                }
-                response = requests.post(
-                    settings.SIFEN_CONFIG["ENDPOINT"],
-                    data=documento.xml_firmado,
-                    headers=headers,
-                    timeout=settings.SIFEN_CONFIG["TIMEOUT"]
-                ).json()
+            # Para enviar muchos documentos a la vez ver services.envio.enviar_pendientes
+            response = enviar_xml_set(documento.xml_firmado)
             
             if response.get('estado') == 'VALIDO':
                 documento.marcar_como_aceptado(response)
@@ -1,6 +1,7 @@
 from django import forms
 from .models import Venta, DetalleVenta, Cliente, Timbrado, ComisionVenta, ConfiguracionComision
 from almacen.models import Producto, Servicio, Almacen,Stock
+from almacen.services import lista_materiales, mensaje_stock_insuficiente, verificar_stock
 from caja.models import Caja
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -154,18 +155,12 @@ class DetalleVentaForm(forms.ModelForm):
             if (servicio and servicio.tipo == 'COMPUESTO' and 
                 almacen_servicio and cantidad):
                 
-                for componente in servicio.componentes.all():
-                    cantidad_necesaria = componente.cantidad * cantidad
-                    stock = Stock.objects.filter(
-                        producto=componente.producto,
-                        almacen=almacen_servicio
-                    ).first()
-                    
-                    if not stock or stock.cantidad < cantidad_necesaria:
-                        self.add_error(None, 
-                            f'Stock insuficiente de {componente.producto.nombre} para el servicio {servicio.nombre}. '
-                            f'Necesario: {cantidad_necesaria}, Disponible: {stock.cantidad if stock else 0}'
-                        )
+                faltantes = verificar_stock(almacen_servicio.id, {
+                    producto_id: cantidad_por_unidad * cantidad
+                    for producto_id, cantidad_por_unidad in lista_materiales(servicio.id)
+                })
+                if faltantes:
+                    self.add_error(None, mensaje_stock_insuficiente(faltantes))
         
         # Validar que se haya seleccionado producto o servicio según el tipo
         if tipo == 'PRODUCTO' and not producto:
@@ -900,3 +895,24 @@ class DetalleNotaCreditoForm(forms.ModelForm):
         return cleaned_data
 
 
+
+
+class ReporteMargenForm(forms.Form):
+    fecha_desde = forms.DateField(
+        label='Desde',
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    fecha_hasta = forms.DateField(
+        label='Hasta',
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        desde = cleaned_data.get('fecha_desde')
+        hasta = cleaned_data.get('fecha_hasta')
+        if desde and hasta and desde > hasta:
+            raise ValidationError('La fecha desde no puede ser posterior a la fecha hasta')
+        return cleaned_data
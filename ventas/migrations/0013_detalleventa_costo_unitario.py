@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0012_comisionnotacredito_comisionventa_notas_credito'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detalleventa',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text='Costo de mercadería por unidad, registrado al finalizar la venta', max_digits=14, null=True),
+        ),
+    ]
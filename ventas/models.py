@@ -2,9 +2,11 @@ from django.db import models
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.utils import timezone
-from almacen.models import Producto, Servicio, Almacen, Stock, MovimientoInventario
+from almacen.models import Producto, Servicio, Almacen, MovimientoInventario
+from almacen.services import listas_materiales, mensaje_stock_insuficiente, verificar_stock_venta
 from usuarios.models import PerfilUsuario
 from caja.models import MovimientoCaja
+from caja.services import registrar_movimientos_caja
 from empresa.models import PuntoExpedicion, SecuenciaDocumento
 from django.core.validators import RegexValidator
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -486,9 +488,9 @@ class Venta(models.Model):
         if caja.estado != 'ABIERTA':
             raise ValidationError('La caja debe estar abierta para registrar ventas')
         
-        # Verificar stock para todos los productos y servicios
-        for detalle in self.detalles.all():
-            detalle.clean()  # Esto ejecutará las validaciones de stock
+        detalles = list(self.detalles.select_related('producto', 'servicio'))
+        for detalle in detalles:
+            detalle.clean()
             
             if detalle.tipo == 'SERVICIO' and detalle.servicio.tipo == 'COMPUESTO':
                 # Validar que tenga almacén asignado
@@ -498,6 +500,12 @@ class Venta(models.Model):
                         raise ValidationError('No se encontró almacén principal para el servicio')
                     detalle.almacen_servicio = almacen_servicio
                     detalle.save()
+
+        # Verificar stock de todo el carrito (productos y materiales de los
+        # servicios compuestos) con una consulta por almacén
+        faltantes = verificar_stock_venta(detalles, bloquear=True)
+        if faltantes:
+            raise ValidationError(mensaje_stock_insuficiente(faltantes))
         
         # Actualizar datos de la venta (excepto estado)
         self.caja = caja
@@ -520,10 +528,12 @@ class Venta(models.Model):
                 comprobante=f"V-{self.numero}"
             )
         
-        # Procesar cada detalle
-        for detalle in self.detalles.all():
+        # Procesar cada detalle (cada salida queda con su costo de mercadería)
+        costeados = []
+        materiales = listas_materiales(d.servicio_id for d in detalles if d.tipo == 'SERVICIO')
+        for detalle in detalles:
             if detalle.tipo == 'PRODUCTO':
-                MovimientoInventario.objects.create(
+                movimiento = MovimientoInventario.objects.create(
                     producto=detalle.producto,
                     almacen=detalle.almacen,
                     cantidad=detalle.cantidad,
@@ -531,17 +541,24 @@ class Venta(models.Model):
                     usuario=self.vendedor,
                     motivo=f"Venta {self.numero}"
                 )
+                detalle.costo_unitario = movimiento.costo_unitario
+                costeados.append(detalle)
             elif detalle.tipo == 'SERVICIO' and detalle.servicio.tipo == 'COMPUESTO':
-                for componente in detalle.servicio.componentes.all():
-                    cantidad_necesaria = componente.cantidad * detalle.cantidad
-                    MovimientoInventario.objects.create(
-                        producto=componente.producto,
+                costo_total = 0
+                for producto_id, cantidad in materiales[detalle.servicio_id]:
+                    cantidad_necesaria = cantidad * detalle.cantidad
+                    movimiento = MovimientoInventario.objects.create(
+                        producto_id=producto_id,
                         almacen=detalle.almacen_servicio,
                         cantidad=cantidad_necesaria,
                         tipo='SALIDA',
                         usuario=self.vendedor,
                         motivo=f"Servicio {detalle.servicio.nombre} en Venta {self.numero}"
                     )
+                    costo_total += movimiento.cantidad * movimiento.costo_unitario
+                detalle.costo_unitario = costo_total / detalle.cantidad
+                costeados.append(detalle)
+        DetalleVenta.objects.bulk_update(costeados, ['costo_unitario'])
 
         # Crear cuotas si es a crédito
         if condicion == '2':
@@ -587,7 +604,8 @@ class Venta(models.Model):
                 cantidad=movimiento.cantidad,
                 tipo='ENTRADA',
                 usuario=usuario,
-                motivo=f"Cancelación Venta {self.numero}"
+                motivo=f"Cancelación Venta {self.numero}",
+                costo_unitario=movimiento.costo_unitario
             )
         
         # Actualizar estado de la venta
@@ -622,6 +640,13 @@ class DetalleVenta(models.Model):
     precio_unitario = models.DecimalField(max_digits=12, decimal_places=2)
     tasa_iva = models.PositiveIntegerField(default=10)
     subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    costo_unitario = models.DecimalField(
+        max_digits=14,
+        decimal_places=4,
+        null=True,
+        blank=True,
+        help_text="Costo de mercadería por unidad, registrado al finalizar la venta"
+    )
 
     class Meta:
         verbose_name = 'Detalle de Venta'
@@ -651,35 +676,11 @@ class DetalleVenta(models.Model):
         if self.precio_unitario <= 0:
             raise ValidationError("El precio unitario debe ser mayor a cero")
         
-        # Validar stock para productos
-        if self.tipo == 'PRODUCTO' and self.venta.estado == 'FINALIZADA':
-            stock = Stock.objects.filter(
-                producto=self.producto,
-                almacen=self.almacen
-            ).first()
-            
-            if stock and stock.cantidad < self.cantidad:
-                raise ValidationError(f'Stock insuficiente. Disponible: {stock.cantidad}')
-        
-        # Validar stock para servicios que consumen productos
-        if (self.tipo == 'SERVICIO' and self.servicio.tipo == 'COMPUESTO' and 
-            self.venta.estado == 'FINALIZADA'):
-            
-            almacen = self.almacen_servicio or Almacen.objects.filter(es_principal=True).first()
-            if not almacen:
-                raise ValidationError('No se encontró almacén para el servicio')
-            
-            for componente in self.servicio.componentes.all():
-                cantidad_necesaria = componente.cantidad * self.cantidad
-                stock = Stock.objects.filter(
-                    producto=componente.producto,
-                    almacen=almacen
-                ).first()
-                
-                if not stock or stock.cantidad < cantidad_necesaria:
-                    raise ValidationError(
-                        f'Stock insuficiente de {componente.producto.nombre} para el servicio {self.servicio.nombre}'
-                    )
+        # Validar stock del producto o de los materiales del servicio compuesto
+        if self.venta.estado == 'FINALIZADA':
+            faltantes = verificar_stock_venta([self])
+            if faltantes:
+                raise ValidationError(mensaje_stock_insuficiente(faltantes))
 
     def __str__(self):
         if self.tipo == 'PRODUCTO':
@@ -1455,7 +1456,11 @@ class NotaCredito(models.Model):
         )
 
         # Revertir inventario
-        for detalle in self.detalles.all():
+        detalles = list(self.detalles.select_related('detalle_venta__servicio'))
+        materiales = listas_materiales(
+            d.detalle_venta.servicio_id for d in detalles if d.detalle_venta.tipo == 'SERVICIO'
+        )
+        for detalle in detalles:
             if detalle.detalle_venta.tipo == 'PRODUCTO':
                 MovimientoInventario.objects.create(
                     producto=detalle.detalle_venta.producto,
@@ -1463,13 +1468,14 @@ class NotaCredito(models.Model):
                     cantidad=detalle.cantidad,
                     tipo='ENTRADA',
                     usuario=self.creado_por,
-                    motivo=f"Nota de Crédito {self.numero}"
+                    motivo=f"Nota de Crédito {self.numero}",
+                    costo_unitario=detalle.detalle_venta.costo_unitario
                 )
             elif detalle.detalle_venta.tipo == 'SERVICIO' and detalle.detalle_venta.servicio.tipo == 'COMPUESTO':
-                for componente in detalle.detalle_venta.servicio.componentes.all():
-                    cantidad_necesaria = componente.cantidad * detalle.cantidad
+                for producto_id, cantidad in materiales[detalle.detalle_venta.servicio_id]:
+                    cantidad_necesaria = cantidad * detalle.cantidad
                     MovimientoInventario.objects.create(
-                        producto=componente.producto,
+                        producto_id=producto_id,
                         almacen=detalle.detalle_venta.almacen_servicio,
                         cantidad=cantidad_necesaria,
                         tipo='ENTRADA',
@@ -1490,6 +1496,7 @@ class NotaCredito(models.Model):
         if self.tipo == 'PARCIAL':
             porcentaje_devolucion = self.total / self.venta.total
 
+        movimientos_caja = []
         for comision in self.venta.comisiones.all():
             monto_a_revertir = redondear_dos_decimales(comision.monto * porcentaje_devolucion)
 
@@ -1497,14 +1504,14 @@ class NotaCredito(models.Model):
                 timestamp = int(timezone.now().timestamp())
                 comprobante = f"COM-NC-REV-{comision.id}-{timestamp}"
 
-                MovimientoCaja.objects.create(
+                movimientos_caja.append(MovimientoCaja(
                     caja=self.caja,
                     tipo='INGRESO',
                     monto=monto_a_revertir,
                     responsable=self.creado_por,
                     descripcion=f"Reversión comisión por NC {self.numero} - Venta {self.venta.numero}",
                     comprobante=comprobante
-                )
+                ))
 
                 if self.tipo == 'TOTAL':
                     comision.estado = 'CANCELADA'
@@ -1528,8 +1535,11 @@ class NotaCredito(models.Model):
                 comision.notas = f"\n--- AJUSTE POR NC {self.numero} ---\nMonto reducido: Gs. {monto_a_revertir:,.2f}\n\n{comision.notas or ''}"
                 comision.save()
 
+        registrar_movimientos_caja(movimientos_caja)
+
     @transaction.atomic
     def revertir_reversion_comisiones(self, usuario):
+        movimientos_caja = []
         for comision in self.venta.comisiones.all():
             movimientos_reversion = MovimientoCaja.objects.filter(
                 comprobante__startswith=f"COM-NC-REV-{comision.id}-",
@@ -1540,14 +1550,14 @@ class NotaCredito(models.Model):
                 timestamp = int(timezone.now().timestamp())
                 comprobante = f"COM-NC-CANC-{comision.id}-{timestamp}"
 
-                MovimientoCaja.objects.create(
+                movimientos_caja.append(MovimientoCaja(
                     caja=self.caja,
                     tipo='EGRESO',
                     monto=total_revertido,
                     responsable=usuario,
                     descripcion=f"Cancelación reversión comisión por NC {self.numero}",
                     comprobante=comprobante
-                )
+                ))
 
                 if self.tipo == 'TOTAL':
                     comision.estado = 'PAGADA'
@@ -1559,6 +1569,8 @@ class NotaCredito(models.Model):
             comision.notas = f"\n--- CANCELACIÓN NC {self.numero} ---\nReversión de comisión revertida\n\n{comision.notas or ''}"
             comision.save()
 
+        registrar_movimientos_caja(movimientos_caja)
+
     @transaction.atomic
     def cancelar(self, usuario):
         if self.estado != 'FINALIZADA':
@@ -12,6 +12,7 @@ urlpatterns = [
     path('<int:venta_id>/finalizar/', views.finalizar_venta, name='finalizar_venta'),
     path('<int:venta_id>/cancelar/', views.cancelar_venta, name='cancelar_venta'),
     path('api/ventas/<int:venta_id>/detalles/', views.api_detalles_venta, name='api_detalles_venta'),
+    path('reportes/margen/', views.reporte_margen, name='reporte_margen'),
     
     # Clientes
     path('clientes/', views.lista_clientes, name='lista_clientes'),
@@ -7,7 +7,7 @@ from django.forms import ValidationError, inlineformset_factory,BooleanField,Che
 from .models import Venta, DetalleVenta, Cliente, Timbrado
 from .forms import VentaForm, DetalleVentaForm, ClienteForm, FinalizarVentaForm, TimbradoForm
 from usuarios.models import PerfilUsuario
-from almacen.models import Stock, Almacen
+from almacen.services import mensaje_stock_insuficiente, verificar_stock_venta
 import logging
 from django.views.decorators.http import require_POST
 from facturacion.services.sifen import SifenService
@@ -233,44 +233,19 @@ def finalizar_venta(request, venta_id):
         messages.error(request, 'No se puede finalizar una venta sin detalles')
         return redirect('ventas:editar_venta', venta_id=venta.id)
     
-    # Verificar stock antes de mostrar el formulario
+    # Verificar stock antes de mostrar el formulario (todo el carrito de una vez)
     try:
-        for detalle in venta.detalles.select_related('producto', 'servicio', 'almacen'):
-            if detalle.tipo == 'PRODUCTO':
-                stock = Stock.objects.filter(
-                    producto=detalle.producto,
-                    almacen=detalle.almacen
-                ).first()
-                
-                if not stock or stock.cantidad < detalle.cantidad:
-                    messages.error(request, 
-                        f'Stock insuficiente para {detalle.producto.nombre}. Disponible: {stock.cantidad if stock else 0}'
-                    )
-                    return redirect('ventas:editar_venta', venta_id=venta.id)
-            
-            elif detalle.tipo == 'SERVICIO' and detalle.servicio.tipo == 'COMPUESTO':
-                almacen_servicio = detalle.almacen_servicio or Almacen.objects.filter(es_principal=True).first()
-                if not almacen_servicio:
-                    messages.error(request, 'No se encontró almacén para los componentes del servicio')
-                    return redirect('ventas:editar_venta', venta_id=venta.id)
-                
-                for componente in detalle.servicio.componentes.select_related('producto'):
-                    cantidad_necesaria = componente.cantidad * detalle.cantidad
-                    stock = Stock.objects.filter(
-                        producto=componente.producto,
-                        almacen=almacen_servicio
-                    ).first()
-                    
-                    if not stock or stock.cantidad < cantidad_necesaria:
-                        messages.error(request,
-                            f'Stock insuficiente de {componente.producto.nombre} para el servicio {detalle.servicio.nombre}. '
-                            f'Necesario: {cantidad_necesaria}, Disponible: {stock.cantidad if stock else 0}'
-                        )
-                        return redirect('ventas:editar_venta', venta_id=venta.id)
+        faltantes = verificar_stock_venta(venta.detalles.all())
+    except ValidationError as e:
+        messages.error(request, ' '.join(e.messages))
+        return redirect('ventas:editar_venta', venta_id=venta.id)
     except Exception as e:
         messages.error(request, f'Error al verificar stock: {str(e)}')
         logger.error(f'Error al verificar stock para venta {venta.id}: {str(e)}', exc_info=True)
         return redirect('ventas:editar_venta', venta_id=venta.id)
+    if faltantes:
+        messages.error(request, mensaje_stock_insuficiente(faltantes))
+        return redirect('ventas:editar_venta', venta_id=venta.id)
     
     # Procesar formulario de finalización
     if request.method == 'POST':
@@ -498,6 +473,7 @@ def eliminar_timbrado(request, timbrado_id):
 from django.db.models import Sum
 from .models import CuentaPorCobrar, PagoCuota, Venta
 from caja.models import MovimientoCaja
+from caja.services import registrar_movimientos_caja
 from .forms import PagoCuotaForm
 from django.utils import timezone
 
@@ -1509,6 +1485,7 @@ def pagos_rapidos_comisiones_cobradores(request):
                     raise ValidationError("Debe ingresar al menos un pago con monto mayor a cero")
                 
                 # Procesar pagos válidos
+                movimientos_caja = []
                 for comision, form in forms_pago_validados:
                     monto = form.cleaned_data['monto']
                     
@@ -1523,18 +1500,18 @@ def pagos_rapidos_comisiones_cobradores(request):
                                 f"Saldo pendiente: Gs. {saldo_pendiente:,.2f}"
                             )
                         
-                        # Registrar movimiento de caja
+                        # Movimiento de caja: se registran todos juntos al final
                         timestamp = int(timezone.now().timestamp())
                         comprobante = f"COM-COB-{comision.id}-{timestamp}"
                         
-                        MovimientoCaja.objects.create(
+                        movimientos_caja.append(MovimientoCaja(
                             caja=caja,
                             tipo='EGRESO',
                             monto=monto,
                             responsable=request.user.perfil,
                             descripcion=f"Pago comisión cobro #{comision.pago.id}",
                             comprobante=comprobante
-                        )
+                        ))
                         
                         # Actualizar la comisión (método pagar ahora maneja parciales)
                         comision.pagar(monto, fecha_pago)
@@ -1548,6 +1525,8 @@ def pagos_rapidos_comisiones_cobradores(request):
                         })
                         total_pagado += monto
                 
+                registrar_movimientos_caja(movimientos_caja)
+                
                 messages.success(request, 
                     f'Se registraron {len(pagos_realizados)} pagos por un total de Gs. {total_pagado:,.2f}'
                 )
@@ -1670,6 +1649,7 @@ def pagos_rapidos_comisiones_vendedores(request):
                     raise ValidationError("Debe ingresar al menos un pago con monto mayor a cero")
                 
                 # Procesar pagos válidos
+                movimientos_caja = []
                 for comision, form in forms_pago_validados:
                     monto = form.cleaned_data['monto']
                     
@@ -1681,18 +1661,18 @@ def pagos_rapidos_comisiones_vendedores(request):
                                 f"Saldo pendiente: Gs. {comision.saldo_pendiente:,.2f}"
                             )
                         
-                        # Registrar movimiento de caja
+                        # Movimiento de caja: se registran todos juntos al final
                         timestamp = int(timezone.now().timestamp())
                         comprobante = f"COM-VEN-{comision.id}-{timestamp}"
                         
-                        MovimientoCaja.objects.create(
+                        movimientos_caja.append(MovimientoCaja(
                             caja=caja,
                             tipo='EGRESO',
                             monto=monto,
                             responsable=request.user.perfil,
                             descripcion=f"Pago comisión venta #{comision.venta.numero}",
                             comprobante=comprobante
-                        )
+                        ))
                         
                         # Actualizar la comisión
                         comision.pagar(monto, fecha_pago)
@@ -1706,6 +1686,8 @@ def pagos_rapidos_comisiones_vendedores(request):
                         })
                         total_pagado += monto
                 
+                registrar_movimientos_caja(movimientos_caja)
+                
                 messages.success(request, 
                     f'Se registraron {len(pagos_realizados)} pagos por un total de Gs. {total_pagado:,.2f}'
                 )
@@ -2079,4 +2061,87 @@ def api_detalles_venta(request, venta_id):
         return JsonResponse(response_data)
         
     except Exception as e:
-        return JsonResponse({'error': f'Error al obtener detalles: {str(e)}'}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': f'Error al obtener detalles: {str(e)}'}, status=500)
+
+
+# Reporte de margen bruto
+from django.db.models import Count, DecimalField, ExpressionWrapper, F
+from .forms import ReporteMargenForm
+
+
+@login_required
+def reporte_margen(request):
+    """
+    Margen bruto por producto/servicio a partir del costo de mercadería
+    registrado en cada venta (no recalcula el historial de compras).
+    Las notas de crédito finalizadas del período descuentan venta y costo.
+    """
+    hoy = timezone.localdate()
+    desde, hasta = hoy.replace(day=1), hoy
+    form = ReporteMargenForm(request.GET or None)
+    if form.is_valid():
+        desde = form.cleaned_data['fecha_desde'] or desde
+        hasta = form.cleaned_data['fecha_hasta'] or hasta
+
+    costo_linea = ExpressionWrapper(
+        F('cantidad') * F('costo_unitario'),
+        output_field=DecimalField(max_digits=20, decimal_places=4)
+    )
+    filas = {}
+    for fila in DetalleVenta.objects.filter(
+        venta__estado='FINALIZADA', venta__fecha__date__range=(desde, hasta)
+    ).values('producto_id', 'servicio_id', 'producto__nombre', 'servicio__nombre').annotate(
+        cantidad_total=Sum('cantidad'),
+        venta_total=Sum('subtotal'),
+        costo_total=Sum(costo_linea),
+        sin_costo=Count('id', filter=Q(costo_unitario__isnull=True))
+    ):
+        filas[(fila['producto_id'], fila['servicio_id'])] = {
+            'nombre': fila['producto__nombre'] or fila['servicio__nombre'],
+            'cantidad': fila['cantidad_total'],
+            'venta': fila['venta_total'] or Decimal('0'),
+            'costo': fila['costo_total'] or Decimal('0'),
+            'sin_costo': fila['sin_costo'],
+        }
+
+    for fila in DetalleNotaCredito.objects.filter(
+        nota_credito__estado='FINALIZADA', nota_credito__fecha__date__range=(desde, hasta)
+    ).values(
+        'detalle_venta__producto_id', 'detalle_venta__servicio_id',
+        'detalle_venta__producto__nombre', 'detalle_venta__servicio__nombre'
+    ).annotate(
+        cantidad_total=Sum('cantidad'),
+        venta_total=Sum('subtotal'),
+        costo_total=Sum(ExpressionWrapper(
+            F('cantidad') * F('detalle_venta__costo_unitario'),
+            output_field=DecimalField(max_digits=20, decimal_places=4)
+        ))
+    ):
+        clave = (fila['detalle_venta__producto_id'], fila['detalle_venta__servicio_id'])
+        actual = filas.setdefault(clave, {
+            'nombre': fila['detalle_venta__producto__nombre'] or fila['detalle_venta__servicio__nombre'],
+            'cantidad': Decimal('0'), 'venta': Decimal('0'), 'costo': Decimal('0'), 'sin_costo': 0,
+        })
+        actual['cantidad'] -= fila['cantidad_total']
+        actual['venta'] -= fila['venta_total'] or Decimal('0')
+        actual['costo'] -= fila['costo_total'] or Decimal('0')
+
+    for fila in filas.values():
+        fila['margen'] = fila['venta'] - fila['costo']
+        fila['porcentaje'] = fila['margen'] * 100 / fila['venta'] if fila['venta'] else None
+
+    totales = {
+        campo: sum((fila[campo] for fila in filas.values()), Decimal('0'))
+        for campo in ('venta', 'costo', 'margen')
+    }
+    totales['porcentaje'] = totales['margen'] * 100 / totales['venta'] if totales['venta'] else None
+
+    return render(request, 'ventas/reporte_margen.html', {
+        'form': form,
+        'filas': sorted(filas.values(), key=lambda f: f['margen'], reverse=True),
+        'totales': totales,
+        'sin_costo': sum(fila['sin_costo'] for fila in filas.values()),
+        'desde': desde,
+        'hasta': hasta,
+        'titulo': 'Margen Bruto'
+    })